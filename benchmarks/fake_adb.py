@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Fake adb server and adb binary for benchmarks
+
+Serves the adb server protocol (host:devices, host:track-devices, features, transport,
+shell, shell,v2 and exec) for a set of simulated devices, so server.py can be driven
+without a phone. Shell commands are answered by a small interpreter that knows the
+commands server.py sends: root probes, getprop, ls/cat/sha256sum, frida-server start
+and version, pidof, chmod/mv and echo redirects.
+
+Run as a server:
+
+    python benchmarks/fake_adb.py serve --port 5038 --devices 4
+
+Or point ADB_PATH at a shim that runs `python benchmarks/fake_adb.py "$@"`; the
+binary mode forwards shell, exec-out, push and devices to the server on
+ADB_SERVER_PORT, like the real adb client does.
+"""
+
+import os
+import re
+import sys
+import time
+import struct
+import socket
+import hashlib
+import argparse
+import threading
+import socketserver
+
+FRIDA_SERVER_VERSION = '16.2.2'
+STATEMENT_SPLIT = re.compile(r';(?=(?:[^"]*"[^"]*")*[^"]*$)')  # Semicolons outside double quotes
+AND_SPLIT = re.compile(r'&&(?=(?:[^"]*"[^"]*")*[^"]*$)')
+
+class FakeDevice:
+    """State of one simulated phone: files, running frida-server and running apps"""
+
+    def __init__(self, serial, abi='arm64-v8a', frida_server=True, shell_latency=0.0):
+        self.serial = serial
+        self.abi = abi
+        self.shell_latency = shell_latency
+        self.files = {}          # path -> bytes
+        self.frida_running = frida_server
+        self.apps = {}           # package -> pid
+        self.next_pid = 10000
+        self.lock = threading.Lock()
+        if frida_server:
+            self.files['/data/local/tmp/frida-server'] = b'fake frida-server'
+
+    def run(self, script):
+        """Run a shell script, returning (stdout, stderr, exit status)"""
+        if self.shell_latency:
+            time.sleep(self.shell_latency)
+        stdout, stderr, status = [], [], 0
+        for statement in STATEMENT_SPLIT.split(script):
+            for command in AND_SPLIT.split(statement):
+                out, err, status = self.run_command(command.strip(), status)
+                stdout.append(out)
+                stderr.append(err)
+                if status:
+                    break
+        return ''.join(stdout), ''.join(stderr), status
+
+    def run_command(self, command, last_status):
+        command = command.rstrip('&').strip()
+        if not command:
+            return '', '', last_status
+
+        # Root wrappers just run the inner command
+        match = re.fullmatch(r'su -c "(.*)"', command) or re.fullmatch(r'su 0 (.*)', command)
+        if match:
+            return self.run(match.group(1))
+
+        words = command.split()
+        program = words[0].rsplit('/', 1)[-1]
+        with self.lock:
+            if program == 'echo':
+                return self.echo(command[len('echo'):].strip(), last_status)
+            if program == 'id':
+                return 'uid=0(root) gid=0(root) groups=0(root)\n', '', 0
+            if program == 'getprop':
+                return (self.abi + '\n' if words[1:] == ['ro.product.cpu.abi'] else '\n'), '', 0
+            if program == 'ls':
+                path = words[-1]
+                if path in self.files:
+                    return path + '\n', '', 0
+                return '', f'ls: {path}: No such file or directory\n', 1
+            if program == 'cat':
+                path = words[-1]
+                if path in self.files:
+                    return self.files[path].decode('utf-8', 'replace'), '', 0
+                return '', f'cat: {path}: No such file or directory\n', 1
+            if program == 'sha256sum':
+                path = words[-1]
+                if path in self.files:
+                    return f'{hashlib.sha256(self.files[path]).hexdigest()}  {path}\n', '', 0
+                return '', f'sha256sum: {path}: No such file or directory\n', 1
+            if program == 'chmod':
+                return '', '', 0
+            if program == 'mv':
+                source, target = [word for word in words[1:] if not word.startswith('-')][:2]
+                if source not in self.files:
+                    return '', f'mv: {source}: No such file or directory\n', 1
+                self.files[target] = self.files.pop(source)
+                return '', '', 0
+            if program == 'ps':
+                running = [f'root {self.apps[app]} 1 0 0 0 S {app}' for app in self.apps]
+                if self.frida_running:
+                    running.append('root 4242 1 0 0 0 S frida-server')
+                if '| grep' in command:
+                    pattern = command.split('| grep', 1)[1].strip()
+                    running = [line for line in running if pattern in line]
+                return ''.join(line + '\n' for line in running), '', 0 if running else 1
+            if program in ('pkill', 'killall'):
+                self.frida_running = False
+                return '', '', 0
+            if program == 'frida-server':
+                if '--version' in words:
+                    return FRIDA_SERVER_VERSION + '\n', '', 0
+                self.frida_running = True
+                return '', '', 0
+            if program == 'pidof':
+                pid = self.apps.get(words[-1])
+                return (f'{pid}\n', '', 0) if pid else ('', '', 1)
+            if program == 'monkey':
+                package = words[words.index('-p') + 1]
+                self.start_app(package)
+                return 'Events injected: 1\n', '', 0
+            if program == 'am' and 'force-stop' in words:
+                self.apps.pop(words[-1], None)
+                return '', '', 0
+            if program == 'date':
+                return f'{time.time():.9f}\n', '', 0
+            if program == 'logcat':
+                return '', '', 0
+        return '', '', 0
+
+    def echo(self, args, last_status):
+        target = None
+        to_stderr = args.endswith('>&2')
+        if to_stderr:
+            args = args[:-3].strip()
+        elif '>' in args:
+            args, target = [part.strip() for part in args.rsplit('>', 1)]
+        text = args.strip('"').replace('$?', str(last_status)) + '\n'
+        if target:
+            self.files[target] = text.encode()
+            return '', '', 0
+        return ('', text, 0) if to_stderr else (text, '', 0)
+
+    def start_app(self, package):
+        if package not in self.apps:
+            self.next_pid += 1
+            self.apps[package] = self.next_pid
+        return self.apps[package]
+
+class AdbHandler(socketserver.BaseRequestHandler):
+    def read_request(self):
+        header = self.recv_exact(4)
+        if not header:
+            return None
+        return self.recv_exact(int(header, 16)).decode('utf-8')
+
+    def recv_exact(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return data
+            data += chunk
+        return data
+
+    def okay_string(self, text):
+        data = text.encode('utf-8')
+        self.request.sendall(b'OKAY' + b'%04x' % len(data) + data)
+
+    def fail(self, text):
+        data = text.encode('utf-8')
+        self.request.sendall(b'FAIL' + b'%04x' % len(data) + data)
+
+    def device_list(self):
+        return ''.join(f'{serial}\tdevice\n' for serial in self.server.devices)
+
+    def handle(self):
+        device = None
+        while True:
+            service = self.read_request()
+            if service is None:
+                return
+            if service == 'host:version':
+                return self.okay_string('0029')
+            if service == 'host:devices':
+                return self.okay_string(self.device_list())
+            if service == 'host:track-devices':
+                self.okay_string(self.device_list())
+                # The device set never changes; hold the connection open like adb does
+                while self.request.recv(1):
+                    pass
+                return
+            if service.startswith('host-serial:') and service.endswith(':features'):
+                return self.okay_string('shell_v2,cmd')
+            if service.startswith('host:transport:'):
+                device = self.server.devices.get(service.split(':', 2)[2])
+                if device is None:
+                    return self.fail(f"device '{service.split(':', 2)[2]}' not found")
+                self.request.sendall(b'OKAY')
+                continue
+            if device is None:
+                return self.fail('no device selected')
+            if service.startswith('shell,v2,raw:'):
+                stdout, stderr, status = device.run(service.split(':', 1)[1])
+                self.request.sendall(b'OKAY')
+                packets = b''
+                for stream_id, text in ((1, stdout), (2, stderr)):
+                    if text:
+                        data = text.encode('utf-8')
+                        packets += struct.pack('<BI', stream_id, len(data)) + data
+                self.request.sendall(packets + struct.pack('<BI', 3, 1) + bytes([status & 0xff]))
+                return
+            if service.startswith('shell:') or service.startswith('exec:'):
+                stdout, stderr, _ = device.run(service.split(':', 1)[1])
+                self.request.sendall(b'OKAY' + (stdout + stderr).encode('utf-8'))
+                return
+            if service.startswith('fake-push:'):
+                # Not part of adb: the binary mode uses it instead of the sync protocol
+                _, path, size = service.rsplit(':', 2)
+                self.request.sendall(b'OKAY')
+                data = self.recv_exact(int(size))
+                with device.lock:
+                    device.files[path] = data
+                self.request.sendall(b'OKAY')
+                return
+            return self.fail(f'unknown service {service}')
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port=0, devices=4, frida_server=True, shell_latency=0.0, prefix='fake'):
+        super().__init__(('127.0.0.1', port), AdbHandler)
+        self.devices = {
+            f'{prefix}-{i:03d}': FakeDevice(f'{prefix}-{i:03d}', frida_server=frida_server, shell_latency=shell_latency)
+            for i in range(devices)
+        }
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+def write_shim(directory):
+    """Write an executable `adb` that runs this file in binary mode and return its path"""
+    path = os.path.join(directory, 'adb')
+    with open(path, 'w') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" "$@"\n')
+    os.chmod(path, 0o755)
+    return path
+
+# Binary mode: a minimal adb client talking to the fake server
+
+def client_request(sock, service):
+    data = service.encode('utf-8')
+    sock.sendall(b'%04x' % len(data) + data)
+    status = sock.recv(4)
+    if status != b'OKAY':
+        length = int(sock.recv(4) or b'0', 16)
+        raise RuntimeError(sock.recv(length).decode('utf-8', 'replace'))
+
+def client_connect(serial=None):
+    sock = socket.create_connection(('127.0.0.1', int(os.getenv('ADB_SERVER_PORT', 5037))))
+    if serial:
+        client_request(sock, f'host:transport:{serial}')
+    return sock
+
+def read_all(sock):
+    chunks = []
+    for chunk in iter(lambda: sock.recv(65536), b''):
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+def binary_main(argv):
+    serial = None
+    if argv[:1] == ['-s']:
+        serial, argv = argv[1], argv[2:]
+    command, args = (argv[0], argv[1:]) if argv else ('help', [])
+
+    if command == 'version':
+        print('Android Debug Bridge version 1.0.41 (fake)')
+        return 0
+    if command in ('start-server', 'kill-server'):
+        return 0
+    if command == 'devices':
+        sock = client_connect()
+        client_request(sock, 'host:devices')
+        length = int(sock.recv(4), 16)
+        print('List of devices attached')
+        sys.stdout.write(sock.recv(length).decode('utf-8'))
+        return 0
+    if command in ('shell', 'exec-out'):
+        sock = client_connect(serial)
+        client_request(sock, 'shell,v2,raw:' + ' '.join(args))
+        data = read_all(sock)
+        status = 0
+        while len(data) >= 5:
+            stream_id, length = struct.unpack('<BI', data[:5])
+            payload, data = data[5:5 + length], data[5 + length:]
+            if stream_id == 3:
+                status = payload[0]
+            else:
+                (sys.stdout if stream_id == 1 else sys.stderr).buffer.write(payload)
+        return status
+    if command == 'push':
+        local, remote = args[-2:]
+        with open(local, 'rb') as f:
+            data = f.read()
+        sock = client_connect(serial)
+        client_request(sock, f'fake-push:{remote}:{len(data)}')
+        sock.sendall(data)
+        sock.recv(4)
+        print(f'{local}: 1 file pushed. ({len(data)} bytes)')
+        return 0
+    sys.stderr.write(f'fake adb: unsupported command {command}\n')
+    return 1
+
+def main():
+    if sys.argv[1:2] != ['serve']:
+        sys.exit(binary_main(sys.argv[1:]))
+
+    parser = argparse.ArgumentParser(description='Fake adb server for benchmarks')
+    parser.add_argument('serve')
+    parser.add_argument('--port', type=int, default=5038)
+    parser.add_argument('--devices', type=int, default=4, help='Number of simulated devices')
+    parser.add_argument('--no-frida-server', action='store_true', help='Start devices without frida-server installed')
+    parser.add_argument('--shell-latency', type=float, default=0.0, help='Seconds added to every shell command')
+    parser.add_argument('--prefix', default='fake', help='Serial prefix, distinct per fake server when running several')
+    args = parser.parse_args()
+
+    server = FakeAdbServer(args.port, args.devices, not args.no_frida_server, args.shell_latency, args.prefix)
+    print(f'[*] Fake adb server on 127.0.0.1:{server.port} with {len(server.devices)} devices')
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Stand-in for the frida package used by the benchmark harness
+
+Put benchmarks/fakes on PYTHONPATH so `import frida` in server.py resolves here. Every
+device id given to get_device is a simulated device with FAKE_FRIDA_APPS installed apps.
+Scripts emit console messages from a real OS thread, like Frida's own callbacks, at a
+rate set with FAKE_FRIDA_MESSAGE_RATE or per script with a directive in its source:
+
+    // fake-frida: rate=5000 batch=50 size=120
+
+rate is messages per second, batch > 1 sends console.batch payloads of that many
+records, size is the length of each message. crash=<seconds> makes the process die that
+long after the script loads, detaching its session with 'process-terminated'.
+FAKE_FRIDA_*_MS add latency to attach, spawn, script load and enumeration calls.
+"""
+
+import os
+import re
+import sys
+import time
+import threading
+
+__version__ = '16.2.2'
+
+APPS = int(os.getenv('FAKE_FRIDA_APPS', 200))
+SYSTEM_PROCESSES = int(os.getenv('FAKE_FRIDA_PROCESSES', 300))
+MESSAGE_RATE = float(os.getenv('FAKE_FRIDA_MESSAGE_RATE', 0))
+MESSAGE_BATCH = int(os.getenv('FAKE_FRIDA_MESSAGE_BATCH', 1))
+MESSAGE_SIZE = int(os.getenv('FAKE_FRIDA_MESSAGE_SIZE', 80))
+ATTACH_LATENCY = float(os.getenv('FAKE_FRIDA_ATTACH_MS', 5)) / 1000.0
+SPAWN_LATENCY = float(os.getenv('FAKE_FRIDA_SPAWN_MS', 20)) / 1000.0
+LOAD_LATENCY = float(os.getenv('FAKE_FRIDA_LOAD_MS', 5)) / 1000.0
+ENUMERATE_LATENCY = float(os.getenv('FAKE_FRIDA_ENUMERATE_MS', 10)) / 1000.0
+DIRECTIVE = re.compile(r'fake-frida:((?:\s*\w+=\d+(?:\.\d+)?)+)')
+
+def native():
+    """Unpatched thread and sleep functions, so fake callbacks come from real threads like Frida's"""
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey and monkey.is_module_patched('threading'):
+        return monkey.get_original('_thread', 'start_new_thread'), monkey.get_original('time', 'sleep')
+    import _thread
+    return _thread.start_new_thread, time.sleep
+
+start_native_thread, native_sleep = native()
+
+class FridaError(Exception):
+    pass
+
+class ProcessNotFoundError(FridaError):
+    pass
+
+class InvalidOperationError(FridaError):
+    pass
+
+class Application:
+    def __init__(self, identifier, name, pid=0):
+        self.identifier = identifier
+        self.name = name
+        self.pid = pid
+        self.parameters = {}
+
+class Process:
+    def __init__(self, pid, name):
+        self.pid = pid
+        self.name = name
+        self.parameters = {}
+
+class Signals:
+    def __init__(self):
+        self.handlers = {}
+        self.lock = threading.Lock()
+
+    def on(self, signal, callback):
+        with self.lock:
+            self.handlers.setdefault(signal, []).append(callback)
+
+    def off(self, signal, callback):
+        with self.lock:
+            if callback in self.handlers.get(signal, []):
+                self.handlers[signal].remove(callback)
+
+    def fire(self, signal, *args):
+        with self.lock:
+            handlers = list(self.handlers.get(signal, []))
+        for callback in handlers:
+            callback(*args)
+
+class Exports:
+    """exports_sync: every method echoes its name and arguments"""
+
+    def __getattr__(self, name):
+        return lambda *args: {'method': name, 'args': list(args)}
+
+class Script(Signals):
+    def __init__(self, session, source):
+        super().__init__()
+        self.session = session
+        self.rate, self.batch, self.size = MESSAGE_RATE, MESSAGE_BATCH, MESSAGE_SIZE
+        match = DIRECTIVE.search(source)
+        if match:
+            settings = dict(pair.split('=') for pair in match.group(1).split())
+            self.rate = float(settings.get('rate', self.rate))
+            self.batch = int(float(settings.get('batch', self.batch)))
+            self.size = int(float(settings.get('size', self.size)))
+            self.crash = float(settings.get('crash', 0))
+        else:
+            self.crash = 0
+        self.loaded = False
+        self.exports_sync = Exports()
+
+    def load(self):
+        native_sleep(LOAD_LATENCY)
+        self.loaded = True
+        if self.rate > 0:
+            start_native_thread(self.emit_loop, ())
+        if self.crash > 0:
+            start_native_thread(self.crash_later, ())
+
+    def unload(self):
+        self.loaded = False
+
+    def list_exports_sync(self):
+        return ['ping', 'echo']
+
+    def crash_later(self):
+        native_sleep(self.crash)
+        if self.loaded:
+            self.session.terminate('process-terminated')
+
+    def emit_loop(self):
+        """Emit messages at the configured rate in 10 ms ticks until unloaded"""
+        tick = 0.01
+        text = 'x' * self.size
+        owed = 0.0
+        sent = 0
+        while self.loaded and not self.session.detached:
+            owed += self.rate * tick
+            while owed >= self.batch and self.loaded:
+                if self.batch > 1:
+                    records = [{'level': 'log', 'args': [f'{sent + i} {text}']} for i in range(self.batch)]
+                    payload = {'type': 'console.batch', 'records': records}
+                else:
+                    payload = {'type': 'console.log', 'message': f'{sent} {text}'}
+                self.fire('message', {'type': 'send', 'payload': payload}, None)
+                owed -= self.batch
+                sent += self.batch
+            native_sleep(tick)
+
+class Session(Signals):
+    def __init__(self, device, pid):
+        super().__init__()
+        self.device = device
+        self.pid = pid
+        self.detached = False
+
+    def compile_script(self, source, name=None, runtime=None):
+        return source.encode('utf-8')
+
+    def create_script(self, source, name=None, snapshot=None, runtime=None):
+        return Script(self, source)
+
+    def create_script_from_bytes(self, data, name=None, snapshot=None, runtime=None):
+        return Script(self, data.decode('utf-8'))
+
+    def enable_child_gating(self):
+        pass
+
+    def detach(self):
+        self.terminate('application-requested')
+
+    def terminate(self, reason):
+        if not self.detached:
+            self.detached = True
+            self.fire('detached', reason, None)
+
+class Device(Signals):
+    def __init__(self, device_id):
+        super().__init__()
+        self.id = device_id
+        self.name = f'Fake {device_id}'
+        self.type = 'usb'
+        self.apps = [Application(f'com.fake.app{i:04d}', f'Fake App {i}') for i in range(APPS)]
+        self.running = {}  # pid -> process name
+        for i in range(SYSTEM_PROCESSES):
+            self.running[100 + i] = f'system_process_{i}'
+        self.next_pid = 20000
+        self.lock = threading.Lock()
+
+    def enumerate_applications(self):
+        native_sleep(ENUMERATE_LATENCY)
+        return list(self.apps)
+
+    def enumerate_processes(self):
+        native_sleep(ENUMERATE_LATENCY)
+        with self.lock:
+            return [Process(pid, name) for pid, name in self.running.items()]
+
+    def spawn(self, program, **kwargs):
+        native_sleep(SPAWN_LATENCY)
+        name = program[0] if isinstance(program, (list, tuple)) else program
+        with self.lock:
+            self.next_pid += 1
+            self.running[self.next_pid] = name
+            return self.next_pid
+
+    def resume(self, pid):
+        pass
+
+    def attach(self, target, **kwargs):
+        native_sleep(ATTACH_LATENCY)
+        with self.lock:
+            if isinstance(target, int):
+                if target not in self.running:
+                    raise ProcessNotFoundError(f'unable to find process with pid {target}')
+                return Session(self, target)
+            for pid, name in self.running.items():
+                if name == target:
+                    return Session(self, pid)
+        raise ProcessNotFoundError(f"unable to find process with name '{target}'")
+
+    def kill(self, pid):
+        with self.lock:
+            self.running.pop(pid, None)
+
+    def enable_spawn_gating(self):
+        pass
+
+    def disable_spawn_gating(self):
+        pass
+
+    def enumerate_pending_spawn(self):
+        return []
+
+devices = {}
+devices_lock = threading.Lock()
+
+def get_device(device_id, timeout=0, **kwargs):
+    with devices_lock:
+        if device_id not in devices:
+            devices[device_id] = Device(device_id)
+        return devices[device_id]
+
+def get_usb_device(timeout=0, **kwargs):
+    return get_device('fake-000')
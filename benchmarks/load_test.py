@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Concurrent request load test for the Trishul server
+
+Hammers one or more endpoints from many client threads and reports throughput and
+latency. With --modes it starts server.py once per ASYNC_MODE so the threading and
+gevent workers can be compared on the same machine:
+
+    python benchmarks/load_test.py --modes threading,gevent --concurrency 200
+
+To measure how well fast requests survive slow ones, add --slow-path (for example an
+/api/execute call against a connected device) with --slow-concurrency.
+
+Machines without adb or a phone can add --fake-devices, which serves simulated devices
+from benchmarks/fake_adb.py and the stand-in frida package in benchmarks/fakes.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import tempfile
+import subprocess
+import urllib.request
+import urllib.error
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKES_DIR = os.path.join(ROOT, 'benchmarks', 'fakes')
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def request_once(url, body, timeout):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'} if data else {})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        response.read()
+        return response.status
+
+def run_clients(url, concurrency, duration, body=None, timeout=30, stop=None):
+    """Keep `concurrency` clients busy until `duration` elapses; return latencies and errors"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def client():
+        while time.time() < deadline and not (stop and stop.is_set()):
+            started = time.perf_counter()
+            try:
+                request_once(url, body, timeout)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+            except (urllib.error.URLError, OSError) as e:
+                with lock:
+                    errors.append(str(e))
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+def load_test(base_url, args):
+    """Run the fast clients, optionally alongside slow ones, and summarise the fast path"""
+    stop = threading.Event()
+    slow_thread = None
+    if args.slow_path:
+        slow_body = json.loads(args.slow_body) if args.slow_body else None
+        slow_thread = threading.Thread(
+            target=run_clients,
+            args=(base_url + args.slow_path, args.slow_concurrency, args.duration, slow_body, 120, stop),
+            daemon=True
+        )
+        slow_thread.start()
+        time.sleep(0.5)  # Let the slow requests occupy the workers first
+
+    started = time.time()
+    latencies, errors = run_clients(base_url + args.path, args.concurrency, args.duration)
+    elapsed = time.time() - started
+    stop.set()
+
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies) * 1000 if latencies else 0.0,
+        'first_error': errors[0] if errors else None
+    }
+
+def wait_for_server(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            request_once(base_url + '/api/message-stats', None, 2)
+            return True
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.3)
+    return False
+
+def start_server(mode, port, adb_server=None):
+    env = dict(os.environ, ASYNC_MODE=mode, PORT=str(port), HOST='127.0.0.1', DEBUG='false', LOG_LEVEL='WARNING')
+    if adb_server:
+        from fake_adb import write_shim
+        workdir = tempfile.mkdtemp(prefix=f'trishul-load-{mode}-')
+        env.update(
+            PYTHONPATH=os.pathsep.join(filter(None, [FAKES_DIR, os.environ.get('PYTHONPATH')])),
+            ADB_PATH=write_shim(workdir),
+            ADB_TRANSPORT='socket',
+            ADB_SERVER_PORT=str(adb_server.port),
+            LOGS_DIR=os.path.join(workdir, 'logs'),
+            UPLOADS_DIR=os.path.join(workdir, 'uploads')
+        )
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'server.py')],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def print_result(label, result):
+    print(f"[+] {label:<10} {result['requests']:>8} req  {result['errors']:>5} err  "
+          f"{result['rps']:>9.1f} req/s  p50 {result['p50_ms']:>8.1f} ms  "
+          f"p99 {result['p99_ms']:>8.1f} ms  max {result['max_ms']:>8.1f} ms")
+    if result['first_error']:
+        print(f"    first error: {result['first_error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent request load test for the Trishul server')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Server to test when --modes is not given')
+    parser.add_argument('--modes', help='Comma-separated ASYNC_MODE values to start and compare, e.g. threading,gevent')
+    parser.add_argument('--port', type=int, default=5055, help='Port for servers started by --modes')
+    parser.add_argument('--path', default='/api/devices', help='Endpoint hit by the measured clients')
+    parser.add_argument('--concurrency', type=int, default=100, help='Concurrent measured clients')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run each test')
+    parser.add_argument('--slow-path', help='Endpoint kept busy in the background, e.g. /api/execute')
+    parser.add_argument('--slow-body', help='JSON body POSTed to --slow-path')
+    parser.add_argument('--slow-concurrency', type=int, default=20, help='Concurrent background slow clients')
+    parser.add_argument('--fake-devices', type=int, default=0, help='Serve this many simulated devices to servers started by --modes')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    if args.modes:
+        adb_server = None
+        if args.fake_devices:
+            from fake_adb import FakeAdbServer
+            adb_server = FakeAdbServer(devices=args.fake_devices).start()
+        for mode in args.modes.split(','):
+            base_url = f'http://127.0.0.1:{args.port}'
+            print(f"[*] Starting server with ASYNC_MODE={mode}")
+            server = start_server(mode, args.port, adb_server)
+            try:
+                if not wait_for_server(base_url):
+                    print(f"[-] Server did not come up with ASYNC_MODE={mode}")
+                    continue
+                results[mode] = load_test(base_url, args)
+            finally:
+                server.terminate()
+                server.wait(timeout=15)
+    else:
+        results[args.url] = load_test(args.url.rstrip('/'), args)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"[*] {args.concurrency} clients on {args.path} for {args.duration:g}s"
+              + (f" with {args.slow_concurrency} clients on {args.slow_path}" if args.slow_path else ''))
+        for label, result in results.items():
+            print_result(label, result)
+
+if __name__ == "__main__":
+    main()
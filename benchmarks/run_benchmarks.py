@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the Trishul server hot paths, no phone needed
+
+Starts a fake adb server (fake_adb.py) and runs server.py against it with the fake
+frida package from benchmarks/fakes, then drives:
+
+    devices   GET /api/devices
+    connect   POST /api/connect (wait) + /api/disconnect cycles
+    search    GET /api/search-apps on a connected device
+    hook      POST /api/hook + /api/unhook cycles
+    fanout    hooked apps emitting messages to Socket.IO clients
+
+Each scenario reports throughput, p50/p99 latency and the server's peak RSS. Results
+can be saved as a baseline and later runs compared against it:
+
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baselines/local.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baselines/local.json
+
+A comparison exits with status 1 when throughput drops, or p99 or memory grows, by more
+than --tolerance.
+
+With --nodes N the server under test is a central instance (NODE_LISTEN) with N node
+agents on localhost, each a server.py of its own with --devices fake devices, so every
+scenario goes through the node link:
+
+    python benchmarks/run_benchmarks.py --nodes 3 --scenarios devices,hook,fanout
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+
+from fake_adb import FakeAdbServer, write_shim
+from load_test import percentile, run_clients, wait_for_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKES_DIR = os.path.join(ROOT, 'benchmarks', 'fakes')
+SCENARIOS = ['devices', 'connect', 'search', 'hook', 'fanout']
+HOOK_SCRIPT = 'console.log("benchmark");\n'
+
+# Which direction is worse for each compared metric
+HIGHER_IS_WORSE = {'p50_ms': True, 'p99_ms': True, 'rss_peak_mb': True, 'rps': False, 'messages_per_s': False}
+
+def post(base_url, path, body, timeout=60):
+    req = urllib.request.Request(base_url + path, data=json.dumps(body).encode(),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read() or b'null')
+
+def get_json(base_url, path, timeout=30):
+    with urllib.request.urlopen(base_url + path, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def rss_mb(pid):
+    """Resident set size of a process in MB, from /proc or psutil"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024.0 * 1024.0)
+    except Exception:
+        return 0.0
+
+class MemorySampler:
+    """Track the server's peak RSS while a scenario runs"""
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0.0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.peak = max(self.peak, rss_mb(self.pid))
+            self.stop_event.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+        self.peak = max(self.peak, rss_mb(self.pid))
+
+def run_cycles(cycle, concurrency, duration):
+    """Run cycle(client_index) from many threads until duration passes; return latencies and errors"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def client(index):
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                cycle(index)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                with lock:
+                    errors.append(str(e))
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+def summarize(latencies, errors, elapsed, rss_peak):
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'rss_peak_mb': rss_peak,
+        'first_error': errors[0] if errors else None
+    }
+
+class Bench:
+    def __init__(self, args, base_url, server, device_ids):
+        self.args = args
+        self.base_url = base_url
+        self.server = server
+        self.device_ids = device_ids
+
+    def measure(self, work):
+        """Run work() -> (latencies, errors) while sampling memory"""
+        with MemorySampler(self.server.pid) as sampler:
+            started = time.time()
+            latencies, errors = work()
+            elapsed = time.time() - started
+        return summarize(latencies, errors, elapsed, sampler.peak)
+
+    def connect_all(self):
+        for device_id in self.device_ids:
+            post(self.base_url, '/api/connect', {'deviceId': device_id, 'wait': True})
+
+    def scenario_devices(self):
+        return self.measure(lambda: run_clients(self.base_url + '/api/devices', self.args.concurrency, self.args.duration))
+
+    def scenario_connect(self):
+        def cycle(index):
+            device_id = self.device_ids[index % len(self.device_ids)]
+            post(self.base_url, '/api/connect', {'deviceId': device_id, 'wait': True})
+            post(self.base_url, '/api/disconnect', {'deviceId': device_id})
+        # One client per device; connecting the same device twice just joins the running job
+        return self.measure(lambda: run_cycles(cycle, len(self.device_ids), self.args.duration))
+
+    def scenario_search(self):
+        self.connect_all()
+        url = f'{self.base_url}/api/search-apps?deviceId={self.device_ids[0]}&query=app00&limit=50'
+        return self.measure(lambda: run_clients(url, self.args.concurrency, self.args.duration))
+
+    def scenario_hook(self):
+        self.connect_all()
+
+        def cycle(index):
+            # Each client owns one app so hooks on different apps overlap
+            body = {'deviceId': self.device_ids[index % len(self.device_ids)], 'appId': f'com.fake.app{index:04d}'}
+            post(self.base_url, '/api/hook', dict(body, script=HOOK_SCRIPT))
+            post(self.base_url, '/api/unhook', body)
+        return self.measure(lambda: run_cycles(cycle, self.args.concurrency, self.args.duration))
+
+    def scenario_fanout(self):
+        self.connect_all()
+        script = f'// fake-frida: rate={self.args.message_rate} batch={self.args.message_batch}\n' + HOOK_SCRIPT
+        targets = [{'deviceId': device_id, 'appId': f'com.fake.app{i:04d}'}
+                   for device_id in self.device_ids for i in range(self.args.fanout_apps)]
+
+        received = [0] * self.args.fanout_clients
+        clients = self.socketio_clients(received)
+
+        with MemorySampler(self.server.pid) as sampler:
+            if self.args.nodes:
+                # Batches are not split across nodes; hook each target through the proxy
+                for target in targets:
+                    post(self.base_url, '/api/hook', dict(target, script=script))
+            else:
+                post(self.base_url, '/api/hook/batch', {'targets': targets, 'script': script})
+            time.sleep(1.0)  # Let every emitter ramp up before counting
+            before = sum(received)
+            started = time.time()
+            time.sleep(self.args.duration)
+            delivered = sum(received) - before
+            elapsed = time.time() - started
+            stats = get_json(self.base_url, '/api/message-stats')
+            for target in targets:
+                post(self.base_url, '/api/unhook', target)
+
+        for client in clients:
+            client.disconnect()
+
+        sessions = stats.get('sessions', [])
+        result = {
+            'apps': len(targets),
+            'clients': len(clients),
+            'messages_per_s': (delivered / elapsed / max(len(clients), 1)) if clients else 0.0,
+            'server_emitted': sum(s['emitted'] for s in sessions),
+            'server_dropped': sum(s['dropped'] for s in sessions),
+            'rss_peak_mb': sampler.peak
+        }
+        if not clients:
+            result['note'] = 'python-socketio client not installed; only server-side counters reported'
+        return result
+
+    def socketio_clients(self, received):
+        try:
+            import socketio
+        except ImportError:
+            return []
+        clients = []
+        query = {
+            'json': '',
+            'msgpack': '?encoding=msgpack',
+            'msgpack+deflate': '?encoding=msgpack&compression=deflate'
+        }[self.args.wire]
+        for index in range(len(received)):
+            client = socketio.Client()
+
+            def on_batch(data, index=index):
+                if isinstance(data, bytes):
+                    data = unpack_frame(data)
+                received[index] += len(data.get('messages', []))
+            client.on('frida_batch', on_batch)
+            client.connect(self.base_url + query, wait_timeout=10)
+            clients.append(client)
+        return clients
+
+def unpack_frame(frame):
+    """Decode a packed event: a flag byte (1 = deflated) and a MessagePack body"""
+    import zlib
+    import msgpack
+    body = zlib.decompress(frame[1:]) if frame[0] & 1 else frame[1:]
+    return msgpack.unpackb(body, raw=False)
+
+def start_server(args, adb_server, workdir, port=None, **extra_env):
+    os.makedirs(workdir, exist_ok=True)
+    shim = write_shim(workdir)
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [FAKES_DIR, os.environ.get('PYTHONPATH')])),
+        ADB_PATH=shim,
+        ADB_TRANSPORT='socket',
+        ADB_SERVER_PORT=str(adb_server.port),
+        ASYNC_MODE=args.mode,
+        PORT=str(port or args.port),
+        HOST='127.0.0.1',
+        DEBUG='false',
+        LOG_LEVEL='WARNING',
+        LOGS_DIR=os.path.join(workdir, 'logs'),
+        UPLOADS_DIR=os.path.join(workdir, 'uploads'),
+        FAKE_FRIDA_APPS=str(args.apps),
+        **extra_env
+    )
+    log = open(os.path.join(workdir, 'server.out'), 'wb')
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, 'server.py')], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def start_nodes(args, workdir):
+    """Start --nodes agents, each with its own fake adb server, registered with the central on --node-port"""
+    nodes = []
+    for index in range(args.nodes):
+        adb_server = FakeAdbServer(devices=args.devices, shell_latency=args.shell_latency, prefix=f'node{index}').start()
+        server = start_server(args, adb_server, os.path.join(workdir, f'node{index}'), args.port + 1 + index,
+                              NODE_CENTRAL=f'127.0.0.1:{args.node_port}', NODE_NAME=f'node{index}', NODE_TOKEN='benchmark')
+        nodes.append((adb_server, server))
+    return nodes
+
+def wait_for_devices(base_url, device_ids, timeout=30):
+    """Wait until /api/devices lists every device, e.g. once all node agents registered"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if set(device_ids) <= {device['id'] for device in get_json(base_url, '/api/devices')}:
+                return True
+        except (urllib.error.URLError, OSError, ValueError):
+            pass
+        time.sleep(0.3)
+    return False
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions of results against a baseline"""
+    regressions = []
+    for scenario, result in results.items():
+        for metric, higher_is_worse in HIGHER_IS_WORSE.items():
+            old = baseline.get(scenario, {}).get(metric)
+            new = result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change > tolerance) if higher_is_worse else (change < -tolerance):
+                regressions.append(f'{scenario}.{metric}: {old:.1f} -> {new:.1f} ({change:+.0%})')
+    return regressions
+
+def print_result(scenario, result):
+    if 'messages_per_s' in result:
+        print(f"[+] {scenario:<8} {result['apps']:>4} apps  {result['clients']:>3} clients  "
+              f"{result['messages_per_s']:>10.0f} msg/s per client  emitted {result['server_emitted']}  "
+              f"dropped {result['server_dropped']}  rss {result['rss_peak_mb']:.0f} MB")
+    else:
+        print(f"[+] {scenario:<8} {result['requests']:>7} req  {result['errors']:>4} err  {result['rps']:>8.1f} req/s  "
+              f"p50 {result['p50_ms']:>7.1f} ms  p99 {result['p99_ms']:>7.1f} ms  rss {result['rss_peak_mb']:.0f} MB")
+        if result['first_error']:
+            print(f"    first error: {result['first_error']}")
+    if result.get('note'):
+        print(f"    {result['note']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Trishul server against fake devices')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenarios to run')
+    parser.add_argument('--mode', default='threading', help='ASYNC_MODE of the server under test')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--devices', type=int, default=4, help='Simulated devices')
+    parser.add_argument('--apps', type=int, default=200, help='Apps installed on each simulated device')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients per scenario')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds per scenario')
+    parser.add_argument('--shell-latency', type=float, default=0.0, help='Seconds added to every fake adb shell command')
+    parser.add_argument('--fanout-apps', type=int, default=4, help='Apps hooked per device in the fanout scenario')
+    parser.add_argument('--fanout-clients', type=int, default=4, help='Socket.IO clients in the fanout scenario')
+    parser.add_argument('--message-rate', type=int, default=2000, help='Messages per second per hooked app')
+    parser.add_argument('--message-batch', type=int, default=1, help='console.batch size, 1 for single messages')
+    parser.add_argument('--wire', choices=['json', 'msgpack', 'msgpack+deflate'], default='json',
+                        help='Encoding the fanout clients negotiate for frida_batch')
+    parser.add_argument('--nodes', type=int, default=0, help='Node agents behind a central server, 0 to test one server')
+    parser.add_argument('--node-port', type=int, default=5150, help='Port the central server accepts node agents on')
+    parser.add_argument('--baseline', help='Compare against this baseline JSON')
+    parser.add_argument('--save-baseline', help='Write the results to this baseline JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative change before a regression')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    # A central instance has no devices of its own; they all sit behind node agents
+    adb_server = FakeAdbServer(devices=0 if args.nodes else args.devices, shell_latency=args.shell_latency).start()
+    base_url = f'http://127.0.0.1:{args.port}'
+
+    with tempfile.TemporaryDirectory(prefix='trishul-bench-') as workdir:
+        node_env = {'NODE_LISTEN': f'127.0.0.1:{args.node_port}', 'NODE_TOKEN': 'benchmark'} if args.nodes else {}
+        server = start_server(args, adb_server, workdir, **node_env)
+        nodes = start_nodes(args, workdir) if args.nodes else []
+        device_ids = sorted(adb_server.devices) + sorted(serial for node_adb, _ in nodes for serial in node_adb.devices)
+        try:
+            if not wait_for_server(base_url) or not wait_for_devices(base_url, device_ids):
+                with open(os.path.join(workdir, 'server.out'), 'rb') as f:
+                    sys.stderr.write(f.read().decode('utf-8', 'replace')[-4000:])
+                sys.exit('[-] Server did not come up')
+            bench = Bench(args, base_url, server, device_ids)
+
+            results = {}
+            for scenario in args.scenarios.split(','):
+                results[scenario] = getattr(bench, f'scenario_{scenario}')()
+                if not args.json:
+                    print_result(scenario, results[scenario])
+        finally:
+            for process in [server] + [node for _, node in nodes]:
+                process.terminate()
+                process.wait(timeout=15)
+            for fake_adb in [adb_server] + [node_adb for node_adb, _ in nodes]:
+                fake_adb.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"[*] Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"[-] {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"    {regression}")
+            sys.exit(1)
+        print(f"[*] No regressions against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,75 @@
-import React, { useEffect, useRef, useState } from 'react';
+import React, { useEffect, useRef } from 'react';
 import { Box, Paper, Typography } from '@mui/material';
 import { Terminal as XTerm } from 'xterm';
 import { FitAddon } from 'xterm-addon-fit';
 import { WebLinksAddon } from 'xterm-addon-web-links';
 import 'xterm/css/xterm.css';
 import { useDevice } from '../contexts/DeviceContext';
+import { useSocket } from '../contexts/SocketContext';
+
+// xterm needs carriage returns to start output lines at column zero
+const toTerminal = (text) => text.replace(/\r?\n/g, '\r\n');
+
+// Marks a command whose stream ID has not come back from the server yet
+const PENDING = 'pending';
 
 const Terminal = () => {
   const terminalRef = useRef(null);
   const xtermRef = useRef(null);
   const fitAddonRef = useRef(null);
-  const [command, setCommand] = useState('');
-  const { selectedDevice, executeCommand } = useDevice();
+  const commandRef = useRef('');
+  const streamRef = useRef(null);
+  const earlyEventsRef = useRef([]);  // Events that arrive before the stream ID is known
+  const selectedDeviceRef = useRef(null);
+  const { selectedDevice, startCommandStream, killCommandStream } = useDevice();
+  const { socket } = useSocket();
+
+  useEffect(() => {
+    selectedDeviceRef.current = selectedDevice;
+  }, [selectedDevice]);
+
+  const handleOutput = (data) => {
+    if (!xtermRef.current) return;
+    if (streamRef.current === PENDING) {
+      earlyEventsRef.current.push(['output', data]);
+      return;
+    }
+    if (data.streamId !== streamRef.current) return;
+    const text = toTerminal(data.data);
+    xtermRef.current.write(data.stream === 'stderr' ? `\x1b[31m${text}\x1b[0m` : text);
+  };
+
+  const handleExit = (data) => {
+    if (!xtermRef.current) return;
+    if (streamRef.current === PENDING) {
+      earlyEventsRef.current.push(['exit', data]);
+      return;
+    }
+    if (data.streamId !== streamRef.current) return;
+    streamRef.current = null;
+    if (data.reason === 'killed') {
+      xtermRef.current.writeln('\x1b[33m^C\x1b[0m');
+    } else if (data.reason === 'timeout') {
+      xtermRef.current.writeln('\r\n\x1b[31mCommand timed out\x1b[0m');
+    } else if (data.error) {
+      xtermRef.current.writeln(`\r\n\x1b[31mError: ${data.error}\x1b[0m`);
+    } else if (data.exitCode) {
+      xtermRef.current.writeln(`\x1b[31mCommand exited with code ${data.exitCode}\x1b[0m`);
+    }
+    writePrompt();
+  };
+
+  // Write output of the running command as it streams in
+  useEffect(() => {
+    if (!socket) return undefined;
+
+    socket.on('execute_output', handleOutput);
+    socket.on('execute_exit', handleExit);
+    return () => {
+      socket.off('execute_output', handleOutput);
+      socket.off('execute_exit', handleExit);
+    };
+  }, [socket]);
 
   useEffect(() => {
     // Initialize terminal
@@ -53,24 +111,34 @@ const Terminal = () => {
       xtermRef.current.onKey(({ key, domEvent }) => {
         const printable = !domEvent.altKey && !domEvent.ctrlKey && !domEvent.metaKey;
 
-        if (domEvent.keyCode === 13) { // Enter key
+        if (domEvent.ctrlKey && domEvent.key === 'c') { // Ctrl+C stops the running command
+          if (streamRef.current && streamRef.current !== PENDING) {
+            killCommandStream(streamRef.current);
+          } else {
+            xtermRef.current.writeln('^C');
+            commandRef.current = '';
+            writePrompt();
+          }
+        } else if (streamRef.current) {
+          // Input is ignored while a command is running
+        } else if (domEvent.keyCode === 13) { // Enter key
           xtermRef.current.writeln('');
           
-          if (command.trim()) {
-            handleCommand(command);
+          if (commandRef.current.trim()) {
+            handleCommand(commandRef.current);
           } else {
             writePrompt();
           }
           
-          setCommand('');
+          commandRef.current = '';
         } else if (domEvent.keyCode === 8) { // Backspace key
-          if (command.length > 0) {
+          if (commandRef.current.length > 0) {
             xtermRef.current.write('\b \b');
-            setCommand(command.substring(0, command.length - 1));
+            commandRef.current = commandRef.current.substring(0, commandRef.current.length - 1);
           }
         } else if (printable) {
           xtermRef.current.write(key);
-          setCommand(command + key);
+          commandRef.current += key;
         }
       });
 
@@ -93,38 +161,32 @@ const Terminal = () => {
 
   // Write command prompt
   const writePrompt = () => {
-    const devicePrompt = selectedDevice ? selectedDevice : 'no-device';
+    const devicePrompt = selectedDeviceRef.current ? selectedDeviceRef.current : 'no-device';
     xtermRef.current.write(`masf@${devicePrompt}$ `);
   };
 
-  // Handle command execution
+  // Handle command execution; output and the exit status arrive over the socket
   const handleCommand = async (cmd) => {
-    if (!selectedDevice) {
+    if (!selectedDeviceRef.current) {
       xtermRef.current.writeln('No device connected. Please connect a device first.');
       writePrompt();
       return;
     }
 
+    streamRef.current = PENDING;
+    earlyEventsRef.current = [];
     try {
-      // Execute command on device
-      const result = await executeCommand(selectedDevice, cmd);
-      
-      if (result.stdout) {
-        xtermRef.current.writeln(result.stdout);
-      }
-      
-      if (result.stderr) {
-        xtermRef.current.writeln(`\x1b[31m${result.stderr}\x1b[0m`);
-      }
-      
-      if (result.exitCode !== 0) {
-        xtermRef.current.writeln(`\x1b[31mCommand exited with code ${result.exitCode}\x1b[0m`);
-      }
+      const stream = await startCommandStream(selectedDeviceRef.current, cmd);
+      streamRef.current = stream.streamId;
+      // Replay anything the server sent before the response arrived
+      const earlyEvents = earlyEventsRef.current;
+      earlyEventsRef.current = [];
+      earlyEvents.forEach(([kind, data]) => (kind === 'output' ? handleOutput(data) : handleExit(data)));
     } catch (error) {
+      streamRef.current = null;
       xtermRef.current.writeln(`\x1b[31mError: ${error.message}\x1b[0m`);
+      writePrompt();
     }
-    
-    writePrompt();
   };
 
   return (
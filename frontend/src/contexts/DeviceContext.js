@@ -1,5 +1,6 @@
-import React, { createContext, useContext, useState } from 'react';
+import React, { createContext, useContext, useEffect, useRef, useState } from 'react';
 import axios from 'axios';
+import { useSocket } from './SocketContext';
 
 const DeviceContext = createContext();
 
@@ -13,6 +14,64 @@ export const DeviceProvider = ({ children }) => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
+  const { socket } = useSocket();
+  // Devices whose events this UI receives; the server only streams subscribed devices
+  const watchedDevices = useRef(new Set());
+
+  const watchDevice = (deviceId) => {
+    if (!deviceId || watchedDevices.current.has(deviceId)) return;
+    watchedDevices.current.add(deviceId);
+    socket?.emit('subscribe', { deviceId });
+  };
+
+  const unwatchDevice = (deviceId) => {
+    if (!watchedDevices.current.delete(deviceId)) return;
+    socket?.emit('unsubscribe', { deviceId });
+  };
+
+  // Subscriptions belong to the connection; leave the default firehose and renew them on every (re)connect
+  useEffect(() => {
+    if (!socket) return undefined;
+
+    const resubscribe = () => {
+      socket.emit('unsubscribe', {});
+      watchedDevices.current.forEach((deviceId) => socket.emit('subscribe', { deviceId }));
+    };
+
+    if (socket.connected) resubscribe();
+    socket.on('connect', resubscribe);
+    return () => {
+      socket.off('connect', resubscribe);
+    };
+  }, [socket]);
+
+  useEffect(() => {
+    watchDevice(selectedDevice);
+  }, [selectedDevice, socket]);
+
+  // The server pushes device changes as deltas instead of making us poll
+  useEffect(() => {
+    if (!socket) return undefined;
+
+    const handleDeviceUpdate = ({ added = [], changed = [], removed = [] }) => {
+      setDevices((prevDevices) => {
+        const updates = new Map([...added, ...changed].map((device) => [device.id, device]));
+        const merged = prevDevices
+          .filter((device) => !removed.includes(device.id))
+          .map((device) => {
+            const update = updates.get(device.id);
+            updates.delete(device.id);
+            return update ? { ...device, ...update } : device;
+          });
+        return merged.concat(Array.from(updates.values()));
+      });
+    };
+
+    socket.on('device_update', handleDeviceUpdate);
+    return () => {
+      socket.off('device_update', handleDeviceUpdate);
+    };
+  }, [socket]);
 
   const fetchDevices = async () => {
     try {
@@ -33,17 +92,30 @@ export const DeviceProvider = ({ children }) => {
     try {
       setLoading(true);
       setError(null);
+      watchDevice(deviceId);  // Bring-up status lines are scoped to the device
       const response = await axios.post('/api/connect', { deviceId });
+      const { jobId } = response.data;
+      let job = { state: response.data.status };
       
-      if (response.data.status === 'connected') {
-        const updatedDevices = devices.map(device => 
-          device.id === deviceId ? { ...device, connected: true } : device
-        );
-        setDevices(updatedDevices);
-        setSelectedDevice(deviceId);
+      // Bring-up runs as a background job on the server; follow it until it settles
+      while (job.state === 'pending' || job.state === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 500));
+        const jobResponse = await axios.get(`/api/connect/${jobId}`);
+        job = jobResponse.data;
       }
       
-      return response.data;
+      if (job.state !== 'connected') {
+        setError(job.error || 'Failed to connect to device');
+        return null;
+      }
+      
+      const updatedDevices = devices.map(device => 
+        device.id === deviceId ? { ...device, connected: true } : device
+      );
+      setDevices(updatedDevices);
+      setSelectedDevice(deviceId);
+      
+      return { status: 'connected', deviceId, jobId };
     } catch (err) {
       setError(err.response?.data?.error || err.message);
       return null;
@@ -59,6 +131,7 @@ export const DeviceProvider = ({ children }) => {
       const response = await axios.post('/api/disconnect', { deviceId });
       
       if (response.data.status === 'disconnected') {
+        unwatchDevice(deviceId);
         const updatedDevices = devices.map(device => 
           device.id === deviceId ? { ...device, connected: false } : device
         );
@@ -137,6 +210,27 @@ export const DeviceProvider = ({ children }) => {
     }
   };
 
+  // Start a command whose output arrives as execute_output socket events
+  const startCommandStream = async (deviceId, command, timeout) => {
+    try {
+      setError(null);
+      const response = await axios.post('/api/execute', { deviceId, command, stream: true, timeout });
+      return response.data;
+    } catch (err) {
+      setError(err.response?.data?.error || err.message);
+      throw new Error(err.response?.data?.error || err.message);
+    }
+  };
+
+  const killCommandStream = async (streamId) => {
+    try {
+      const response = await axios.delete(`/api/execute/streams/${streamId}`);
+      return response.data;
+    } catch (err) {
+      return null;
+    }
+  };
+
   const uploadFridaServer = async (deviceId, file) => {
     try {
       setLoading(true);
@@ -200,6 +294,8 @@ export const DeviceProvider = ({ children }) => {
         hookApp,
         unhookApp,
         executeCommand,
+        startCommandStream,
+        killCommandStream,
         uploadFridaServer,
         setSelectedDevice,
         setSelectedApp,
@@ -1,5 +1,7 @@
 import React, { createContext, useContext, useEffect, useState } from 'react';
 import { io } from 'socket.io-client';
+import { decode } from '@msgpack/msgpack';
+import { inflate } from 'pako';
 
 const SocketContext = createContext();
 
@@ -14,6 +16,8 @@ export const SocketProvider = ({ children }) => {
     // Create socket connection
     const newSocket = io(window.location.origin, {
       transports: ['websocket'],
+      // Ask for frida_batch as MessagePack frames, deflated when large; older servers ignore this
+      query: { encoding: 'msgpack', compression: 'deflate' },
     });
 
     // Set up event handlers
@@ -36,39 +40,44 @@ export const SocketProvider = ({ children }) => {
     });
 
     newSocket.on('frida_message', (data) => {
-      addMessage({
-        type: 'frida',
-        text: JSON.stringify(data.payload, null, 2),
-        deviceId: data.deviceId,
-        appId: data.appId,
-        timestamp: new Date().toISOString(),
-      });
+      addMessage(fridaMessage(data));
     });
     
     // New handler for console.log messages from Frida
     newSocket.on('frida_console', (data) => {
-      const logType = data.logType || 'log';
-      const icon = getLogTypeIcon(logType);
-      
-      addMessage({
-        type: 'console',
-        subtype: logType,
-        text: `${icon} ${data.message}`,
-        raw: data.message,
-        deviceId: data.deviceId,
-        appId: data.appId,
-        timestamp: new Date().toISOString(),
-      });
+      addMessage(consoleMessage(data));
     });
 
     newSocket.on('frida_error', (data) => {
-      addMessage({
-        type: 'error',
-        text: data.error,
-        deviceId: data.deviceId,
-        appId: data.appId,
-        timestamp: new Date().toISOString(),
+      addMessage(errorMessage(data));
+    });
+
+    // Batched Frida output - one state update per batch instead of per message
+    newSocket.on('frida_batch', (received) => {
+      const batch = received instanceof ArrayBuffer ? unpackFrame(received) : received;
+      const converted = batch.messages.map((event) => {
+        const data = { ...event, deviceId: batch.deviceId, appId: batch.appId };
+        switch (event.type) {
+          case 'frida_console':
+            return consoleMessage(data);
+          case 'frida_error':
+            return errorMessage(data);
+          default:
+            return fridaMessage(data);
+        }
       });
+
+      if (batch.dropped) {
+        converted.push({
+          type: 'error',
+          text: `${batch.dropped} message(s) dropped because the client fell behind`,
+          deviceId: batch.deviceId,
+          appId: batch.appId,
+          timestamp: new Date().toISOString(),
+        });
+      }
+
+      addMessages(converted);
     });
 
     setSocket(newSocket);
@@ -79,6 +88,58 @@ export const SocketProvider = ({ children }) => {
     };
   }, []);
   
+  // Packed frames: a flag byte (1 = deflated) followed by the MessagePack body
+  const unpackFrame = (frame) => {
+    const bytes = new Uint8Array(frame);
+    const body = bytes[0] & 1 ? inflate(bytes.subarray(1)) : bytes.subarray(1);
+    return decode(body);
+  };
+
+  const eventTimestamp = (data) => (
+    data.timestamp ? new Date(data.timestamp * 1000).toISOString() : new Date().toISOString()
+  );
+
+  // Short hex preview for binary payloads delivered through Frida's data channel
+  const describeBinary = (buffer) => {
+    if (!buffer) return '';
+    const bytes = new Uint8Array(buffer);
+    const preview = Array.from(bytes.slice(0, 64))
+      .map((b) => b.toString(16).padStart(2, '0'))
+      .join(' ');
+    return `\n[${bytes.length} bytes] ${preview}${bytes.length > 64 ? ' ...' : ''}`;
+  };
+
+  const fridaMessage = (data) => ({
+    type: 'frida',
+    text: JSON.stringify(data.payload, null, 2) + describeBinary(data.data),
+    deviceId: data.deviceId,
+    appId: data.appId,
+    timestamp: eventTimestamp(data),
+  });
+
+  const consoleMessage = (data) => {
+    const logType = data.logType || 'log';
+    const icon = getLogTypeIcon(logType);
+
+    return {
+      type: 'console',
+      subtype: logType,
+      text: `${icon} ${data.message}${describeBinary(data.data)}`,
+      raw: data.message,
+      deviceId: data.deviceId,
+      appId: data.appId,
+      timestamp: eventTimestamp(data),
+    };
+  };
+
+  const errorMessage = (data) => ({
+    type: 'error',
+    text: data.error,
+    deviceId: data.deviceId,
+    appId: data.appId,
+    timestamp: eventTimestamp(data),
+  });
+
   // Helper function to get appropriate icon for log type
   const getLogTypeIcon = (logType) => {
     switch(logType) {
@@ -99,6 +160,12 @@ export const SocketProvider = ({ children }) => {
     setMessages((prevMessages) => [...prevMessages, message]);
   };
 
+  const addMessages = (newMessages) => {
+    if (newMessages.length) {
+      setMessages((prevMessages) => prevMessages.concat(newMessages));
+    }
+  };
+
   const clearMessages = () => {
     setMessages([]);
   };
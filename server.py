@@ -1,26 +1,63 @@
 import os
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# The async worker has to patch the standard library before anything else imports it
+ASYNC_MODE = os.getenv('ASYNC_MODE', 'threading').lower()  # threading (Werkzeug) or gevent
+if os.getenv('TRISHUL_DEVICE_WORKER'):
+    ASYNC_MODE = 'threading'  # Device worker processes never serve requests, see DeviceWorkerPool
+if ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+    import gevent
+
 import json
+import base64
+import collections
+import codecs
+import contextlib
+import functools
 import subprocess
 import threading
+import hashlib
+import bisect
+import re
 import logging
 import time
 import signal
 import sys
-from flask import Flask, request, jsonify, send_from_directory
-from flask_socketio import SocketIO
+import uuid
+import sqlite3
+import queue
+import mmap
+import atexit
+import multiprocessing
+import socket
+import struct
+import zlib
+import hmac
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
+from flask_socketio import SocketIO, join_room, leave_room
 from flask_cors import CORS
 import frida
-from dotenv import load_dotenv
+import msgpack
 from logging.handlers import RotatingFileHandler
 
-# Load environment variables from .env file
-load_dotenv()
-
 # Configuration from environment variables
 PORT = int(os.getenv('PORT', 5000))
 HOST = os.getenv('HOST', '0.0.0.0')
+BLOCKING_WORKERS = int(os.getenv('BLOCKING_WORKERS', 32))  # OS threads for Frida calls under ASYNC_MODE=gevent
 DEBUG = os.getenv('DEBUG', 'false').lower() == 'true'
 ADB_PATH = os.getenv('ADB_PATH', 'adb')
+ADB_TRANSPORT = os.getenv('ADB_TRANSPORT', 'socket').lower()  # socket (adb server protocol) or subprocess
+ADB_SERVER_HOST = os.getenv('ADB_SERVER_HOST', '127.0.0.1')
+ADB_SERVER_PORT = int(os.getenv('ADB_SERVER_PORT', 5037))
+ADB_POOL_SIZE = int(os.getenv('ADB_POOL_SIZE', 2))  # Idle transport connections kept open per device
+ADB_SOCKET_TIMEOUT = int(os.getenv('ADB_SOCKET_TIMEOUT', 30))  # Seconds before an adb server handshake or host command gives up
 FRIDA_SERVER_PATH = os.getenv('FRIDA_SERVER_PATH', '/data/local/tmp/frida-server')
 LOGS_DIR = os.getenv('LOGS_DIR', './logs')
 UPLOADS_DIR = os.getenv('UPLOADS_DIR', './uploads')
@@ -30,6 +67,134 @@ LOG_FILE = os.getenv('LOG_FILE', os.path.join(LOGS_DIR, 'server.log'))
 LOG_MAX_SIZE = int(os.getenv('LOG_MAX_SIZE', 10 * 1024 * 1024))  # 10MB by default
 LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))  # Keep 5 backup logs by default
 
+# Frida message batching settings
+MESSAGE_BATCH_SIZE = int(os.getenv('MESSAGE_BATCH_SIZE', 256))  # Max messages per frida_batch event
+MESSAGE_BATCH_INTERVAL = int(os.getenv('MESSAGE_BATCH_INTERVAL_MS', 50)) / 1000.0  # Max time a message waits
+MESSAGE_QUEUE_SIZE = int(os.getenv('MESSAGE_QUEUE_SIZE', 10000))  # Per-session queue bound
+MESSAGE_DROP_POLICY = os.getenv('MESSAGE_DROP_POLICY', 'drop-oldest').lower()  # drop-oldest, drop-newest or block
+MESSAGE_BLOCK_TIMEOUT = int(os.getenv('MESSAGE_BLOCK_TIMEOUT_MS', 200)) / 1000.0  # Max wait under the block policy
+
+# Packed Socket.IO encoding settings (clients opt in with ?encoding=msgpack&compression=deflate)
+WIRE_PACKED_EVENTS = set(os.getenv('WIRE_PACKED_EVENTS', 'frida_batch').split(','))  # Events sent as MessagePack frames
+WIRE_COMPRESS_MIN = int(os.getenv('WIRE_COMPRESS_MIN', 1024))  # Frames at least this big are deflated for clients that accept it
+WIRE_COMPRESS_LEVEL = int(os.getenv('WIRE_COMPRESS_LEVEL', 1))  # zlib level, low favours latency over ratio
+
+# Agent-side console batching settings
+AGENT_BATCHING = os.getenv('AGENT_BATCHING', 'false').lower() == 'true'  # Default for hooks that don't choose
+AGENT_BATCH_SIZE = int(os.getenv('AGENT_BATCH_SIZE', 100))  # Records buffered in the agent before a send()
+AGENT_BATCH_INTERVAL = int(os.getenv('AGENT_BATCH_INTERVAL_MS', 50))  # Max time a record waits in the agent
+
+# Application index settings
+APP_INDEX_TTL = int(os.getenv('APP_INDEX_TTL', 300))  # Seconds before a device's app list is enumerated again
+PROCESS_INDEX_TTL = float(os.getenv('PROCESS_INDEX_TTL', 5))  # Seconds before a device's process table is diffed again
+
+# Device bring-up settings
+CONNECT_PROBE_WORKERS = int(os.getenv('CONNECT_PROBE_WORKERS', 16))  # Threads shared by concurrent adb probes
+ADB_PROBE_TIMEOUT = int(os.getenv('ADB_PROBE_TIMEOUT', 15))  # Seconds before a single probe is abandoned
+FRIDA_START_TIMEOUT = int(os.getenv('FRIDA_START_TIMEOUT', 10))  # Seconds to wait for frida-server to come up
+CONNECT_JOB_HISTORY = int(os.getenv('CONNECT_JOB_HISTORY', 100))  # Finished connect jobs kept for polling
+
+# Device monitor settings
+DEVICE_PROBE_INTERVAL = int(os.getenv('DEVICE_PROBE_INTERVAL', 5))  # Seconds between frida-server liveness probes
+DEVICE_POLL_INTERVAL = int(os.getenv('DEVICE_POLL_INTERVAL', 2))  # Seconds between adb polls when track-devices is unavailable
+
+# Batch hooking settings
+HOOK_BATCH_WORKERS = int(os.getenv('HOOK_BATCH_WORKERS', 8))  # Max targets hooked at once per batch
+HOOK_BATCH_PER_DEVICE = int(os.getenv('HOOK_BATCH_PER_DEVICE', 2))  # Max concurrent hooks on one device
+HOOK_BATCH_MAX_TARGETS = int(os.getenv('HOOK_BATCH_MAX_TARGETS', 1000))  # Max expanded targets in one batch request
+
+# Device scheduler settings
+DEVICE_WRITE_SLOTS = int(os.getenv('DEVICE_WRITE_SLOTS', 1))  # Concurrent mutating operations per device
+DEVICE_READ_SLOTS = int(os.getenv('DEVICE_READ_SLOTS', 4))  # Concurrent read-only operations per device
+DEVICE_QUEUE_TIMEOUT = float(os.getenv('DEVICE_QUEUE_TIMEOUT', 120))  # Seconds an operation may wait for a slot
+
+# Streaming shell command settings
+EXEC_STREAM_TIMEOUT = float(os.getenv('EXEC_STREAM_TIMEOUT', 3600))  # Seconds before a streamed command is killed, 0 for never
+EXEC_STREAMS_PER_DEVICE = int(os.getenv('EXEC_STREAMS_PER_DEVICE', 8))  # Concurrent streamed commands per device
+EXEC_STREAM_HISTORY = int(os.getenv('EXEC_STREAM_HISTORY', 50))  # Finished streams kept for polling
+EXEC_TAIL_BYTES = int(os.getenv('EXEC_TAIL_BYTES', 64 * 1024))  # Recent output kept per stream
+
+# logcat settings
+LOGCAT_BUFFERS = os.getenv('LOGCAT_BUFFERS', 'main,system,crash')  # Log buffers read with logcat -b
+LOGCAT_BATCH_SIZE = int(os.getenv('LOGCAT_BATCH_SIZE', 500))  # Max entries per logcat_batch event
+LOGCAT_BATCH_INTERVAL = int(os.getenv('LOGCAT_BATCH_INTERVAL_MS', 100)) / 1000.0  # Max time an entry waits
+LOGCAT_QUEUE_SIZE = int(os.getenv('LOGCAT_QUEUE_SIZE', 20000))  # Per-subscriber bound, oldest dropped first
+LOGCAT_HISTORY = int(os.getenv('LOGCAT_HISTORY', 50000))  # Recent entries kept per device for /api/logcat
+
+# Spawn gating settings
+SPAWN_GATING_WORKERS = int(os.getenv('SPAWN_GATING_WORKERS', 8))  # Spawned processes injected at once
+APP_START_TIMEOUT = int(os.getenv('APP_START_TIMEOUT', 10))  # Seconds to wait for a launched app's process
+
+# RPC bridge settings
+RPC_WORKERS = int(os.getenv('RPC_WORKERS', 32))  # RPC calls in flight across all apps
+RPC_TIMEOUT = float(os.getenv('RPC_TIMEOUT', 30))  # Default per-call timeout in seconds
+RPC_BATCH_MAX = int(os.getenv('RPC_BATCH_MAX', 256))  # Max calls in one batch request
+RPC_INFLIGHT_PER_APP = int(os.getenv('RPC_INFLIGHT_PER_APP', 16))  # Calls one app may have running, timed out or not
+
+# frida-server provisioning settings
+FRIDA_SERVER_MARKER = os.getenv('FRIDA_SERVER_MARKER', FRIDA_SERVER_PATH + '.sha256')  # Hash of the pushed binary
+FRIDA_UPLOADS_DIR = os.getenv('FRIDA_UPLOADS_DIR', os.path.join(UPLOADS_DIR, 'frida-server'))  # Uploads, named by hash
+PROVISION_WORKERS = int(os.getenv('PROVISION_WORKERS', 8))  # Devices provisioned at once
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 1024 * 1024))  # Bytes read per chunk when streaming uploads
+
+# Device worker process settings
+DEVICE_WORKERS = int(os.getenv('DEVICE_WORKERS', 0))  # Processes owning Frida sessions, 0 keeps them in-process
+DEVICE_WORKER_THREADS = int(os.getenv('DEVICE_WORKER_THREADS', 16))  # Requests a worker runs at once
+DEVICE_WORKER_TIMEOUT = float(os.getenv('DEVICE_WORKER_TIMEOUT', 120))  # Seconds to wait for a worker's answer
+DEVICE_WORKER_BATCH_SIZE = int(os.getenv('DEVICE_WORKER_BATCH_SIZE', 512))  # Max events per pipe write
+DEVICE_WORKER_BATCH_INTERVAL = int(os.getenv('DEVICE_WORKER_BATCH_INTERVAL_MS', 5)) / 1000.0  # Max wait to fill one
+
+# Node agent settings
+NODE_CENTRAL = os.getenv('NODE_CENTRAL', '')  # host:port of a central instance's NODE_LISTEN; register there as a node agent
+NODE_LISTEN = os.getenv('NODE_LISTEN', '')  # host:port to accept node agents on, empty to run standalone
+NODE_NAME = os.getenv('NODE_NAME') or socket.gethostname()  # How this agent shows up on the central instance
+NODE_TOKEN = os.getenv('NODE_TOKEN', '')  # Shared secret agents present when they register
+NODE_TIMEOUT = float(os.getenv('NODE_TIMEOUT', 120))  # Seconds to wait for a node to answer a proxied request
+NODE_HEARTBEAT = float(os.getenv('NODE_HEARTBEAT', 10))  # Seconds between agent pings, links drop after three missed
+NODE_RECONNECT_MAX = float(os.getenv('NODE_RECONNECT_MAX', 30))  # Longest wait between agent reconnect attempts
+NODE_COMPRESS_MIN = int(os.getenv('NODE_COMPRESS_MIN', 512))  # Frames at least this big are zlib-compressed
+NODE_COMPRESS_LEVEL = int(os.getenv('NODE_COMPRESS_LEVEL', 1))  # zlib level, low favours latency over ratio
+NODE_BATCH_SIZE = int(os.getenv('NODE_BATCH_SIZE', 512))  # Max relayed events per frame
+NODE_BATCH_INTERVAL = int(os.getenv('NODE_BATCH_INTERVAL_MS', 20)) / 1000.0  # Max wait to fill one
+NODE_QUEUE_SIZE = int(os.getenv('NODE_QUEUE_SIZE', 50000))  # Relayed events waiting beyond this are dropped
+NODE_STREAM_CHUNK = int(os.getenv('NODE_STREAM_CHUNK', 64 * 1024))  # Bytes per frame of a relayed streaming response
+NODE_STREAM_WINDOW = int(os.getenv('NODE_STREAM_WINDOW', 16))  # Streamed chunks an agent sends ahead of the reader
+
+# Session supervisor settings
+SESSION_REATTACH = os.getenv('SESSION_REATTACH', 'true').lower() == 'true'  # Re-hook apps whose sessions die
+SESSION_REATTACH_BACKOFF = float(os.getenv('SESSION_REATTACH_BACKOFF', 0.5))  # First retry delay in seconds, doubled each time
+SESSION_REATTACH_BACKOFF_MAX = float(os.getenv('SESSION_REATTACH_BACKOFF_MAX', 30))  # Longest delay between retries
+SESSION_REATTACH_ATTEMPTS = int(os.getenv('SESSION_REATTACH_ATTEMPTS', 20))  # Give up after this many, 0 retries forever
+
+# Metrics settings
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'  # Collect timings for /metrics
+METRICS_BUCKETS = [float(b) for b in os.getenv('METRICS_BUCKETS', '0.001,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30').split(',')]  # Histogram bounds in seconds
+
+# Compiled script cache settings
+SCRIPT_RUNTIME = os.getenv('SCRIPT_RUNTIME', 'qjs')  # Bytecode needs the QuickJS runtime
+SCRIPT_CACHE_MAX_BYTES = int(os.getenv('SCRIPT_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # In-memory LRU bound
+SCRIPT_CACHE_DIR = os.getenv('SCRIPT_CACHE_DIR', os.path.join(UPLOADS_DIR, 'script-cache'))  # On-disk tier
+
+# Trace recording settings
+TRACE_RECORDING = os.getenv('TRACE_RECORDING', 'true').lower() == 'true'  # Record every hooked app's messages
+TRACES_DIR = os.getenv('TRACES_DIR', os.path.join(LOGS_DIR, 'traces'))
+TRACE_SEGMENT_SIZE = int(os.getenv('TRACE_SEGMENT_SIZE', 64 * 1024 * 1024))  # Roll to a new segment file after this
+TRACE_COMMIT_BATCH = int(os.getenv('TRACE_COMMIT_BATCH', 1024))  # Max records written per group commit
+TRACE_INDEX_INTERVAL = int(os.getenv('TRACE_INDEX_INTERVAL', 1000))  # Records between sparse index entries
+TRACE_FSYNC = os.getenv('TRACE_FSYNC', 'false').lower() == 'true'  # fsync after each group commit
+TRACE_META_INTERVAL = float(os.getenv('TRACE_META_INTERVAL', 5))  # Seconds between meta.json refreshes of a live trace
+TRACE_RETENTION_DAYS = float(os.getenv('TRACE_RETENTION_DAYS', 7))  # 0 keeps every finished trace
+TRACE_MAX_BYTES = int(os.getenv('TRACE_MAX_BYTES', 10 * 1024 * 1024 * 1024))  # Oldest traces go past this; 0 disables
+
+# Log search index settings
+LOG_INDEX_ENABLED = os.getenv('LOG_INDEX_ENABLED', 'true').lower() == 'true'
+LOG_INDEX_PATH = os.getenv('LOG_INDEX_PATH', os.path.join(LOGS_DIR, 'frida-logs.db'))
+LOG_INDEX_BATCH_SIZE = int(os.getenv('LOG_INDEX_BATCH_SIZE', 2000))  # Max rows per insert transaction
+LOG_INDEX_INTERVAL = int(os.getenv('LOG_INDEX_INTERVAL_MS', 250)) / 1000.0  # Max wait to fill a batch
+LOG_INDEX_QUEUE_SIZE = int(os.getenv('LOG_INDEX_QUEUE_SIZE', 100000))  # Records waiting beyond this are dropped
+LOG_INDEX_MAX_MESSAGE = int(os.getenv('LOG_INDEX_MAX_MESSAGE', 65536))  # Indexed characters per record
+LOG_INDEX_RETENTION_DAYS = float(os.getenv('LOG_INDEX_RETENTION_DAYS', 7))  # 0 keeps everything
+
 # Setup logging
 def setup_logging():
     """Configure application logging with rotation"""
@@ -72,6 +237,7 @@ logger = setup_logging()
 try:
     os.makedirs(LOGS_DIR, exist_ok=True)
     os.makedirs(UPLOADS_DIR, exist_ok=True)
+    os.makedirs(FRIDA_UPLOADS_DIR, exist_ok=True)
     logger.info(f"Ensured directories exist: {LOGS_DIR}, {UPLOADS_DIR}")
 except Exception as e:
     logger.error(f"Failed to create necessary directories: {str(e)}")
@@ -81,484 +247,1423 @@ except Exception as e:
 app = Flask(__name__, static_folder='frontend/build')
 app.config['SECRET_KEY'] = SECRET_KEY
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*", logger=True, engineio_logger=DEBUG)
+socketio = SocketIO(app, async_mode=ASYNC_MODE, cors_allowed_origins="*", logger=True, engineio_logger=DEBUG)
+
+def run_blocking(func, *args, **kwargs):
+    """Call a blocking Frida function without stalling the event loop
+
+    Under gevent the call runs on the hub's pool of real OS threads; with the
+    threading server every request already has its own thread.
+    """
+    if ASYNC_MODE == 'gevent':
+        return gevent.get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
+
+def from_native_thread(callback):
+    """Wrap a Frida callback so it runs as a greenlet instead of on Frida's thread
+
+    Patched locks and queues are only safe on the event loop's thread, so under
+    gevent each invocation is handed over to the loop.
+    """
+    if ASYNC_MODE != 'gevent':
+        return callback
+    loop = gevent.get_hub().loop
+    return lambda *args: loop.run_callback_threadsafe(gevent.spawn, callback, *args)
 
 # Device management
 connected_devices = {}  # device_id -> frida.core.Device
 frida_sessions = {}     # {device_id: {app_id: session}} - nested dict for multiple apps per device
 running_scripts = {}    # {device_id: {app_id: script}} - nested dict for multiple scripts per device
 device_status = {}      # For tracking each device's status separately
+session_pids = {}       # {device_id: {app_id: pid}} - process each hooked app's session is attached to
+message_pipelines = {}  # {device_id: {app_id: MessagePipeline}} - batched Frida output per hooked app
+message_pipelines_lock = threading.Lock()
+message_flusher_started = False
+device_workers = None   # DeviceWorkerPool when DEVICE_WORKERS > 0, see device_worker_main
+worker_channel = None   # WorkerChannel, only inside a device worker process
+node_hub = None         # NodeHub when NODE_LISTEN is set
+node_agent = None       # NodeAgent when NODE_CENTRAL is set
 
-# Signal handler for graceful shutdown
-def signal_handler(sig, frame):
-    """Handle termination signals and perform cleanup"""
-    logger.info("Received shutdown signal, cleaning up...")
-    # Clean up Frida sessions
-    for device_id in list(frida_sessions.keys()):
-        for app_id in list(frida_sessions.get(device_id, {}).keys()):
-            try:
-                if frida_sessions[device_id][app_id]:
-                    frida_sessions[device_id][app_id].detach()
-                    logger.info(f"Detached Frida session for device {device_id}, app {app_id}")
-            except Exception as e:
-                logger.error(f"Error detaching Frida session: {str(e)}")
-    logger.info("Shutdown complete")
-    sys.exit(0)
+class Metrics:
+    """Prometheus-style counters and histograms for /metrics
 
-# Register signal handlers
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
+    Every OS thread updates its own shard without taking a lock and a scrape sums the
+    shards. Greenlets share their hub thread's shard, which is safe because they only
+    switch on I/O, never in the middle of an update. A scrape folds the shards of
+    threads that have exited into one retired total, so short-lived threads don't pile up.
+    Device worker processes keep their own Metrics; the coordinator merges their
+    snapshot() into its render().
+    """
 
-# Routes for static frontend
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve_frontend(path):
-    if path != "" and os.path.exists(app.static_folder + '/' + path):
-        return send_from_directory(app.static_folder, path)
-    else:
-        return send_from_directory(app.static_folder, 'index.html')
+    def __init__(self):
+        self.shards = {}       # thread id -> {(name, labels): count, or histogram bucket list}
+        self.retired = {}      # Totals of the shards of exited threads
+        self.lock = threading.Lock()  # Only taken to add, retire or sum shards, or to describe
+        self.described = {}    # name -> (type, help)
+        self.collectors = []   # (name, help, callable returning [(labels dict, value)], from_workers)
+        # Same ids as sys._current_frames(), which lists the OS threads still alive
+        self.thread_id = monkey.get_original('threading', 'get_ident') if ASYNC_MODE == 'gevent' else threading.get_ident
 
-# Helper function to verify package exists and get the correct case
-def verify_package_name(device_id, package_name):
-    try:
-        device = connected_devices.get(device_id)
-        if not device:
-            return None, "Device not connected"
-        
-        # Get a list of all installed apps from the device
-        apps = device.enumerate_applications()
-        
-        # First check for exact match
-        for app in apps:
-            if app.identifier.lower() == package_name.lower():
-                return app.identifier, None  # Return the correct case
-        
-        # If no exact match, check for partial matches
-        partial_matches = []
-        for app in apps:
-            if package_name.lower() in app.identifier.lower():
-                partial_matches.append({
-                    'name': app.name,
-                    'identifier': app.identifier
-                })
-        
-        if partial_matches:
-            return None, partial_matches
-        
-        return None, "Package not found"
-    except Exception as e:
-        return None, str(e)
+    def describe(self, name, metric_type, help_text):
+        with self.lock:
+            self.described[name] = (metric_type, help_text)
 
-# API routes
-@app.route('/api/devices', methods=['GET'])
-def get_devices():
-    try:
-        result = subprocess.run([ADB_PATH, 'devices'], capture_output=True, text=True)
-        lines = result.stdout.strip().split('\n')[1:]
-        devices = []
-        
-        for line in lines:
-            if line.strip():
-                parts = line.split('\t')
-                if len(parts) >= 2:
-                    device_id = parts[0].strip()
-                    status = parts[1].strip()
-                    
-                    # Get additional device info for connected devices
-                    device_info = {
-                        'id': device_id,
-                        'status': status,
-                        'connected': device_id in connected_devices,
-                        'apps': [],
-                        'frida_server': False
-                    }
-                    
-                    # If device is connected to our app, get more info
-                    if device_id in connected_devices:
-                        # Check how many apps are hooked
-                        if device_id in frida_sessions:
-                            device_info['apps'] = list(frida_sessions[device_id].keys())
-                        
-                        # Check if frida-server is running
-                        try:
-                            frida_check = subprocess.run(
-                                [ADB_PATH, '-s', device_id, 'shell', 'ps | grep frida-server'],
-                                capture_output=True, text=True
-                            )
-                            device_info['frida_server'] = 'frida-server' in frida_check.stdout
-                        except:
-                            pass
-                        
-                        # Add device status info if available
-                        if device_id in device_status:
-                            device_info.update(device_status[device_id])
-                    
-                    devices.append(device_info)
-        
-        return jsonify(devices)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    def gauge(self, name, help_text, collect, from_workers=True):
+        """Register a gauge computed at scrape time
 
-@app.route('/api/search-apps', methods=['GET'])
-def search_apps():
-    device_id = request.args.get('deviceId')
-    query = request.args.get('query', '').lower()
-    
-    if not device_id:
-        return jsonify({'error': 'Device ID is required'}), 400
-    
-    if device_id not in connected_devices:
-        return jsonify({'error': 'Device not connected'}), 400
-    
-    try:
-        device = connected_devices[device_id]
-        apps = device.enumerate_applications()
-        
-        if query:
-            # Filter apps based on the search query
-            filtered_apps = [
-                {'name': app.name, 'identifier': app.identifier} 
-                for app in apps 
-                if query in app.name.lower() or query in app.identifier.lower()
-            ]
-        else:
-            filtered_apps = [{'name': app.name, 'identifier': app.identifier} for app in apps]
-        
-        # Sort by relevance (exact matches first, then by name)
-        filtered_apps.sort(key=lambda x: (
-            0 if query == x['identifier'].lower() else 
-            1 if query == x['name'].lower() else
-            2 if query in x['identifier'].lower() else 
-            3
-        ))
-        
-        return jsonify(filtered_apps)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        from_workers=False keeps device workers' values out of the merge, for gauges the
+        coordinator already computes from state the workers mirror to it.
+        """
+        with self.lock:
+            self.collectors.append((name, help_text, collect, from_workers))
 
-@app.route('/api/connect', methods=['POST'])
-def connect_device():
-    data = request.json
-    device_id = data.get('deviceId')
-    
-    if not device_id:
-        return jsonify({'error': 'Device ID is required'}), 400
-    
-    try:
-        # Check if frida-server exists on the device
-        check_frida = subprocess.run(
-            [ADB_PATH, '-s', device_id, 'shell', f'ls {FRIDA_SERVER_PATH}'],
-            capture_output=True, text=True
-        )
-        
-        frida_server_exists = 'No such file' not in check_frida.stderr and 'not found' not in check_frida.stderr
-        
-        if not frida_server_exists:
-            socketio.emit('status', {'message': f'Frida server not found on device. Checking device architecture...'})
-            
-            # Get device architecture
-            arch_result = subprocess.run(
-                [ADB_PATH, '-s', device_id, 'shell', 'getprop ro.product.cpu.abi'],
-                capture_output=True, text=True
-            )
-            
-            device_arch = arch_result.stdout.strip()
-            socketio.emit('status', {'message': f'Detected device architecture: {device_arch}'})
-            
-            # Map device architecture to frida-server binary
-            arch_map = {
-                'armeabi-v7a': 'frida-server-16.2.2-android-arm',
-                'armeabi': 'frida-server-16.2.2-android-arm',
-                'arm64-v8a': 'frida-server-16.2.2-android-arm64',
-                'x86': 'frida-server-16.2.2-android-x86',
-                'x86_64': 'frida-server-16.2.2-android-x86_64'
-            }
-            
-            server_binary = arch_map.get(device_arch)
-            
-            if not server_binary:
-                # Default to arm64 if architecture detection fails
-                socketio.emit('status', {'message': f'Unknown architecture: {device_arch}, defaulting to arm64'})
-                server_binary = 'frida-server-16.2.2-android-arm64'
-            
-            # Check if the binary exists in the bin directory
-            binary_path = os.path.join('bin', server_binary)
-            if os.path.exists(binary_path):
-                socketio.emit('status', {'message': f'Found matching Frida server binary: {server_binary}'})
-                
-                # Push to device
-                push_result = subprocess.run(
-                    [ADB_PATH, '-s', device_id, 'push', binary_path, FRIDA_SERVER_PATH],
-                    capture_output=True, text=True
-                )
-                
-                if push_result.returncode == 0:
-                    socketio.emit('status', {'message': f'Successfully pushed Frida server to device.'})
-                    
-                    # Set executable permissions - try different methods
-                    chmod_result = subprocess.run(
-                        [ADB_PATH, '-s', device_id, 'shell', f'su -c "chmod 755 {FRIDA_SERVER_PATH}"'],
-                        capture_output=True, text=True
-                    )
-                    
-                    # If standard su -c fails, try su 0 method
-                    if "invalid" in chmod_result.stderr or "not found" in chmod_result.stderr:
-                        socketio.emit('status', {'message': f'First chmod method failed, trying alternative...'})
-                        chmod_result = subprocess.run(
-                            [ADB_PATH, '-s', device_id, 'shell', f'su 0 chmod 755 {FRIDA_SERVER_PATH}'],
-                            capture_output=True, text=True
-                        )
-                    
-                    # If that also fails, try direct chmod (for pre-rooted emulators)
-                    if "invalid" in chmod_result.stderr or "not found" in chmod_result.stderr:
-                        socketio.emit('status', {'message': f'Second chmod method failed, trying direct chmod...'})
-                        chmod_result = subprocess.run(
-                            [ADB_PATH, '-s', device_id, 'shell', f'chmod 755 {FRIDA_SERVER_PATH}'],
-                            capture_output=True, text=True
-                        )
-                    
-                    if chmod_result.returncode == 0:
-                        socketio.emit('status', {'message': f'Set executable permissions on Frida server.'})
-                    else:
-                        socketio.emit('status', {'message': f'Warning: Could not set executable permissions: {chmod_result.stderr}'})
-                else:
-                    socketio.emit('status', {'message': f'Warning: Failed to push Frida server: {push_result.stderr}'})
-                    return jsonify({'error': 'Failed to push Frida server to device'}), 500
-            else:
-                socketio.emit('status', {'message': f'Error: Required Frida server binary not found: {binary_path}'})
-                return jsonify({'error': f'Required Frida server binary not found: {binary_path}'}), 500
-        
-        # Check if frida-server is running
-        result = subprocess.run(
-            [ADB_PATH, '-s', device_id, 'shell', 'ps | grep frida-server'],
-            capture_output=True, text=True
-        )
-        
-        if 'frida-server' not in result.stdout:
-            # Start frida-server
-            socketio.emit('status', {'message': f'Starting frida-server on {device_id}'})
-            
-            # Try different methods to start frida-server based on root access type
-            # First attempt - standard su -c method
-            start_result = subprocess.run(
-                [ADB_PATH, '-s', device_id, 'shell', f'su -c "{FRIDA_SERVER_PATH} &"'],
-                capture_output=True, text=True
-            )
-            
-            # If that fails, try su 0 method (used in some emulators and devices)
-            if "invalid" in start_result.stderr or "not found" in start_result.stderr:
-                socketio.emit('status', {'message': f'First method failed, trying alternative root method...'})
-                start_result = subprocess.run(
-                    [ADB_PATH, '-s', device_id, 'shell', f'su 0 {FRIDA_SERVER_PATH} &'],
-                    capture_output=True, text=True
-                )
-            
-            # If that also fails, try without su (for pre-rooted emulators)
-            if "invalid" in start_result.stderr or "not found" in start_result.stderr:
-                socketio.emit('status', {'message': f'Second method failed, trying direct execution...'})
-                start_result = subprocess.run(
-                    [ADB_PATH, '-s', device_id, 'shell', f'{FRIDA_SERVER_PATH} &'],
-                    capture_output=True, text=True
-                )
-            
-            # Wait for server to start
-            time.sleep(3)
-            
-            # Verify frida-server is running
-            verify_result = subprocess.run(
-                [ADB_PATH, '-s', device_id, 'shell', 'ps | grep frida-server'],
-                capture_output=True, text=True
-            )
-            
-            if 'frida-server' in verify_result.stdout:
-                socketio.emit('status', {'message': f'Frida server started successfully'})
-            else:
-                socketio.emit('status', {'message': f'Warning: Could not verify if frida-server is running'})
-        
-        # Connect to the device
-        device = frida.get_device(device_id)
-        connected_devices[device_id] = device
-        
-        # Initialize the nested dictionaries for this device
-        frida_sessions[device_id] = {}
-        running_scripts[device_id] = {}
-        device_status[device_id] = {'status': 'connected', 'last_connected': time.time()}
-        
-        socketio.emit('status', {'message': f'Connected to {device_id}'})
-        
-        # Check frida-server version
+    def shard(self):
+        thread_id = self.thread_id()
+        shard = self.shards.get(thread_id)
+        if shard is None:
+            with self.lock:
+                shard = self.shards.setdefault(thread_id, {})
+        return shard
+
+    def inc(self, name, value=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        shard = self.shard()
+        key = (name, tuple(labels.items()))
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not METRICS_ENABLED:
+            return
+        shard = self.shard()
+        key = (name, tuple(labels.items()))
+        buckets = shard.get(key)
+        if buckets is None:
+            # One slot per bucket, one for +Inf, then the running sum
+            buckets = shard[key] = [0] * (len(METRICS_BUCKETS) + 1) + [0.0]
+        buckets[bisect.bisect_left(METRICS_BUCKETS, seconds)] += 1
+        buckets[-1] += seconds
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
         try:
-            # First attempt with standard su -c
-            version_result = subprocess.run(
-                [ADB_PATH, '-s', device_id, 'shell', f'su -c "{FRIDA_SERVER_PATH} --version"'],
-                capture_output=True, text=True
-            )
-            
-            # If that fails, try su 0 method
-            if "invalid" in version_result.stderr or "not found" in version_result.stderr:
-                version_result = subprocess.run(
-                    [ADB_PATH, '-s', device_id, 'shell', f'su 0 {FRIDA_SERVER_PATH} --version'],
-                    capture_output=True, text=True
-                )
-            
-            # If that also fails, try direct execution
-            if "invalid" in version_result.stderr or "not found" in version_result.stderr:
-                version_result = subprocess.run(
-                    [ADB_PATH, '-s', device_id, 'shell', f'{FRIDA_SERVER_PATH} --version'],
-                    capture_output=True, text=True
-                )
-            
-            server_version = version_result.stdout.strip()
-            
-            if server_version:
-                if "16.2.2" in server_version:
-                    socketio.emit('status', {'message': f'Frida server {server_version} detected (compatible)'})
-                else:
-                    socketio.emit('status', {'message': f'Warning: Frida server {server_version} detected. This app is designed for version 16.2.2'})
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def _merge(totals, shard):
+        for key, value in list(shard.items()):
+            if isinstance(value, list):
+                total = totals.setdefault(key, [0] * (len(value) - 1) + [0.0])
+                for i, count in enumerate(list(value)):
+                    total[i] += count
             else:
-                socketio.emit('status', {'message': f'Warning: Could not determine Frida server version'})
+                totals[key] = totals.get(key, 0) + value
+
+    def _retire(self):
+        """Fold the shards of exited threads into the retired totals"""
+        thread_ids = list(self.shards)
+        alive = sys._current_frames().keys()
+        with self.lock:
+            for thread_id in thread_ids:
+                if thread_id not in alive and thread_id in self.shards:
+                    self._merge(self.retired, self.shards.pop(thread_id))
+
+    def _totals(self):
+        self._retire()
+        totals = {}
+        with self.lock:
+            self._merge(totals, self.retired)
+        for shard in list(self.shards.values()):
+            self._merge(totals, shard)
+        return totals
+
+    def _collect(self, name, collect):
+        try:
+            return list(collect())
         except Exception as e:
-            # Just log it, don't block the connection
-            socketio.emit('status', {'message': f'Could not verify Frida server version: {str(e)}'})
-        
-        return jsonify({'status': 'connected', 'deviceId': device_id})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+            logger.warning(f"Could not collect metric {name}: {str(e)}")
+            return []
 
-@app.route('/api/disconnect', methods=['POST'])
-def disconnect_device():
-    data = request.json
-    device_id = data.get('deviceId')
-    
-    if not device_id:
-        return jsonify({'error': 'Device ID is required'}), 400
-    
-    try:
-        # Clean up all frida sessions for this device
-        if device_id in frida_sessions:
-            for app_id, session in frida_sessions[device_id].items():
-                try:
-                    session.detach()
-                except Exception as e:
-                    socketio.emit('status', {'message': f'[Device: {device_id}] Error detaching session for {app_id}: {str(e)}'})
-            del frida_sessions[device_id]
-        
-        # Clean up all running scripts for this device
-        if device_id in running_scripts:
-            for app_id, script in running_scripts[device_id].items():
-                try:
-                    script.unload()
-                except Exception as e:
-                    socketio.emit('status', {'message': f'[Device: {device_id}] Error unloading script for {app_id}: {str(e)}'})
-            del running_scripts[device_id]
-        
-        # Remove the device from connected_devices
-        if device_id in connected_devices:
-            del connected_devices[device_id]
-        
-        # Clean up any device status
-        if device_id in device_status:
-            del device_status[device_id]
-        
-        socketio.emit('status', {'message': f'Disconnected from {device_id}'})
-        return jsonify({'status': 'disconnected', 'deviceId': device_id})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    def snapshot(self):
+        """Summed counters, histograms and shared gauges, for another process's render()"""
+        gauges = {name: self._collect(name, collect)
+                  for name, _, collect, from_workers in list(self.collectors) if from_workers}
+        return {'totals': self._totals(), 'gauges': gauges}
 
-@app.route('/api/devices/restart-adb', methods=['POST'])
-def restart_adb_server():
-    try:
-        # Kill the ADB server
-        socketio.emit('status', {'message': 'Restarting ADB server...'})
-        kill_result = subprocess.run([ADB_PATH, 'kill-server'], capture_output=True, text=True)
-        
-        # Wait briefly
-        time.sleep(1)
-        
-        # Start the ADB server
-        start_result = subprocess.run([ADB_PATH, 'start-server'], capture_output=True, text=True)
-        
-        # Give it a moment to detect devices
-        time.sleep(2)
-        
-        # Check for devices
-        devices_result = subprocess.run([ADB_PATH, 'devices'], capture_output=True, text=True)
-        devices = devices_result.stdout.strip().split('\n')[1:]
-        device_count = sum(1 for line in devices if line.strip())
-        
-        socketio.emit('status', {
-            'message': f'ADB server restarted. {device_count} device(s) detected.'
-        })
-        
-        return jsonify({
-            'success': True,
-            'message': f'ADB server restarted. {device_count} device(s) detected.',
-            'details': {
-                'kill_output': kill_result.stdout if kill_result.stdout else kill_result.stderr,
-                'start_output': start_result.stdout if start_result.stdout else start_result.stderr,
-                'devices': devices_result.stdout
-            }
-        })
-    except Exception as e:
-        error_message = f'Error restarting ADB server: {str(e)}'
-        socketio.emit('status', {'message': error_message, 'type': 'error'})
-        return jsonify({'success': False, 'message': error_message}), 500
+    def render(self, snapshots=()):
+        """Sum the shards, and any worker snapshots, into the Prometheus text exposition format"""
+        totals = self._totals()
+        for snapshot in snapshots:
+            self._merge(totals, snapshot['totals'])
 
-@app.route('/api/apps', methods=['GET'])
-def get_apps():
-    device_id = request.args.get('deviceId')
-    
-    if not device_id:
-        return jsonify({'error': 'Device ID is required'}), 400
-    
-    if device_id not in connected_devices:
-        return jsonify({'error': 'Device not connected'}), 400
-    
+        by_name = collections.defaultdict(list)
+        for (name, labels), value in totals.items():
+            by_name[name].append((labels, value))
+
+        lines = []
+        for name in sorted(set(by_name) | set(self.described)):
+            metric_type, help_text = self.described.get(name, ('untyped', ''))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in sorted(by_name.get(name, []), key=lambda item: item[0]):
+                if metric_type != 'histogram':
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(METRICS_BUCKETS + [float('inf')], value):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {value[-1]:.6f}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+        for name, help_text, collect, _ in list(self.collectors):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            values = collections.Counter()
+            for labels, value in self._collect(name, collect) + [
+                    item for snapshot in snapshots for item in snapshot['gauges'].get(name, [])]:
+                values[tuple(labels.items())] += value
+            for labels, value in sorted(values.items()):
+                lines.append(f'{name}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+metrics = Metrics()
+metrics.describe('trishul_adb_command_seconds', 'histogram', 'adb command latency by operation and transport')
+metrics.describe('trishul_frida_attach_seconds', 'histogram', 'Time to attach a Frida session')
+metrics.describe('trishul_frida_spawn_seconds', 'histogram', 'Time to spawn an app through Frida')
+metrics.describe('trishul_script_create_seconds', 'histogram', 'Time to create a script, by compiled cache outcome')
+metrics.describe('trishul_script_load_seconds', 'histogram', 'Time to load a script into a session')
+metrics.describe('trishul_frida_messages_total', 'counter', 'Messages received from hooked scripts')
+metrics.describe('trishul_socketio_batches_total', 'counter', 'frida_batch events emitted')
+metrics.describe('trishul_socketio_messages_total', 'counter', 'Messages delivered in frida_batch events')
+metrics.describe('trishul_socketio_packed_bytes_total', 'counter', 'Bytes of packed events, as MessagePack and on the wire')
+metrics.describe('trishul_socketio_unsubscribed_total', 'counter', 'Scoped events skipped because no client was subscribed')
+metrics.describe('trishul_node_request_seconds', 'histogram', 'Requests proxied to node agents, by node and operation')
+
+def message_queue_depths():
+    with message_pipelines_lock:
+        pipelines = [p for apps in message_pipelines.values() for p in apps.values()]
+    depths = collections.Counter()
+    for pipeline in pipelines:
+        depths[pipeline.device_id] += len(pipeline.queue)
+    return [({'device': device_id}, depth) for device_id, depth in depths.items()]
+
+def frida_session_counts():
+    counts = collections.Counter({device_id: len(sessions) for device_id, sessions in list(frida_sessions.items())})
+    if device_workers:
+        # Worker-owned sessions, as mirrored by their 'sessions' events
+        for device_id, apps in list(device_workers.hooked.items()):
+            counts[device_id] += len(apps)
+    return [({'device': device_id}, count) for device_id, count in counts.items()]
+
+metrics.gauge('trishul_message_queue_depth', 'Frida messages waiting to be emitted over Socket.IO', message_queue_depths)
+metrics.gauge('trishul_frida_sessions', 'Live Frida sessions per device', frida_session_counts, from_workers=False)
+
+WIRE_ENCODINGS = ('json', 'msgpack', 'msgpack+deflate')
+
+def wire_encoding(args):
+    """The encoding a client asked for in its connect query, JSON unless it opted in"""
+    if args.get('encoding') != 'msgpack':
+        return 'json'
+    return 'msgpack+deflate' if 'deflate' in args.get('compression', '').split(',') else 'msgpack'
+
+def pack_event(data, deflate=False):
+    """Frame an event for packed clients: a flag byte (1 = deflated) and the MessagePack body
+
+    bytes values such as Frida data buffers become MessagePack bin fields, not base64.
+    """
+    body = msgpack.packb(data, use_bin_type=True, default=str)
+    metrics.inc('trishul_socketio_packed_bytes_total', len(body), stage='msgpack')
+    if deflate and len(body) >= WIRE_COMPRESS_MIN:
+        frame = b'\x01' + zlib.compress(body, WIRE_COMPRESS_LEVEL)
+    else:
+        frame = b'\x00' + body
+    metrics.inc('trishul_socketio_packed_bytes_total', len(frame), stage='wire')
+    return frame
+
+class SubscriptionRooms:
+    """Socket.IO rooms that scope device and app events to the clients watching them
+
+    Rooms are named device|app|event with '*' for any, so {deviceId} joins 'd|*|*' and
+    {deviceId, appId, events: ['frida_batch']} joins 'd|a|frida_batch'. publish() emits
+    only to matching rooms that have members and skips the emit, serialization included,
+    when there are none. Clients start on the '*|*|*' firehose so UIs that never
+    subscribe keep receiving everything; their first subscribe narrows them down.
+
+    Clients that negotiated a packed encoding sit in the same rooms suffixed with it
+    ('d|*|*#msgpack'), so each publish encodes once per encoding in use.
+    """
+
+    FIREHOSE = '*|*|*'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.members = {}    # Socket.IO room -> set of sids
+        self.rooms = {}      # sid -> set of rooms, without the encoding suffix
+        self.encodings = {}  # sid -> encoding, for clients not on JSON
+
+    @staticmethod
+    def socket_room(room, encoding):
+        return room if encoding == 'json' else f'{room}#{encoding}'
+
+    @staticmethod
+    def room(device_id=None, app_id=None, event=None):
+        return f"{device_id or '*'}|{app_id or '*'}|{event or '*'}"
+
+    def requested_rooms(self, data):
+        if data.get('all'):
+            return [self.FIREHOSE]
+        device_id = data.get('deviceId')
+        if not device_id:
+            raise ValueError('deviceId is required')
+        app_ids = data.get('appIds') or [data.get('appId')]
+        events = data.get('events') or [None]
+        return [self.room(device_id, app_id, event) for app_id in app_ids for event in events]
+
+    def connect(self, sid, encoding='json'):
+        if encoding != 'json':
+            with self.lock:
+                self.encodings[sid] = encoding
+        self.join(sid, [self.FIREHOSE])
+
+    def disconnect(self, sid):
+        self.leave(sid)
+        with self.lock:
+            self.encodings.pop(sid, None)
+
+    def join(self, sid, rooms):
+        with self.lock:
+            encoding = self.encodings.get(sid, 'json')
+            for room in rooms:
+                self.members.setdefault(self.socket_room(room, encoding), set()).add(sid)
+                self.rooms.setdefault(sid, set()).add(room)
+        for room in rooms:
+            join_room(self.socket_room(room, encoding), sid=sid)
+
+    def leave(self, sid, rooms=None):
+        """Forget a client's rooms, all of them by default, and return the Socket.IO rooms it left"""
+        with self.lock:
+            encoding = self.encodings.get(sid, 'json')
+            joined = self.rooms.get(sid, set())
+            rooms = [room for room in (joined if rooms is None else rooms) if room in joined]
+            for room in rooms:
+                joined.discard(room)
+                members = self.members.get(self.socket_room(room, encoding))
+                if members is not None:
+                    members.discard(sid)
+                    if not members:
+                        del self.members[self.socket_room(room, encoding)]
+            if not joined:
+                self.rooms.pop(sid, None)
+        return [self.socket_room(room, encoding) for room in rooms]
+
+    def subscribe(self, sid, data):
+        rooms = self.requested_rooms(data)
+        if rooms != [self.FIREHOSE]:
+            for room in self.leave(sid, [self.FIREHOSE]):
+                leave_room(room, sid=sid)
+        self.join(sid, rooms)
+        return self.subscribed(sid)
+
+    def unsubscribe(self, sid, data):
+        """Leave the requested rooms, or every room (the firehose too) when no deviceId is given"""
+        rooms = self.requested_rooms(data) if data.get('deviceId') else None
+        for room in self.leave(sid, rooms):
+            leave_room(room, sid=sid)
+        return self.subscribed(sid)
+
+    def subscribed(self, sid):
+        with self.lock:
+            return sorted(self.rooms.get(sid, ()))
+
+    def publish(self, event, data, device_id, app_id=None):
+        """Emit a device or app scoped event to its subscribers; False when there were none"""
+        candidates = dict.fromkeys(self.room(device, app, name) for device in (device_id, None)
+                                   for app in (app_id, None) for name in (event, None))
+        groups = []
+        with self.lock:
+            for encoding in WIRE_ENCODINGS:
+                matched = [self.socket_room(room, encoding) for room in candidates
+                           if self.socket_room(room, encoding) in self.members]
+                if matched:
+                    sids = set().union(*(self.members[room] for room in matched)) if len(matched) > 1 else None
+                    groups.append((encoding, matched, sids))
+        if not groups:
+            metrics.inc('trishul_socketio_unsubscribed_total', event=event)
+            return False
+
+        for encoding, matched, sids in groups:
+            payload = data
+            if encoding != 'json' and event in WIRE_PACKED_EVENTS:
+                payload = pack_event(data, deflate=encoding == 'msgpack+deflate')
+            if sids is None:
+                socketio.emit(event, payload, to=matched[0])
+            else:
+                # Overlapping rooms may share clients; address each client once
+                for sid in sids:
+                    socketio.emit(event, payload, to=sid)
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                'clients': len(self.rooms),
+                'encodings': dict(collections.Counter(self.encodings.values())),
+                'rooms': {room: len(members) for room, members in self.members.items()}
+            }
+
+subscriptions = SubscriptionRooms()
+
+class MessagePipeline:
+    """Bounded queue of Frida events for one hooked app, emitted as frida_batch events"""
+
+    def __init__(self, device_id, app_id):
+        self.device_id = device_id
+        self.app_id = app_id
+        self.queue = collections.deque()
+        self.lock = threading.Lock()
+        self.received = 0
+        self.emitted = 0
+        self.dropped = 0          # Total messages dropped since the session was hooked
+        self.pending_dropped = 0  # Dropped since the last batch, reported to clients with the next one
+        self.last_flush = time.monotonic()
+        self.closed = False
+
+    def put(self, event):
+        """Queue an event from the Frida callback thread without touching Socket.IO"""
+        if MESSAGE_DROP_POLICY == 'block' and len(self.queue) >= MESSAGE_QUEUE_SIZE:
+            # Backpressure: stall the Frida thread briefly to let the flusher catch up
+            deadline = time.monotonic() + MESSAGE_BLOCK_TIMEOUT
+            while len(self.queue) >= MESSAGE_QUEUE_SIZE and not self.closed and time.monotonic() < deadline:
+                time.sleep(0.005)
+
+        with self.lock:
+            if self.closed:
+                return False
+            self.received += 1
+
+            if len(self.queue) >= MESSAGE_QUEUE_SIZE:
+                self.dropped += 1
+                self.pending_dropped += 1
+                if MESSAGE_DROP_POLICY == 'drop-oldest':
+                    self.queue.popleft()
+                else:
+                    # drop-newest, or block after its timeout expired
+                    return False
+
+            self.queue.append(event)
+            return True
+
+    def flush(self, force=False):
+        """Emit queued events once the size or time window is reached"""
+        while True:
+            with self.lock:
+                pending = len(self.queue)
+                due = (
+                    force or
+                    pending >= MESSAGE_BATCH_SIZE or
+                    ((pending or self.pending_dropped) and time.monotonic() - self.last_flush >= MESSAGE_BATCH_INTERVAL)
+                )
+                if not due or not (pending or self.pending_dropped):
+                    return
+
+                batch = [self.queue.popleft() for _ in range(min(pending, MESSAGE_BATCH_SIZE))]
+                dropped = self.pending_dropped
+                self.pending_dropped = 0
+                self.last_flush = time.monotonic()
+
+            self.emitted += len(batch)
+            metrics.inc('trishul_socketio_batches_total', device=self.device_id)
+            metrics.inc('trishul_socketio_messages_total', len(batch), device=self.device_id)
+            subscriptions.publish('frida_batch', {
+                'deviceId': self.device_id,
+                'appId': self.app_id,
+                'messages': batch,
+                'dropped': dropped
+            }, self.device_id, self.app_id)
+
+            if dropped:
+                logger.warning(f"[Device: {self.device_id}] Dropped {dropped} messages from {self.app_id}, clients are falling behind")
+
+    def close(self):
+        """Stop accepting events and flush whatever is left"""
+        with self.lock:
+            self.closed = True
+        self.flush(force=True)
+
+    def stats(self):
+        return {
+            'deviceId': self.device_id,
+            'appId': self.app_id,
+            'queued': len(self.queue),
+            'received': self.received,
+            'emitted': self.emitted,
+            'dropped': self.dropped
+        }
+
+def message_flusher():
+    """Background task that drains every session's pipeline"""
+    tick = min(MESSAGE_BATCH_INTERVAL, 0.01)
+    while True:
+        socketio.sleep(tick)
+        with message_pipelines_lock:
+            pipelines = [p for apps in message_pipelines.values() for p in apps.values()]
+        for pipeline in pipelines:
+            try:
+                pipeline.flush()
+            except Exception as e:
+                logger.error(f"Error flushing Frida messages for {pipeline.app_id}: {str(e)}")
+
+def open_message_pipeline(device_id, app_id):
+    """Create the pipeline for a newly hooked app, replacing any previous one"""
+    global message_flusher_started
+    close_message_pipeline(device_id, app_id)
+
+    pipeline = MessagePipeline(device_id, app_id)
+    with message_pipelines_lock:
+        message_pipelines.setdefault(device_id, {})[app_id] = pipeline
+        if not message_flusher_started:
+            message_flusher_started = True
+            socketio.start_background_task(message_flusher)
+    return pipeline
+
+def close_message_pipeline(device_id, app_id):
+    """Flush and remove the pipeline for an app"""
+    with message_pipelines_lock:
+        pipeline = message_pipelines.get(device_id, {}).pop(app_id, None)
+        if device_id in message_pipelines and not message_pipelines[device_id]:
+            del message_pipelines[device_id]
+    if pipeline:
+        pipeline.close()
+
+def close_device_pipelines(device_id):
+    """Flush and remove all pipelines for a device"""
+    for app_id in list(message_pipelines.get(device_id, {}).keys()):
+        close_message_pipeline(device_id, app_id)
+
+# Trace segment layout: TRACE_MAGIC, then records of
+# TRACE_RECORD_HEADER (body length, timestamp, data length) + JSON body + raw data bytes
+TRACE_MAGIC = b'TRISHTR1'
+TRACE_RECORD_HEADER = struct.Struct('<IdI')
+
+trace_recorders = {}    # {device_id: {app_id: TraceRecorder}} - on-disk recording per hooked app
+trace_recorders_lock = threading.Lock()
+trace_queue = queue.Queue()
+trace_writer_started = False
+
+class TraceRecorder:
+    """Appends every Frida message of one hooked app to rolling binary segment files
+
+    Only the trace writer thread touches the files; the Frida thread just enqueues.
+    """
+
+    def __init__(self, device_id, app_id):
+        self.device_id = device_id
+        self.app_id = app_id
+        self.trace_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_trace_name(device_id)}-{safe_trace_name(app_id)}-{uuid.uuid4().hex[:6]}"
+        self.directory = os.path.join(TRACES_DIR, self.trace_id)
+        self.meta = {
+            'traceId': self.trace_id,
+            'deviceId': device_id,
+            'appId': app_id,
+            'startedAt': time.time(),
+            'endedAt': None,
+            'records': 0,
+            'segments': []
+        }
+        self.file = None
+        self.segment = None
+        self.closed = False
+        self.meta_written = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_meta()
+
+    def record(self, message, data):
+        """Queue a message for the writer thread; called on Frida's thread"""
+        if not self.closed:
+            trace_queue.put((self, time.time(), message, data))
+
+    def close(self):
+        self.closed = True
+        trace_queue.put((self, None, None, None))
+
+    # Writer thread only
+
+    def _open_segment(self):
+        name = f"segment-{len(self.meta['segments']):05d}.bin"
+        self.file = open(os.path.join(self.directory, name), 'ab')
+        self.file.write(TRACE_MAGIC)
+        self.segment = {'file': name, 'start': None, 'end': None, 'records': 0, 'bytes': len(TRACE_MAGIC), 'index': []}
+        self.meta['segments'].append(self.segment)
+
+    def _write(self, timestamp, message, data):
+        if self.file is None or self.segment['bytes'] >= TRACE_SEGMENT_SIZE:
+            self._roll()
+
+        body = json.dumps({'deviceId': self.device_id, 'appId': self.app_id, 'message': message},
+                          separators=(',', ':'), default=str).encode('utf-8')
+        data = data or b''
+        offset = self.segment['bytes']
+        self.file.write(TRACE_RECORD_HEADER.pack(len(body), timestamp, len(data)))
+        self.file.write(body)
+        if data:
+            self.file.write(data)
+
+        # Sparse (timestamp, offset) index so replays can seek without scanning the segment
+        if self.segment['records'] % TRACE_INDEX_INTERVAL == 0:
+            self.segment['index'].append([timestamp, offset])
+        if self.segment['start'] is None:
+            self.segment['start'] = timestamp
+        self.segment['end'] = timestamp
+        self.segment['records'] += 1
+        self.segment['bytes'] += TRACE_RECORD_HEADER.size + len(body) + len(data)
+        self.meta['records'] += 1
+
+    def _roll(self):
+        if self.file:
+            self.file.close()
+        self._open_segment()
+        self._write_meta()
+
+    def _commit(self):
+        if self.file:
+            self.file.flush()
+            if TRACE_FSYNC:
+                os.fsync(self.file.fileno())
+        # Keep the live segment's bounds and index reasonably fresh for listings and replays
+        if time.monotonic() - self.meta_written >= TRACE_META_INTERVAL:
+            self._write_meta()
+
+    def _finish(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+        self.meta['endedAt'] = time.time()
+        self._write_meta()
+
+    def _write_meta(self):
+        temp_path = os.path.join(self.directory, 'meta.json.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(temp_path, os.path.join(self.directory, 'meta.json'))
+        self.meta_written = time.monotonic()
+
+def safe_trace_name(value):
+    return re.sub(r'[^A-Za-z0-9._-]', '_', value)
+
+def trace_writer():
+    """Background thread that writes queued trace records, committing them in groups"""
+    last_prune = 0
+    while True:
+        batch = [trace_queue.get()]
+        try:
+            while len(batch) < TRACE_COMMIT_BATCH:
+                batch.append(trace_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        touched = set()
+        for recorder, timestamp, message, data in batch:
+            try:
+                if timestamp is None:
+                    touched.discard(recorder)
+                    recorder._finish()
+                else:
+                    recorder._write(timestamp, message, data)
+                    touched.add(recorder)
+            except Exception as e:
+                logger.error(f"Error writing trace {recorder.trace_id}: {str(e)}")
+
+        # One flush per recorder per group instead of one per record
+        for recorder in touched:
+            try:
+                recorder._commit()
+            except Exception as e:
+                logger.error(f"Error committing trace {recorder.trace_id}: {str(e)}")
+
+        if time.monotonic() - last_prune > 3600:
+            last_prune = time.monotonic()
+            try:
+                prune_traces()
+            except Exception as e:
+                logger.error(f"Error pruning traces: {str(e)}")
+        
+        for _ in batch:
+            trace_queue.task_done()
+
+def prune_traces():
+    """Delete finished traces older than TRACE_RETENTION_DAYS, then the oldest past TRACE_MAX_BYTES"""
+    with trace_recorders_lock:
+        live = {recorder.trace_id for apps in trace_recorders.values() for recorder in apps.values()}
     try:
-        device = connected_devices[device_id]
-        apps = device.enumerate_applications()
-        app_list = [{'name': app.name, 'identifier': app.identifier} for app in apps]
-        return jsonify(app_list)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        trace_ids = os.listdir(TRACES_DIR)
+    except FileNotFoundError:
+        return
 
-@app.route('/api/hook', methods=['POST'])
-def hook_app():
-    data = request.json
-    device_id = data.get('deviceId')
-    app_id = data.get('appId')
-    script_content = data.get('script')
-    
-    if not all([device_id, app_id, script_content]):
-        return jsonify({'error': 'Device ID, App ID, and script are required'}), 400
-    
-    if device_id not in connected_devices:
-        return jsonify({'error': 'Device not connected'}), 400
-    
+    finished = []
+    total = 0
+    for trace_id in trace_ids:
+        directory = os.path.join(TRACES_DIR, trace_id)
+        try:
+            size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+        except OSError:
+            continue
+        total += size
+        meta = read_trace_meta(trace_id)
+        if trace_id in live or not meta:
+            continue
+        # Traces cut short by a crash never got endedAt, so fall back to their last record
+        ended = meta['endedAt'] or max([s['end'] for s in meta['segments'] if s['end']] or [meta['startedAt']])
+        finished.append((ended, trace_id, size))
+
+    finished.sort()
+    for ended, trace_id, size in finished:
+        expired = TRACE_RETENTION_DAYS > 0 and ended < time.time() - TRACE_RETENTION_DAYS * 86400
+        if not expired and not (TRACE_MAX_BYTES > 0 and total > TRACE_MAX_BYTES):
+            continue
+        shutil.rmtree(os.path.join(TRACES_DIR, trace_id), ignore_errors=True)
+        total -= size
+        logger.info(f"Pruned trace {trace_id}")
+
+def open_trace_recorder(device_id, app_id):
+    """Start recording a newly hooked app, finishing any previous recording"""
+    global trace_writer_started
+    if not TRACE_RECORDING:
+        return None
+    close_trace_recorder(device_id, app_id)
+
+    recorder = TraceRecorder(device_id, app_id)
+    with trace_recorders_lock:
+        trace_recorders.setdefault(device_id, {})[app_id] = recorder
+        if not trace_writer_started:
+            trace_writer_started = True
+            threading.Thread(target=trace_writer, name='trace-writer', daemon=True).start()
+    return recorder
+
+def close_trace_recorder(device_id, app_id):
+    with trace_recorders_lock:
+        recorder = trace_recorders.get(device_id, {}).pop(app_id, None)
+        if device_id in trace_recorders and not trace_recorders[device_id]:
+            del trace_recorders[device_id]
+    if recorder:
+        recorder.close()
+
+def close_device_trace_recorders(device_id):
+    for app_id in list(trace_recorders.get(device_id, {}).keys()):
+        close_trace_recorder(device_id, app_id)
+
+def close_all_trace_recorders():
+    """Finish every recording and wait for the writer to drain, used on shutdown"""
+    for device_id in list(trace_recorders.keys()):
+        close_device_trace_recorders(device_id)
+    if trace_writer_started:
+        trace_queue.join()
+
+def read_trace_meta(trace_id):
+    """Load a recording's metadata, or None if there is no such trace"""
+    if safe_trace_name(trace_id) != trace_id:
+        return None
     try:
-        device = connected_devices[device_id]
-        
-        # Verify the package name and get the correct case if needed
-        correct_app_id, result = verify_package_name(device_id, app_id)
-        
-        if not correct_app_id:
-            if isinstance(result, list):
-                # We found similar package names
-                suggestions = [f"{app['name']} ({app['identifier']})" for app in result[:5]]
-                return jsonify({
-                    'error': f"Could not find exact package name '{app_id}'. Did you mean one of these?",
-                    'suggestions': suggestions
-                }), 400
+        with open(os.path.join(TRACES_DIR, trace_id, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def iter_trace_records(trace_id, meta, start=None, end=None):
+    """Yield (timestamp, body, data) for records in [start, end] using memory-mapped segments"""
+    for segment in meta['segments']:
+        # meta.json lags the writer, so the last segment of a live or crashed trace may have
+        # no bounds yet (or stale ones) and is always scanned; earlier segments are closed
+        last = segment is meta['segments'][-1]
+        if segment['start'] is not None and not last:
+            if start is not None and segment['end'] < start:
+                continue
+            if end is not None and segment['start'] > end:
+                break
+
+        path = os.path.join(TRACES_DIR, trace_id, segment['file'])
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= len(TRACE_MAGIC):
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                # Seek to the last indexed record before the requested start
+                offset = len(TRACE_MAGIC)
+                if start is not None and segment['index']:
+                    position = bisect.bisect_right([entry[0] for entry in segment['index']], start) - 1
+                    if position >= 0:
+                        offset = segment['index'][position][1]
+
+                while offset + TRACE_RECORD_HEADER.size <= size:
+                    body_length, timestamp, data_length = TRACE_RECORD_HEADER.unpack_from(mapped, offset)
+                    record_end = offset + TRACE_RECORD_HEADER.size + body_length + data_length
+                    if record_end > size:
+                        break  # Partially written record at the tail of a live segment
+                    if end is not None and timestamp > end:
+                        return
+                    if start is None or timestamp >= start:
+                        body_start = offset + TRACE_RECORD_HEADER.size
+                        yield (timestamp, mapped[body_start:body_start + body_length],
+                               mapped[body_start + body_length:record_end])
+                    offset = record_end
+
+class LogIndex:
+    """Full-text index of captured Frida output in a local SQLite FTS5 database
+
+    Frida threads only enqueue; one indexer thread inserts in batched transactions,
+    and searches use their own read connections thanks to WAL mode.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY,
+            timestamp REAL NOT NULL,
+            device_id TEXT NOT NULL,
+            app_id TEXT NOT NULL,
+            type TEXT NOT NULL,
+            subtype TEXT,
+            message TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS logs_timestamp ON logs (timestamp);
+        CREATE INDEX IF NOT EXISTS logs_target ON logs (device_id, app_id, timestamp);
+        CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5 (message, content='logs', content_rowid='id');
+        CREATE TRIGGER IF NOT EXISTS logs_ai AFTER INSERT ON logs BEGIN
+            INSERT INTO logs_fts (rowid, message) VALUES (new.id, new.message);
+        END;
+        CREATE TRIGGER IF NOT EXISTS logs_ad AFTER DELETE ON logs BEGIN
+            INSERT INTO logs_fts (logs_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        END;
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue(maxsize=LOG_INDEX_QUEUE_SIZE)
+        self.dropped = 0
+        self.enabled = LOG_INDEX_ENABLED
+        self.started = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Create the database and start the indexer thread, once"""
+        with self.lock:
+            if self.started or not self.enabled:
+                return self.enabled
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                connection = self._connect()
+                connection.executescript(self.SCHEMA)
+            except sqlite3.Error as e:
+                # Most likely a Python build whose SQLite lacks FTS5
+                logger.warning(f"Log index disabled: {str(e)}")
+                self.enabled = False
+                return False
+            self.started = True
+            threading.Thread(target=self._run, args=(connection,), name='log-indexer', daemon=True).start()
+            return True
+
+    def add(self, device_id, app_id, type, subtype, message, timestamp):
+        """Queue one record for indexing; never blocks the Frida thread"""
+        if not self.started:
+            return
+        if not isinstance(message, str):
+            message = json.dumps(message, default=str)
+        try:
+            self.queue.put_nowait((timestamp, device_id, app_id, type, subtype, message[:LOG_INDEX_MAX_MESSAGE]))
+        except queue.Full:
+            self.dropped += 1
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _run(self, connection):
+        last_prune = 0
+        while True:
+            batch = [self.queue.get()]
+            # Give the batch a moment to fill so each transaction carries many rows
+            deadline = time.time() + LOG_INDEX_INTERVAL
+            while len(batch) < LOG_INDEX_BATCH_SIZE:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            prune = LOG_INDEX_RETENTION_DAYS > 0 and time.time() - last_prune > 3600
+            if prune:
+                last_prune = time.time()
+            try:
+                run_blocking(self._insert, connection, batch, prune)
+            except sqlite3.Error as e:
+                logger.error(f"Error indexing {len(batch)} log records: {str(e)}")
+
+    def _insert(self, connection, batch, prune):
+        with connection:
+            connection.executemany(
+                'INSERT INTO logs (timestamp, device_id, app_id, type, subtype, message) VALUES (?, ?, ?, ?, ?, ?)',
+                batch
+            )
+            if prune:
+                connection.execute('DELETE FROM logs WHERE timestamp < ?',
+                                   (time.time() - LOG_INDEX_RETENTION_DAYS * 86400,))
+
+    def search(self, query=None, device_id=None, app_id=None, type=None, subtype=None,
+               since=None, until=None, limit=100, offset=0):
+        """Return (records, has_more) matching the query and filters, newest first"""
+        match = fts_query(query) if query else ''
+        if match:
+            sql = 'SELECT logs.* FROM logs_fts JOIN logs ON logs.id = logs_fts.rowid WHERE logs_fts MATCH ?'
+            params = [match]
+        else:
+            sql = 'SELECT logs.* FROM logs WHERE 1'
+            params = []
+
+        for column, value in (('device_id', device_id), ('app_id', app_id), ('type', type), ('subtype', subtype)):
+            if value:
+                sql += f' AND logs.{column} = ?'
+                params.append(value)
+        if since is not None:
+            sql += ' AND logs.timestamp >= ?'
+            params.append(since)
+        if until is not None:
+            sql += ' AND logs.timestamp <= ?'
+            params.append(until)
+
+        # Fetch one extra row to report whether another page exists without a COUNT(*)
+        sql += ' ORDER BY logs.id DESC LIMIT ? OFFSET ?'
+        params += [limit + 1, offset]
+
+        rows = run_blocking(self._query, sql, params)
+        records = [{
+            'id': row[0],
+            'timestamp': row[1],
+            'deviceId': row[2],
+            'appId': row[3],
+            'type': row[4],
+            'subtype': row[5],
+            'message': row[6]
+        } for row in rows[:limit]]
+        return records, len(rows) > limit
+
+    def _query(self, sql, params):
+        connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, timeout=10)
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every term must match, 'term*' matches a prefix
+
+    Returns an empty string when nothing is left to match, e.g. for '*' or bare punctuation,
+    which the tokenizer would discard anyway.
+    """
+    terms = []
+    for term in text.split():
+        prefix = term.endswith('*')
+        term = term.rstrip('*')
+        if re.search(r'\w', term):
+            terms.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' AND '.join(terms)
+
+log_index = LogIndex(LOG_INDEX_PATH)
+
+app_indexes = {}        # device_id -> AppIndex - cached application list per connected device
+app_indexes_lock = threading.Lock()
+
+class AppIndex:
+    """Cached application list for one device with exact, prefix and substring lookups"""
+
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.lock = threading.Lock()          # Guards the lookup structures
+        self.refresh_lock = threading.Lock()  # Makes concurrent stale readers share one enumeration
+        self.apps = []                 # [{'name', 'identifier'}] in device order
+        self.by_identifier = {}        # casefolded identifier -> position in apps
+        self.identifier_keys = []      # sorted [(casefolded identifier, position)] for prefix search
+        self.name_keys = []            # sorted [(casefolded name, position)] for prefix search
+        self.loaded_at = 0
+
+    def is_stale(self):
+        return not self.loaded_at or time.time() - self.loaded_at > APP_INDEX_TTL
+
+    def invalidate(self):
+        """Force the next lookup to enumerate applications again"""
+        self.loaded_at = 0
+
+    def refresh(self, device, force=False):
+        """Re-enumerate applications from the device and rebuild the lookup structures"""
+        with self.refresh_lock:
+            # Another request may have refreshed while we were waiting
+            if not force and not self.is_stale():
+                return {'added': 0, 'removed': 0, 'total': len(self.apps)}
+
+            apps = [{'name': app.name, 'identifier': app.identifier} for app in run_blocking(device.enumerate_applications)]
+            by_identifier = {app['identifier'].casefold(): i for i, app in enumerate(apps)}
+            identifier_keys = sorted((app['identifier'].casefold(), i) for i, app in enumerate(apps))
+            name_keys = sorted((app['name'].casefold(), i) for i, app in enumerate(apps))
+
+            with self.lock:
+                added = by_identifier.keys() - self.by_identifier.keys()
+                removed = self.by_identifier.keys() - by_identifier.keys()
+                self.apps = apps
+                self.by_identifier = by_identifier
+                self.identifier_keys = identifier_keys
+                self.name_keys = name_keys
+                self.loaded_at = time.time()
+
+            if self.apps and (added or removed):
+                logger.info(f"[Device: {self.device_id}] App index refreshed: {len(added)} added, {len(removed)} removed")
+            return {'added': len(added), 'removed': len(removed), 'total': len(apps)}
+
+    def list(self):
+        with self.lock:
+            return list(self.apps)
+
+    def lookup(self, identifier):
+        """Exact, case-insensitive match on the package identifier"""
+        with self.lock:
+            position = self.by_identifier.get(identifier.casefold())
+            return self.apps[position] if position is not None else None
+
+    def _prefix_positions(self, keys, prefix):
+        start = bisect.bisect_left(keys, (prefix,))
+        for key, position in keys[start:]:
+            if not key.startswith(prefix):
+                break
+            yield position
+
+    def search(self, query):
+        """Ranked search: exact identifier, exact name, prefix, then substring matches"""
+        query = query.casefold()
+        with self.lock:
+            apps = self.apps
+            if not query:
+                return sorted(apps, key=lambda app: app['name'].casefold())
+
+            ranks = {}
+
+            def rank(position, value):
+                if value < ranks.get(position, 6):
+                    ranks[position] = value
+
+            exact = self.by_identifier.get(query)
+            if exact is not None:
+                rank(exact, 0)
+            for position in self._prefix_positions(self.name_keys, query):
+                rank(position, 1 if apps[position]['name'].casefold() == query else 3)
+            for position in self._prefix_positions(self.identifier_keys, query):
+                rank(position, 2)
+            for position, app in enumerate(apps):
+                if position not in ranks:
+                    if query in app['identifier'].casefold():
+                        rank(position, 4)
+                    elif query in app['name'].casefold():
+                        rank(position, 5)
+
+        ordered = sorted(ranks.items(), key=lambda item: (item[1], apps[item[0]]['name'].casefold()))
+        return [apps[position] for position, _ in ordered]
+
+# Shell commands that install or remove packages
+PACKAGE_CHANGE_PATTERN = re.compile(r'\b(pm\s+(install|uninstall)|cmd\s+package\s+(install|uninstall))')
+
+def get_app_index(device_id, refresh=False):
+    """Return the app index for a connected device, enumerating only when it is stale"""
+    device = connected_devices.get(device_id)
+    if not device:
+        return None
+
+    with app_indexes_lock:
+        index = app_indexes.get(device_id)
+        if index is None:
+            index = app_indexes[device_id] = AppIndex(device_id)
+
+    if refresh or index.is_stale():
+        index.refresh(device, force=refresh)
+    return index
+
+def invalidate_app_index(device_id):
+    """Drop cached applications for a device, e.g. after an install or uninstall"""
+    index = app_indexes.get(device_id)
+    if index:
+        index.invalidate()
+
+class ProcessIndex:
+    """Cached process table for one device with pid, name and package lookups
+
+    A fresh enumeration is diffed in at most every PROCESS_INDEX_TTL seconds; spawns
+    and attaches made through the server update it in between.
+    """
+
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.lock = threading.Lock()          # Guards the lookup structures
+        self.refresh_lock = threading.Lock()  # Makes concurrent stale readers share one enumeration
+        self.by_pid = {}               # pid -> process name
+        self.by_name = {}              # process name -> set of pids
+        self.names = []                # sorted process names for prefix search
+        self.loaded_at = 0
+
+    def is_stale(self):
+        return not self.loaded_at or time.time() - self.loaded_at > PROCESS_INDEX_TTL
+
+    def invalidate(self):
+        self.loaded_at = 0
+
+    def refresh(self, device, force=False):
+        """Enumerate processes and diff them into the index"""
+        with self.refresh_lock:
+            if not force and not self.is_stale():
+                return {'started': 0, 'exited': 0, 'total': len(self.by_pid)}
+
+            by_pid = {process.pid: process.name for process in run_blocking(device.enumerate_processes)}
+            with self.lock:
+                started = by_pid.keys() - self.by_pid.keys()
+                exited = self.by_pid.keys() - by_pid.keys()
+                renamed = [pid for pid in by_pid.keys() & self.by_pid.keys() if by_pid[pid] != self.by_pid[pid]]
+                for pid in exited:
+                    self._remove(pid)
+                for pid in renamed:
+                    self._remove(pid)
+                for pid in list(started) + renamed:
+                    self._add(pid, by_pid[pid])
+                self.loaded_at = time.time()
+            return {'started': len(started), 'exited': len(exited), 'total': len(by_pid)}
+
+    def _add(self, pid, name):
+        self.by_pid[pid] = name
+        pids = self.by_name.get(name)
+        if pids is None:
+            pids = self.by_name[name] = set()
+            bisect.insort(self.names, name)
+        pids.add(pid)
+
+    def _remove(self, pid):
+        name = self.by_pid.pop(pid, None)
+        pids = self.by_name.get(name)
+        if pids is None:
+            return
+        pids.discard(pid)
+        if not pids:
+            del self.by_name[name]
+            position = bisect.bisect_left(self.names, name)
+            if position < len(self.names) and self.names[position] == name:
+                del self.names[position]
+
+    def add(self, pid, name):
+        """Record a process the server just spawned or found"""
+        with self.lock:
+            self._remove(pid)
+            self._add(pid, name)
+
+    def remove(self, pid):
+        with self.lock:
+            self._remove(pid)
+
+    def name(self, pid):
+        return self.by_pid.get(pid)
+
+    def pids(self, name):
+        with self.lock:
+            return sorted(self.by_name.get(name, ()))
+
+    def package_processes(self, package):
+        """The package's main process and its ':service' processes as [(name, pid)]"""
+        with self.lock:
+            matches = [(package, pid) for pid in sorted(self.by_name.get(package, ()))]
+            prefix = package + ':'
+            start = bisect.bisect_left(self.names, prefix)
+            for name in self.names[start:]:
+                if not name.startswith(prefix):
+                    break
+                matches.extend((name, pid) for pid in sorted(self.by_name[name]))
+            return matches
+
+    def find_partial(self, text):
+        """First process whose name contains text, as (name, pid), or None"""
+        with self.lock:
+            for name in self.names:
+                if text in name:
+                    return name, min(self.by_name[name])
+        return None
+
+    def list(self):
+        with self.lock:
+            return [{'pid': pid, 'name': name} for pid, name in sorted(self.by_pid.items())]
+
+process_indexes = {}    # device_id -> ProcessIndex - cached process table per connected device
+process_indexes_lock = threading.Lock()
+
+def get_process_index(device_id, refresh=False):
+    """Return the process index for a connected device, enumerating only when it is stale"""
+    device = connected_devices.get(device_id)
+    if not device:
+        return None
+
+    with process_indexes_lock:
+        index = process_indexes.get(device_id)
+        if index is None:
+            index = process_indexes[device_id] = ProcessIndex(device_id)
+
+    if refresh or index.is_stale():
+        index.refresh(device, force=refresh)
+    return index
+
+class DeviceBusyError(Exception):
+    """A queued device operation timed out or was cancelled before it could start"""
+
+    def __init__(self, message, status=503):
+        super().__init__(message)
+        self.status = status
+
+class DeviceScheduler:
+    """Per-device admission control for adb and Frida work
+
+    Mutating operations share DEVICE_WRITE_SLOTS per device and read-only ones share
+    DEVICE_READ_SLOTS, so reads never wait behind a hook or bring-up. Within each kind
+    operations start in arrival order.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.lanes = {}  # {device_id: {'read': lane, 'write': lane}}
+        self.jobs = {}   # job_id -> queued or running job
+
+    def _lane(self, device_id, kind):
+        lanes = self.lanes.get(device_id)
+        if lanes is None:
+            lanes = self.lanes[device_id] = {
+                lane_kind: {
+                    'running': 0,
+                    'queue': collections.deque(),
+                    'completed': 0,
+                    'timeouts': 0,
+                    'cancelled': 0,
+                    'waits': collections.deque(maxlen=256)  # Recent queue waits in seconds
+                }
+                for lane_kind in ('read', 'write')
+            }
+        return lanes[kind]
+
+    @contextlib.contextmanager
+    def slot(self, device_id, kind, label, timeout=None):
+        """Hold a read or write slot on a device for the duration of a with block"""
+        job = self.acquire(device_id, kind, label, timeout)
+        try:
+            yield job
+        finally:
+            self.release(job)
+
+    def acquire(self, device_id, kind, label, timeout=None):
+        """Queue for a slot, raising DeviceBusyError on timeout or cancellation"""
+        limit = DEVICE_WRITE_SLOTS if kind == 'write' else DEVICE_READ_SLOTS
+        timeout = DEVICE_QUEUE_TIMEOUT if timeout is None else float(timeout)
+        job = {
+            'jobId': uuid.uuid4().hex,
+            'deviceId': device_id,
+            'kind': kind,
+            'label': label,
+            'state': 'queued',
+            'queuedAt': time.time(),
+            'startedAt': None
+        }
+        deadline = time.monotonic() + timeout
+
+        with self.condition:
+            lane = self._lane(device_id, kind)
+            lane['queue'].append(job)
+            self.jobs[job['jobId']] = job
+
+            while job['state'] == 'queued' and not (lane['queue'][0] is job and lane['running'] < limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            if job['state'] == 'queued' and lane['queue'][0] is job and lane['running'] < limit:
+                lane['queue'].popleft()
+                lane['running'] += 1
+                job['state'] = 'running'
+                job['startedAt'] = time.time()
+                lane['waits'].append(job['startedAt'] - job['queuedAt'])
+                # The next waiter may fit in a slot too
+                self.condition.notify_all()
+                return job
+
+            lane['queue'].remove(job)
+            del self.jobs[job['jobId']]
+            self.condition.notify_all()
+            if job['state'] == 'cancelled':
+                lane['cancelled'] += 1
+                raise DeviceBusyError(f'[Device: {device_id}] {label} was cancelled while queued', 409)
+            lane['timeouts'] += 1
+            raise DeviceBusyError(f'[Device: {device_id}] {label} timed out after {timeout:g}s waiting for the device '
+                                  f'({lane["running"]} running, {len(lane["queue"])} queued)')
+
+    def release(self, job):
+        with self.condition:
+            lane = self._lane(job['deviceId'], job['kind'])
+            lane['running'] -= 1
+            lane['completed'] += 1
+            self.jobs.pop(job['jobId'], None)
+            self.condition.notify_all()
+
+    def cancel(self, job_id):
+        """Cancel a queued job; returns None if unknown and False if it already started"""
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job['state'] != 'queued':
+                return False
+            job['state'] = 'cancelled'
+            self.condition.notify_all()
+            return True
+
+    def stats(self, device_id=None):
+        now = time.time()
+        with self.condition:
+            devices = []
+            for lane_device, lanes in self.lanes.items():
+                if device_id and lane_device != device_id:
+                    continue
+                entry = {'deviceId': lane_device}
+                for kind, lane in lanes.items():
+                    waits = sorted(lane['waits'])
+                    entry[kind] = {
+                        'running': lane['running'],
+                        'queued': len(lane['queue']),
+                        'completed': lane['completed'],
+                        'timeouts': lane['timeouts'],
+                        'cancelled': lane['cancelled'],
+                        'avgWaitMs': int(sum(waits) / len(waits) * 1000) if waits else 0,
+                        'maxWaitMs': int(waits[-1] * 1000) if waits else 0,
+                        'oldestQueuedMs': int((now - lane['queue'][0]['queuedAt']) * 1000) if lane['queue'] else 0
+                    }
+                devices.append(entry)
+            jobs = [dict(job) for job in self.jobs.values() if not device_id or job['deviceId'] == device_id]
+        return {'devices': devices, 'jobs': jobs}
+
+device_scheduler = DeviceScheduler()
+
+class SharedSlot:
+    """One scheduler slot held on behalf of a group of operations running together
+
+    The first member in queues for the slot and the last one out releases it, so a group
+    counts as a single operation against the device's DEVICE_WRITE_SLOTS or
+    DEVICE_READ_SLOTS. How many members run at once inside it is the caller's own limit,
+    e.g. a hook batch's perDeviceLimit.
+    """
+
+    def __init__(self, scheduler, device_id, kind, label):
+        self.scheduler = scheduler
+        self.device_id = device_id
+        self.kind = kind
+        self.label = label
+        self.lock = threading.Lock()  # Held while queuing, so later members wait for the same slot
+        self.members = 0
+        self.job = None
+
+    @contextlib.contextmanager
+    def hold(self, timeout=None):
+        with self.lock:
+            if self.job is None:
+                self.job = self.scheduler.acquire(self.device_id, self.kind, self.label, timeout)
+            self.members += 1
+        try:
+            yield self.job
+        finally:
+            with self.lock:
+                self.members -= 1
+                if not self.members:
+                    self.scheduler.release(self.job)
+                    self.job = None
+
+def device_operation(kind):
+    """Run a route inside a scheduler slot for the request's deviceId
+
+    kind is 'read', 'write' or a function of the request data returning one of them.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True) or request.form or request.args
+            device_id = data.get('deviceId')
+            if not device_id:
+                return view(*args, **kwargs)  # The route reports the missing ID
+
+            queue_timeout = data.get('queueTimeout')
+            if queue_timeout is not None and queue_timeout != '':
+                try:
+                    queue_timeout = float(queue_timeout)
+                except (TypeError, ValueError):
+                    queue_timeout = -1
+                if not 0 <= queue_timeout < float('inf'):
+                    return jsonify({'error': 'queueTimeout must be a non-negative number of seconds'}), 400
             else:
-                # No package found with that name
-                return jsonify({'error': f"Package verification failed: {result}"}), 400
-        
-        # Use the correct case for the app_id
-        app_id = correct_app_id
-        
-        # Modify the script to intercept console.log calls
-        # This wrapper captures console.log, console.error, console.warn and sends them back as messages
-        console_log_wrapper = """
+                queue_timeout = None
+
+            try:
+                with device_scheduler.slot(device_id, kind(data) if callable(kind) else kind,
+                                           request.path, queue_timeout):
+                    return view(*args, **kwargs)
+            except DeviceBusyError as e:
+                return jsonify({'error': str(e)}), e.status
+        return wrapper
+    return decorator
+
+# Signal handler for graceful shutdown
+def signal_handler(sig, frame):
+    """Handle termination signals and perform cleanup"""
+    logger.info("Received shutdown signal, cleaning up...")
+    # Deliver any queued Frida output before tearing sessions down
+    for device_id in list(message_pipelines.keys()):
+        close_device_pipelines(device_id)
+    # Finish trace segments so they can be replayed after restart
+    close_all_trace_recorders()
+    # Clean up Frida sessions
+    for device_id in list(frida_sessions.keys()):
+        for app_id in list(frida_sessions.get(device_id, {}).keys()):
+            try:
+                if frida_sessions[device_id][app_id]:
+                    frida_sessions[device_id][app_id].detach()
+                    logger.info(f"Detached Frida session for device {device_id}, app {app_id}")
+            except Exception as e:
+                logger.error(f"Error detaching Frida session: {str(e)}")
+    if device_workers:
+        device_workers.stop()
+    logger.info("Shutdown complete")
+    sys.exit(0)
+
+# Register signal handlers
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+# Routes for static frontend
+@app.route('/', defaults={'path': ''})
+@app.route('/<path:path>')
+def serve_frontend(path):
+    if path != "" and os.path.exists(app.static_folder + '/' + path):
+        return send_from_directory(app.static_folder, path)
+    else:
+        return send_from_directory(app.static_folder, 'index.html')
+
+# Script prelude that intercepts console.log, console.error, console.warn etc. and sends them back as messages
+CONSOLE_WRAPPER = """
 // Intercept console.log and other console methods
 (function() {
     const origConsole = {};
@@ -597,176 +1702,2437 @@ console.log('Frida script injected and console.log interceptor initialized');
 
 // Original user script begins here
 """
-        
-        # Combine the wrapper with the original script
-        enhanced_script = console_log_wrapper + script_content
-        
-        # Define message callback
-        def on_message(message, data):
-            if message['type'] == 'send':
-                payload = message['payload']
+
+# Batching variant of the prelude: console records are buffered inside the agent and
+# delivered as one send() per batch, so heavy tracing doesn't pay a round trip per call.
+# Objects are passed through untouched and serialized once by send(); binary arguments
+# travel through send()'s data channel instead of being JSON-encoded.
+CONSOLE_BATCH_WRAPPER = """
+// Intercept console methods and batch their output
+(function() {
+    const origConsole = {};
+    const maxRecords = {{AGENT_BATCH_SIZE}};
+    const flushInterval = {{AGENT_BATCH_INTERVAL}};
+    let pending = [];
+    let timer = null;
+
+    function toBuffer(arg) {
+        if (arg instanceof ArrayBuffer) {
+            return arg;
+        }
+        if (ArrayBuffer.isView(arg)) {
+            return arg.buffer.slice(arg.byteOffset, arg.byteOffset + arg.byteLength);
+        }
+        return null;
+    }
+
+    function flush() {
+        if (timer !== null) {
+            clearTimeout(timer);
+            timer = null;
+        }
+        if (pending.length === 0) {
+            return;
+        }
+
+        const records = pending;
+        pending = [];
+        try {
+            send({ type: 'console.batch', records: records });
+        } catch (e) {
+            // Something in the batch isn't serializable - fall back to strings
+            send({
+                type: 'console.batch',
+                records: records.map(function(record) {
+                    return { level: record.level, args: record.args.map(String) };
+                })
+            });
+        }
+    }
+
+    ['log', 'warn', 'error', 'info', 'debug'].forEach(function(method) {
+        origConsole[method] = console[method];
+        console[method] = function() {
+            const args = Array.prototype.slice.call(arguments);
+            let buffer = null;
+            const values = [];
+            args.forEach(function(arg) {
+                const asBuffer = buffer === null ? toBuffer(arg) : null;
+                if (asBuffer !== null) {
+                    buffer = asBuffer;
+                } else {
+                    values.push(arg);
+                }
+            });
+
+            if (buffer !== null) {
+                // Keep ordering: flush buffered records, then ship the binary record on its own
+                flush();
+                send({ type: 'console.' + method, args: values }, buffer);
+            } else {
+                pending.push({ level: method, args: values });
+                if (pending.length >= maxRecords) {
+                    flush();
+                } else if (timer === null) {
+                    timer = setTimeout(flush, flushInterval);
+                }
+            }
+
+            // Call original method
+            return origConsole[method].apply(console, arguments);
+        };
+    });
+})();
+
+// Log that script was successfully loaded
+console.log('Frida script injected and batched console interceptor initialized');
+
+// Original user script begins here
+"""
+
+def parse_flag(value, default=False):
+    """Read a boolean request field like the env flags: only true or 'true' (any case) is true"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() == 'true'
+
+def build_console_wrapper(batching=False):
+    """Return the console-intercepting prelude prepended to every hooked script"""
+    if not batching:
+        return CONSOLE_WRAPPER
+    return (CONSOLE_BATCH_WRAPPER
+            .replace('{{AGENT_BATCH_SIZE}}', str(AGENT_BATCH_SIZE))
+            .replace('{{AGENT_BATCH_INTERVAL}}', str(AGENT_BATCH_INTERVAL)))
+
+def format_console_args(args):
+    """Join raw console arguments sent by the batching prelude into one line"""
+    parts = []
+    for arg in args:
+        if isinstance(arg, str):
+            parts.append(arg)
+        else:
+            parts.append(json.dumps(arg, separators=(',', ':')))
+    return ' '.join(parts)
+
+# Helper function to verify package exists and get the correct case
+def verify_package_name(device_id, package_name):
+    try:
+        index = get_app_index(device_id)
+        if not index:
+            return None, "Device not connected"
+        
+        # First check for exact match
+        app = index.lookup(package_name)
+        if app:
+            return app['identifier'], None  # Return the correct case
+        
+        # If no exact match, check for partial matches
+        partial_matches = index.search(package_name)
+        
+        if partial_matches:
+            return None, partial_matches
+        
+        return None, "Package not found"
+    except Exception as e:
+        return None, str(e)
+
+# API routes
+@app.route('/api/devices', methods=['GET'])
+def get_devices():
+    try:
+        # Served from the monitor's snapshot; adb is only queried directly until it has one
+        device_monitor.start()
+        snapshot = device_monitor.snapshot()
+        if snapshot is not None:
+            return jsonify(snapshot + (node_hub.device_list() if node_hub else []))
+        
+        devices = []
+        
+        for device_id, status in adb_devices():
+            # Get additional device info for connected devices
+            device_info = {
+                'id': device_id,
+                'status': status,
+                'connected': device_id in connected_devices,
+                'apps': [],
+                'frida_server': False
+            }
+            
+            # If device is connected to our app, get more info
+            if device_id in connected_devices:
+                # Check how many apps are hooked
+                if device_id in frida_sessions:
+                    device_info['apps'] = list(frida_sessions[device_id].keys())
                 
-                # Check if this is a console log message
-                if isinstance(payload, dict) and 'type' in payload and payload['type'].startswith('console.'):
-                    # Special handling for console messages
-                    log_type = payload['type'].split('.')[1]  # 'log', 'error', etc.
-                    message_text = payload['message']
-                    
-                    # Format message for the UI
-                    socketio.emit('frida_console', {
-                        'deviceId': device_id,
-                        'appId': app_id,
+                # Check if frida-server is running
+                try:
+                    device_info['frida_server'] = is_frida_server_running(device_id)
+                except:
+                    pass
+                
+                # Add device status info if available
+                if device_id in device_status:
+                    device_info.update(device_status[device_id])
+            
+            devices.append(device_info)
+        
+        if node_hub:
+            devices += node_hub.device_list()
+        return jsonify(devices)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search-apps', methods=['GET'])
+@device_operation('read')
+def search_apps():
+    device_id = request.args.get('deviceId')
+    query = request.args.get('query', '')
+    
+    if not device_id:
+        return jsonify({'error': 'Device ID is required'}), 400
+    
+    if device_id not in connected_devices:
+        return jsonify({'error': 'Device not connected'}), 400
+    
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = request.args.get('limit')
+        limit = max(int(limit), 0) if limit is not None else None
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    
+    try:
+        index = get_app_index(device_id, refresh=request.args.get('refresh') == 'true')
+        
+        # Ranked in memory: exact matches first, then prefixes, then substrings
+        filtered_apps = index.search(query)
+        total = len(filtered_apps)
+        
+        if limit is not None:
+            filtered_apps = filtered_apps[offset:offset + limit]
+        elif offset:
+            filtered_apps = filtered_apps[offset:]
+        
+        response = jsonify(filtered_apps)
+        response.headers['X-Total-Count'] = str(total)
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+class AdbError(Exception):
+    """Raised when the adb server answers FAIL or the connection breaks"""
+
+class AdbClient:
+    """Client for the adb server's smart-socket protocol with pooled per-device connections
+
+    Every adb service (shell:, sync:, ...) consumes the socket it runs on, so the pool keeps
+    connections that have already been switched to a device's transport (host:transport:<serial>).
+    A command then costs a single round trip on an open socket instead of forking an adb client.
+    """
+
+    def __init__(self, host=None, port=None, pool_size=None, timeout=None):
+        self.host = host or ADB_SERVER_HOST
+        self.port = port or ADB_SERVER_PORT
+        self.pool_size = ADB_POOL_SIZE if pool_size is None else pool_size
+        self.timeout = timeout or ADB_SOCKET_TIMEOUT
+        self.pools = {}     # serial -> deque of sockets bound to the device's transport
+        self.features = {}  # serial -> set of adb features supported by the device
+        self.lock = threading.Lock()
+        self.refill_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='adb-pool')
+
+    # Protocol primitives
+
+    def _open(self):
+        try:
+            return socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise AdbError(f'Cannot reach adb server at {self.host}:{self.port}: {str(e)}')
+
+    @staticmethod
+    def _recv_exact(sock, size):
+        chunks = []
+        while size:
+            chunk = sock.recv(size)
+            if not chunk:
+                raise AdbError('adb server closed the connection')
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    @staticmethod
+    def _recv_all(sock):
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+    def _request(self, sock, payload):
+        """Send one length-prefixed request and wait for OKAY"""
+        data = payload.encode('utf-8')
+        sock.sendall(b'%04x' % len(data) + data)
+        status = self._recv_exact(sock, 4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            raise AdbError(self._read_string(sock))
+        raise AdbError(f'Unexpected adb server response: {status!r}')
+
+    def _read_string(self, sock):
+        length = int(self._recv_exact(sock, 4), 16)
+        return self._recv_exact(sock, length).decode('utf-8', errors='replace')
+
+    def host_command(self, payload):
+        """Run a host: service that answers with a single length-prefixed string"""
+        sock = self._open()
+        try:
+            self._request(sock, payload)
+            return self._read_string(sock)
+        finally:
+            sock.close()
+
+    # Connection pool
+
+    def _transport_socket(self, serial):
+        sock = self._open()
+        try:
+            self._request(sock, f'host:transport:{serial}')
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _checkout(self, serial):
+        """Take a transport-bound socket from the pool, topping the pool up in the background"""
+        with self.lock:
+            pool = self.pools.setdefault(serial, collections.deque())
+            sock = pool.popleft() if pool else None
+        if self.pool_size:
+            self.refill_executor.submit(self._refill, serial)
+        return sock or self._transport_socket(serial)
+
+    def _refill(self, serial):
+        try:
+            while True:
+                with self.lock:
+                    pool = self.pools.get(serial)
+                    if pool is None or len(pool) >= self.pool_size:
+                        return
+                sock = self._transport_socket(serial)
+                with self.lock:
+                    self.pools.setdefault(serial, collections.deque()).append(sock)
+        except Exception as e:
+            logger.debug(f"[Device: {serial}] Could not refill adb connection pool: {str(e)}")
+
+    def _service(self, serial, service):
+        """Open a device service on a pooled socket, retrying once on a stale connection"""
+        for attempt in range(2):
+            sock = self._checkout(serial)
+            try:
+                self._request(sock, service)
+                return sock
+            except AdbError as e:
+                sock.close()
+                if attempt or 'closed the connection' not in str(e):
+                    raise
+            except OSError:
+                sock.close()
+                if attempt:
+                    raise
+        raise AdbError(f'Could not open {service} on {serial}')
+
+    def drop(self, serial=None):
+        """Close pooled connections for one device, or all of them"""
+        with self.lock:
+            serials = [serial] if serial else list(self.pools.keys())
+            for key in serials:
+                for sock in self.pools.pop(key, ()):
+                    sock.close()
+                self.features.pop(key, None)
+
+    # Services
+
+    def devices(self):
+        """List (serial, state) tuples known to the adb server"""
+        devices = []
+        for line in self.host_command('host:devices').splitlines():
+            parts = line.split('\t')
+            if len(parts) >= 2:
+                devices.append((parts[0].strip(), parts[1].strip()))
+        return devices
+
+    def track_devices(self):
+        """Yield the full [(serial, state)] list every time the adb server reports a change"""
+        sock = self._open()
+        try:
+            sock.settimeout(None)
+            self._request(sock, 'host:track-devices')
+            while True:
+                devices = []
+                for line in self._read_string(sock).splitlines():
+                    parts = line.split('\t')
+                    if len(parts) >= 2:
+                        devices.append((parts[0].strip(), parts[1].strip()))
+                yield devices
+        finally:
+            sock.close()
+
+    def device_features(self, serial):
+        if serial not in self.features:
+            features = self.host_command(f'host-serial:{serial}:features')
+            self.features[serial] = set(features.strip().split(','))
+        return self.features[serial]
+
+    def shell(self, serial, command, timeout=None):
+        """Run a shell command, returning a CompletedProcess like subprocess.run(text=True)
+
+        As with subprocess.run, a timeout of None waits for the command however long it takes;
+        only the connection handshake is bounded by ADB_SOCKET_TIMEOUT.
+        """
+        try:
+            if 'shell_v2' in self.device_features(serial):
+                stdout, stderr, returncode = self._shell_v2(serial, command, timeout)
+            else:
+                stdout, stderr, returncode = self._shell_v1(serial, command, timeout)
+        except socket.timeout:
+            raise subprocess.TimeoutExpired(command, timeout)
+        return subprocess.CompletedProcess(
+            [ADB_PATH, '-s', serial, 'shell', command], returncode,
+            stdout.decode('utf-8', errors='replace').replace('\r\n', '\n'),
+            stderr.decode('utf-8', errors='replace').replace('\r\n', '\n')
+        )
+
+    def _shell_v2(self, serial, command, timeout):
+        sock = self._service(serial, f'shell,v2,raw:{command}')
+        sock.settimeout(timeout)
+        stdout, stderr, returncode = [], [], None
+        try:
+            # Packets are a 1-byte stream id, a 4-byte little-endian length and the payload
+            while True:
+                header = sock.recv(5)
+                if not header:
+                    break
+                if len(header) < 5:
+                    header += self._recv_exact(sock, 5 - len(header))
+                stream_id, length = struct.unpack('<BI', header)
+                payload = self._recv_exact(sock, length) if length else b''
+                if stream_id == 1:
+                    stdout.append(payload)
+                elif stream_id == 2:
+                    stderr.append(payload)
+                elif stream_id == 3:
+                    returncode = payload[0] if payload else 0
+                    break
+        finally:
+            sock.close()
+        return b''.join(stdout), b''.join(stderr), returncode if returncode is not None else 255
+
+    def _shell_v1(self, serial, command, timeout):
+        # Legacy shell merges stderr into stdout and has no exit status, so echo one
+        marker = f'__TRISHUL_RC_{uuid.uuid4().hex}__'
+        # A newline rather than ';' so commands ending in '&' stay valid sh
+        sock = self._service(serial, f'shell:{command}\necho "{marker}$?"')
+        sock.settimeout(timeout)
+        try:
+            output = self._recv_all(sock)
+        finally:
+            sock.close()
+        head, found, tail = output.rpartition(marker.encode())
+        if not found:
+            return output, b'', 255
+        try:
+            return head, b'', int(tail.strip())
+        except ValueError:
+            return head, b'', 255
+
+    def open_shell(self, serial, command):
+        """Start a shell command and return (socket, v2) for reading its output as it arrives"""
+        v2 = 'shell_v2' in self.device_features(serial)
+        sock = self._service(serial, f'shell,v2,raw:{command}' if v2 else f'shell:{command}')
+        sock.settimeout(None)
+        return sock, v2
+
+    def open_exec(self, serial, command):
+        """Start a command on the binary-safe exec: service and return its socket"""
+        sock = self._service(serial, f'exec:{command}')
+        sock.settimeout(None)
+        return sock
+
+    def read_shell(self, sock, v2):
+        """Yield ('stdout' | 'stderr', bytes) chunks from open_shell, then ('exit', status)
+
+        The legacy shell protocol merges stderr into stdout and reports no status (None).
+        """
+        if v2:
+            while True:
+                header = sock.recv(5)
+                if not header:
+                    break
+                if len(header) < 5:
+                    header += self._recv_exact(sock, 5 - len(header))
+                stream_id, length = struct.unpack('<BI', header)
+                payload = self._recv_exact(sock, length) if length else b''
+                if stream_id == 1:
+                    yield 'stdout', payload
+                elif stream_id == 2:
+                    yield 'stderr', payload
+                elif stream_id == 3:
+                    yield 'exit', payload[0] if payload else 0
+                    return
+        else:
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                yield 'stdout', chunk
+        yield 'exit', None
+
+    def shell_many(self, serial, commands, timeout=None):
+        """Pipeline several commands through one shell session, one CompletedProcess each"""
+        marker = f'__TRISHUL_CMD_{uuid.uuid4().hex}__'
+        # The legacy shell merges stderr into stdout, so only mark stderr when it is separate
+        v2 = 'shell_v2' in self.device_features(serial)
+        script = '\n'.join(
+            f'{command}\necho "{marker} $?"' + (f'\necho "{marker}" >&2' if v2 else '')
+            for command in commands
+        )
+        combined = self.shell(serial, script, timeout=timeout)
+
+        stdout_parts = combined.stdout.split(marker)
+        stderr_parts = combined.stderr.split(marker)
+        results = []
+        for i, command in enumerate(commands):
+            stdout = stdout_parts[i] if i < len(stdout_parts) else ''
+            stderr = stderr_parts[i] if i < len(stderr_parts) else ''
+            # Each chunk after a marker starts with " <status>\n" on stdout and "\n" on stderr
+            returncode = 255
+            if i + 1 < len(stdout_parts):
+                status_line, _, rest = stdout_parts[i + 1].partition('\n')
+                stdout_parts[i + 1] = rest
+                try:
+                    returncode = int(status_line.strip())
+                except ValueError:
+                    pass
+            if i + 1 < len(stderr_parts) and stderr_parts[i + 1].startswith('\n'):
+                stderr_parts[i + 1] = stderr_parts[i + 1][1:]
+            results.append(subprocess.CompletedProcess(
+                [ADB_PATH, '-s', serial, 'shell', command], returncode, stdout, stderr
+            ))
+        return results
+
+adb_client = AdbClient() if ADB_TRANSPORT == 'socket' else None
+
+def adb_operation(command):
+    """Metric label for a shell command: the program it runs, looking through su wrappers"""
+    for word in command.replace('"', ' ').split():
+        if word not in ('su', '-c', '0'):
+            return re.sub(r'[^A-Za-z0-9_.-]', '', word.rsplit('/', 1)[-1])[:32] or 'shell'
+    return 'shell'
+
+def adb_shell(device_id, command, timeout=None, operation=None):
+    """Run a shell command on a device through adb
+
+    operation overrides the metric label, e.g. so arbitrary user commands share one.
+    """
+    started = time.perf_counter()
+    operation = operation or adb_operation(command)
+    if adb_client:
+        try:
+            result = adb_client.shell(device_id, command, timeout=timeout)
+            metrics.observe('trishul_adb_command_seconds', time.perf_counter() - started, operation=operation, transport='socket')
+            return result
+        except AdbError as e:
+            if 'Cannot reach adb server' not in str(e):
+                # Answer like the adb binary would for unknown or offline devices
+                return subprocess.CompletedProcess([ADB_PATH, '-s', device_id, 'shell', command], 1, '', f'error: {str(e)}\n')
+            logger.debug(f"adb socket transport unavailable, falling back to {ADB_PATH}: {str(e)}")
+        except OSError as e:
+            # The adb server dropped the connection mid-command, so retry through the binary
+            logger.debug(f"[Device: {device_id}] adb socket failed, falling back to {ADB_PATH}: {str(e)}")
+
+    try:
+        return subprocess.run(
+            [ADB_PATH, '-s', device_id, 'shell', command],
+            capture_output=True, text=True, timeout=timeout
+        )
+    finally:
+        metrics.observe('trishul_adb_command_seconds', time.perf_counter() - started, operation=operation, transport='subprocess')
+
+def adb_shell_many(device_id, commands, timeout=None):
+    """Run several shell commands in one round trip when the socket transport is available"""
+    if adb_client:
+        try:
+            with metrics.timer('trishul_adb_command_seconds', operation='shell_many', transport='socket'):
+                return adb_client.shell_many(device_id, commands, timeout=timeout)
+        except (AdbError, OSError) as e:
+            logger.debug(f"[Device: {device_id}] Pipelined shell failed, running commands one by one: {str(e)}")
+    return [adb_shell(device_id, command, timeout=timeout) for command in commands]
+
+def adb_devices():
+    """List (serial, state) tuples for every device the adb server knows about"""
+    if adb_client:
+        try:
+            return adb_client.devices()
+        except AdbError as e:
+            logger.debug(f"adb socket transport unavailable, falling back to {ADB_PATH}: {str(e)}")
+
+    with metrics.timer('trishul_adb_command_seconds', operation='devices', transport='subprocess'):
+        result = subprocess.run([ADB_PATH, 'devices'], capture_output=True, text=True)
+    devices = []
+    for line in result.stdout.strip().split('\n')[1:]:
+        parts = line.split('\t')
+        if line.strip() and len(parts) >= 2:
+            devices.append((parts[0].strip(), parts[1].strip()))
+    return devices
+
+# Frida server binaries bundled in bin/, by device ABI
+FRIDA_SERVER_BINARIES = {
+    'armeabi-v7a': 'frida-server-16.2.2-android-arm',
+    'armeabi': 'frida-server-16.2.2-android-arm',
+    'arm64-v8a': 'frida-server-16.2.2-android-arm64',
+    'x86': 'frida-server-16.2.2-android-x86',
+    'x86_64': 'frida-server-16.2.2-android-x86_64'
+}
+
+# Ways of running a command as root, in the order they are preferred
+ROOT_METHODS = collections.OrderedDict([
+    ('su -c', lambda cmd: f'su -c "{cmd}"'),
+    ('su 0', lambda cmd: f'su 0 {cmd}'),
+    ('direct', lambda cmd: cmd),  # Pre-rooted emulators / adb root
+])
+
+connect_jobs = {}          # job_id -> connect job state, see start_connect_job
+connect_jobs_lock = threading.Lock()
+device_root_methods = {}   # device_id -> ROOT_METHODS key that worked during bring-up
+frida_server_versions = {}  # device_id -> frida-server version reported during bring-up
+probe_executor = ThreadPoolExecutor(max_workers=CONNECT_PROBE_WORKERS, thread_name_prefix='adb-probe')
+
+def root_command_failed(result):
+    return "invalid" in result.stderr or "not found" in result.stderr
+
+def detect_root_method(device_id):
+    """Probe all root methods in one pipelined round trip and return the first that works"""
+    methods = list(ROOT_METHODS.keys())
+    try:
+        results = dict(zip(methods, adb_shell_many(
+            device_id, [wrap('id') for wrap in ROOT_METHODS.values()], timeout=ADB_PROBE_TIMEOUT
+        )))
+    except subprocess.TimeoutExpired:
+        results = {}
+
+    # Prefer a method that actually gives uid 0
+    for method, result in results.items():
+        if 'uid=0' in result.stdout:
+            return method
+
+    # Otherwise keep the old fallback order: first method the shell didn't reject
+    for method, result in results.items():
+        if not root_command_failed(result):
+            return method
+    return 'direct'
+
+def adb_root_shell(device_id, command, timeout=None):
+    """Run a shell command as root using the method recorded for the device"""
+    method = device_root_methods.get(device_id, 'su -c')
+    return adb_shell(device_id, ROOT_METHODS[method](command), timeout=timeout)
+
+def is_frida_server_running(device_id):
+    result = adb_shell(device_id, 'ps | grep frida-server', timeout=ADB_PROBE_TIMEOUT)
+    return 'frida-server' in result.stdout
+
+def wait_for_frida_server(device_id, timeout=None):
+    """Poll until frida-server shows up in the process list, backing off exponentially"""
+    deadline = time.monotonic() + (timeout or FRIDA_START_TIMEOUT)
+    delay = 0.1
+    while True:
+        if is_frida_server_running(device_id):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 1.0)
+
+def get_frida_server_version(device_id):
+    result = adb_shell(device_id, f'{FRIDA_SERVER_PATH} --version', timeout=ADB_PROBE_TIMEOUT)
+    return result.stdout.strip()
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class BinaryCatalog:
+    """sha256 of every frida-server binary that can be pushed, hashed once per file version
+
+    Bundled binaries live in bin/; uploads are stored under FRIDA_UPLOADS_DIR named by hash.
+    """
+
+    def __init__(self):
+        self.entries = {}  # path -> (mtime, size, sha256)
+        self.lock = threading.Lock()
+
+    def hash(self, path):
+        stat = os.stat(path)
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry and entry[:2] == (stat.st_mtime, stat.st_size):
+            return entry[2]
+        sha256 = hash_file(path)
+        with self.lock:
+            self.entries[path] = (stat.st_mtime, stat.st_size, sha256)
+        return sha256
+
+    def scan(self):
+        """Hash the bundled and uploaded binaries so bring-up never waits on it"""
+        paths = [os.path.join('bin', name) for name in sorted(set(FRIDA_SERVER_BINARIES.values()))]
+        if os.path.isdir(FRIDA_UPLOADS_DIR):
+            paths += [os.path.join(FRIDA_UPLOADS_DIR, name) for name in os.listdir(FRIDA_UPLOADS_DIR) if not name.endswith('.part')]
+        for path in paths:
+            if os.path.exists(path):
+                try:
+                    self.hash(path)
+                except OSError as e:
+                    logger.warning(f"Could not hash {path}: {str(e)}")
+
+    def find(self, sha256):
+        with self.lock:
+            for path, entry in self.entries.items():
+                if entry[2] == sha256 and os.path.exists(path):
+                    return path
+        return None
+
+    def stats(self):
+        with self.lock:
+            return [{'path': path, 'size': size, 'sha256': sha256} for path, (_, size, sha256) in self.entries.items()]
+
+binary_catalog = BinaryCatalog()
+
+def bundled_server_binary(device_arch):
+    server_binary = FRIDA_SERVER_BINARIES.get(device_arch)
+    if not server_binary:
+        # Default to arm64 if architecture detection fails
+        server_binary = 'frida-server-16.2.2-android-arm64'
+    return server_binary
+
+def read_server_marker(device_id):
+    """Return the (sha256, source) recorded next to frida-server on the device, or (None, None)"""
+    return parse_server_marker(adb_shell(device_id, f'cat {FRIDA_SERVER_MARKER}', timeout=ADB_PROBE_TIMEOUT))
+
+def parse_server_marker(result):
+    parts = result.stdout.split()
+    if result.returncode == 0 and len(parts) == 2 and len(parts[0]) == 64:
+        return parts[0], parts[1]
+    return None, None
+
+def push_server_binary(device_id, binary_path, sha256, source):
+    """Push a binary beside frida-server, then swap it in and record its hash
+
+    The swap only happens after a complete push, so an interrupted transfer never
+    leaves a truncated frida-server behind.
+    """
+    part_path = FRIDA_SERVER_PATH + '.part'
+    with metrics.timer('trishul_adb_command_seconds', operation='push', transport='subprocess'):
+        push_result = subprocess.run(
+            [ADB_PATH, '-s', device_id, 'push', binary_path, part_path],
+            capture_output=True, text=True
+        )
+    if push_result.returncode != 0:
+        raise RuntimeError(f'Failed to push Frida server to device: {push_result.stderr}')
+
+    swap_result = adb_root_shell(device_id, f'chmod 755 {part_path} && mv -f {part_path} {FRIDA_SERVER_PATH}', timeout=ADB_PROBE_TIMEOUT)
+    if swap_result.returncode != 0:
+        raise RuntimeError(f'Could not install Frida server: {swap_result.stderr}')
+    adb_shell(device_id, f'echo {sha256} {source} > {FRIDA_SERVER_MARKER}', timeout=ADB_PROBE_TIMEOUT)
+
+def provision_frida_server(device_id, device_arch, exists, marker, report, running=False, sha256=None):
+    """Make sure the device has the wanted frida-server, pushing only when its hash differs
+
+    Without sha256 the bundled binary for the device ABI is wanted. A binary somebody
+    uploaded is left alone unless an upload is being provisioned explicitly. Returns
+    True when a binary was pushed.
+    """
+    if sha256:
+        binary_path, source = binary_catalog.find(sha256), 'upload'
+        if not binary_path:
+            raise RuntimeError(f'No uploaded Frida server with hash {sha256}')
+    else:
+        source = bundled_server_binary(device_arch)
+        binary_path = os.path.join('bin', source)
+        if not os.path.exists(binary_path):
+            if exists:
+                # Nothing to compare against; use what the device already has
+                report(f'Bundled {source} not found, keeping the Frida server on the device')
+                return False
+            raise RuntimeError(f'Required Frida server binary not found: {binary_path}')
+        sha256 = binary_catalog.hash(binary_path)
+
+    device_hash, device_source = marker
+    if exists and device_hash is None:
+        # Installed before hashes were recorded: hash it once on the device
+        result = adb_shell(device_id, f'sha256sum {FRIDA_SERVER_PATH}', timeout=ADB_PROBE_TIMEOUT)
+        device_hash = (result.stdout.split() or [None])[0]
+        if device_hash == sha256:
+            adb_shell(device_id, f'echo {sha256} {source} > {FRIDA_SERVER_MARKER}', timeout=ADB_PROBE_TIMEOUT)
+        elif source != 'upload':
+            report('Keeping the Frida server already on the device')
+            return False
+
+    if exists and device_hash == sha256:
+        report(f'Frida server on device is up to date ({sha256[:12]})')
+        return False
+    if exists and source != 'upload' and device_source == 'upload':
+        report('Keeping the uploaded Frida server on the device')
+        return False
+
+    report(f'Pushing {os.path.basename(binary_path)} ({sha256[:12]}) to {device_id}')
+    if running:
+        # The old server keeps running from the replaced file otherwise
+        adb_root_shell(device_id, 'pkill frida-server', timeout=ADB_PROBE_TIMEOUT)
+    push_server_binary(device_id, binary_path, sha256, source)
+    report('Successfully pushed Frida server to device.')
+    return True
+
+def start_frida_server(device_id, report):
+    """Start frida-server in the background and wait until it answers; returns whether it did"""
+    report(f'Starting frida-server on {device_id}')
+    try:
+        adb_root_shell(device_id, f'{FRIDA_SERVER_PATH} &', timeout=ADB_PROBE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        # The backgrounded server can keep adb's output open; readiness is checked below
+        pass
+
+    if wait_for_frida_server(device_id):
+        report('Frida server started successfully')
+        return True
+    report('Warning: Could not verify if frida-server is running')
+    return False
+
+def restart_frida_server(device_id, report):
+    """Start a freshly pushed frida-server in place of the outdated one stopped for the push
+
+    Used outside the connect job, so it also refreshes what the monitor and the script
+    cache know about the device's server.
+    """
+    running = start_frida_server(device_id, report)
+    device_monitor.frida_server[device_id] = running
+    if running and device_id in connected_devices:
+        frida_server_versions[device_id] = get_frida_server_version(device_id)
+        if device_workers:
+            device_workers.call(device_id, 'attach_device', server_version=frida_server_versions[device_id])
+    device_monitor.notify(device_id)
+    return running
+
+def hooked_apps(device_id):
+    apps = list(frida_sessions.get(device_id, {}).keys())
+    if device_workers:
+        apps += device_workers.hooked.get(device_id, [])
+    return apps
+
+class DeviceMonitor:
+    """Tracks adb devices and frida-server liveness in the background
+
+    /api/devices serves the snapshot without touching adb, and every change is pushed to
+    clients as a device_update delta ({added, changed, removed}) so they don't have to poll.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.states = {}        # serial -> adb state ('device', 'offline', 'unauthorized', ...)
+        self.frida_server = {}  # serial -> whether frida-server was running at the last probe
+        self.infos = {}         # serial -> last device info sent to clients
+        self.ready = False      # True once the first device list arrived
+        self.started = False
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        socketio.start_background_task(self._track_devices)
+        socketio.start_background_task(self._probe_frida_servers)
+
+    def snapshot(self):
+        """Device infos for /api/devices, or None until the monitor has seen adb"""
+        with self.lock:
+            if not self.ready:
+                return None
+            return [self.infos[serial] for serial in sorted(self.infos)]
+
+    def device_info(self, device_id):
+        info = {
+            'id': device_id,
+            'status': self.states.get(device_id),
+            'connected': device_id in connected_devices,
+            'apps': hooked_apps(device_id) if device_id in connected_devices else [],
+            'frida_server': self.frida_server.get(device_id, False) if device_id in connected_devices else False
+        }
+        if device_id in connected_devices and device_id in device_status:
+            info.update(device_status[device_id])
+        return info
+
+    def notify(self, device_id=None):
+        """Recompute device infos after a connect, disconnect, hook or unhook and push changes"""
+        with self.lock:
+            if not self.ready:
+                return
+            serials = [device_id] if device_id else list(self.states.keys())
+            changed = []
+            for serial in serials:
+                if serial not in self.states:
+                    continue
+                info = self.device_info(serial)
+                if info != self.infos.get(serial):
+                    self.infos[serial] = info
+                    changed.append(info)
+        if changed:
+            socketio.emit('device_update', {'added': [], 'changed': changed, 'removed': []})
+
+    def _apply_device_list(self, devices):
+        with self.lock:
+            current = dict(devices)
+            added = [serial for serial in current if serial not in self.states]
+            removed = [serial for serial in self.states if serial not in current]
+            self.states = current
+            self.ready = True
+
+            for serial in removed:
+                self.infos.pop(serial, None)
+                self.frida_server.pop(serial, None)
+
+            added_infos, changed_infos = [], []
+            for serial in current:
+                info = self.device_info(serial)
+                if serial in added:
+                    added_infos.append(info)
+                elif info != self.infos.get(serial):
+                    changed_infos.append(info)
+                self.infos[serial] = info
+
+        if added_infos or changed_infos or removed:
+            socketio.emit('device_update', {'added': added_infos, 'changed': changed_infos, 'removed': removed})
+
+    def _track_devices(self):
+        """Follow adb's device list, preferring the streaming track-devices service"""
+        while True:
+            if adb_client:
+                try:
+                    for devices in adb_client.track_devices():
+                        self._apply_device_list(devices)
+                except Exception as e:
+                    logger.debug(f"track-devices stream ended, polling instead: {str(e)}")
+
+            # Poll until the adb server is reachable again
+            try:
+                self._apply_device_list(adb_devices())
+            except Exception as e:
+                logger.debug(f"Could not list adb devices: {str(e)}")
+            socketio.sleep(DEVICE_POLL_INTERVAL)
+
+    def _probe_frida_servers(self):
+        """Check frida-server on every connected device concurrently"""
+        while True:
+            serials = [serial for serial in list(connected_devices.keys()) if self.states.get(serial) == 'device']
+            if serials:
+                futures = {serial: probe_executor.submit(is_frida_server_running, serial) for serial in serials}
+                for serial, future in futures.items():
+                    try:
+                        running = future.result()
+                    except Exception:
+                        running = False
+                    with self.lock:
+                        self.frida_server[serial] = running
+                self.notify()
+            socketio.sleep(DEVICE_PROBE_INTERVAL)
+
+device_monitor = DeviceMonitor()
+
+def update_connect_job(job, message=None, **changes):
+    """Record progress on a connect job and push it to clients"""
+    with connect_jobs_lock:
+        job.update(changes)
+        if message:
+            job['steps'].append({'time': time.time(), 'message': message})
+        snapshot = dict(job, steps=list(job['steps']))
+
+    subscriptions.publish('connect_progress', {
+        'jobId': job['jobId'],
+        'deviceId': job['deviceId'],
+        'state': snapshot['state'],
+        'message': message,
+        'error': snapshot['error']
+    }, job['deviceId'])
+    if message:
+        subscriptions.publish('status', {'message': message}, job['deviceId'])
+    return snapshot
+
+def run_connect_job(job):
+    """Bring a device up: provision and start frida-server, then connect through Frida"""
+    device_id = job['deviceId']
+    scheduled = None
+
+    try:
+        # Bring-up mutates device state, so it waits for hooks and other bring-ups
+        scheduled = device_scheduler.acquire(device_id, 'write', 'connect')
+        update_connect_job(job, f'[Device: {device_id}] Probing device...', state='running')
+        
+        # Independent probes run concurrently
+        probes = {
+            'exists': probe_executor.submit(adb_shell, device_id, f'ls {FRIDA_SERVER_PATH}', ADB_PROBE_TIMEOUT),
+            'arch': probe_executor.submit(adb_shell, device_id, 'getprop ro.product.cpu.abi', ADB_PROBE_TIMEOUT),
+            'running': probe_executor.submit(is_frida_server_running, device_id),
+            'version': probe_executor.submit(get_frida_server_version, device_id),
+            'root': probe_executor.submit(detect_root_method, device_id),
+            'marker': probe_executor.submit(read_server_marker, device_id),
+        }
+
+        check_frida = probes['exists'].result()
+        frida_server_exists = 'No such file' not in check_frida.stderr and 'not found' not in check_frida.stderr
+        root_method = probes['root'].result()
+        device_root_methods[device_id] = root_method
+        update_connect_job(job, f'[Device: {device_id}] Using root method: {root_method}', rootMethod=root_method)
+
+        device_arch = probes['arch'].result().stdout.strip()
+        if not frida_server_exists:
+            update_connect_job(job, f'Frida server not found on device. Detected device architecture: {device_arch}')
+            if device_arch not in FRIDA_SERVER_BINARIES:
+                update_connect_job(job, f'Unknown architecture: {device_arch}, defaulting to arm64')
+
+        # Push only when the on-device hash differs from the binary we would push
+        pushed = provision_frida_server(
+            device_id, device_arch, frida_server_exists, probes['marker'].result(),
+            lambda message: update_connect_job(job, message), running=probes['running'].result()
+        )
+
+        if pushed or not probes['running'].result():
+            start_frida_server(device_id, lambda message: update_connect_job(job, message))
+
+        # Check frida-server version; a fresh push makes the early probe stale
+        try:
+            server_version = probes['version'].result() if not pushed else get_frida_server_version(device_id)
+            frida_server_versions[device_id] = server_version
+            if server_version:
+                if "16.2.2" in server_version:
+                    update_connect_job(job, f'Frida server {server_version} detected (compatible)')
+                else:
+                    update_connect_job(job, f'Warning: Frida server {server_version} detected. This app is designed for version 16.2.2')
+            else:
+                update_connect_job(job, 'Warning: Could not determine Frida server version')
+        except Exception as e:
+            # Just log it, don't block the connection
+            update_connect_job(job, f'Could not verify Frida server version: {str(e)}')
+
+        # Connect to the device
+        device = run_blocking(frida.get_device, device_id)
+        connected_devices[device_id] = device
+        if device_workers:
+            # The device's sessions will live in its worker process
+            device_workers.call(device_id, 'attach_device', server_version=frida_server_versions.get(device_id))
+
+        # Initialize the nested dictionaries for this device
+        frida_sessions.setdefault(device_id, {})
+        running_scripts.setdefault(device_id, {})
+        device_status[device_id] = {'status': 'connected', 'last_connected': time.time(), 'root_method': root_method}
+
+
+        device_monitor.frida_server[device_id] = True
+        update_connect_job(job, f'Connected to {device_id}', state='connected', finishedAt=time.time())
+        device_monitor.notify(device_id)
+    except Exception as e:
+        logger.error(f"[Device: {device_id}] Connect job {job['jobId']} failed: {str(e)}")
+        update_connect_job(job, f'Error: {str(e)}', state='failed', error=str(e), finishedAt=time.time())
+    finally:
+        if scheduled:
+            device_scheduler.release(scheduled)
+        job['done'].set()
+
+def start_connect_job(device_id):
+    """Start bringing a device up in the background, reusing a job already in flight"""
+    with connect_jobs_lock:
+        for job in connect_jobs.values():
+            if job['deviceId'] == device_id and job['state'] in ('pending', 'running'):
+                return job
+
+        # Keep a bounded history of finished jobs
+        finished = [j for j in connect_jobs.values() if j['state'] in ('connected', 'failed')]
+        for old_job in sorted(finished, key=lambda j: j['startedAt'])[:max(len(connect_jobs) - CONNECT_JOB_HISTORY, 0)]:
+            del connect_jobs[old_job['jobId']]
+
+        job = {
+            'jobId': uuid.uuid4().hex,
+            'deviceId': device_id,
+            'state': 'pending',
+            'rootMethod': None,
+            'error': None,
+            'steps': [],
+            'startedAt': time.time(),
+            'finishedAt': None,
+            'done': threading.Event()
+        }
+        connect_jobs[job['jobId']] = job
+
+    socketio.start_background_task(run_connect_job, job)
+    return job
+
+def connect_job_json(job):
+    with connect_jobs_lock:
+        return {key: (list(value) if key == 'steps' else value) for key, value in job.items() if key != 'done'}
+
+@app.route('/api/connect', methods=['POST'])
+def connect_device():
+    data = request.json
+    device_id = data.get('deviceId')
+    
+    if not device_id:
+        return jsonify({'error': 'Device ID is required'}), 400
+    
+    try:
+        job = start_connect_job(device_id)
+        
+        # Callers that can't follow the job may still block until it finishes
+        if data.get('wait'):
+            job['done'].wait()
+            if job['state'] == 'connected':
+                return jsonify({'status': 'connected', 'deviceId': device_id, 'jobId': job['jobId']})
+            return jsonify({'error': job['error'], 'jobId': job['jobId']}), 500
+        
+        return jsonify({'status': job['state'], 'deviceId': device_id, 'jobId': job['jobId']}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/connect/<job_id>', methods=['GET'])
+def get_connect_job(job_id):
+    job = connect_jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Connect job not found'}), 404
+    return jsonify(connect_job_json(job))
+
+def release_device_sessions(device_id):
+    """Detach all sessions and unload all scripts on a device, flushing their output"""
+    # Stop re-attaching to anything on this device
+    session_supervisor.forget(device_id)
+    
+    # Clean up all frida sessions for this device
+    if device_id in frida_sessions:
+        for app_id, session in list(frida_sessions[device_id].items()):
+            try:
+                run_blocking(session.detach)
+            except Exception as e:
+                subscriptions.publish('status', {'message': f'[Device: {device_id}] Error detaching session for {app_id}: {str(e)}'}, device_id)
+        del frida_sessions[device_id]
+    
+    # Clean up all running scripts for this device
+    if device_id in running_scripts:
+        for app_id, script in list(running_scripts[device_id].items()):
+            try:
+                run_blocking(script.unload)
+            except Exception as e:
+                subscriptions.publish('status', {'message': f'[Device: {device_id}] Error unloading script for {app_id}: {str(e)}'}, device_id)
+        del running_scripts[device_id]
+    
+    session_pids.pop(device_id, None)
+    
+    # Flush and drop the message pipelines for this device
+    close_device_pipelines(device_id)
+    close_device_trace_recorders(device_id)
+
+@app.route('/api/disconnect', methods=['POST'])
+@device_operation('write')
+def disconnect_device():
+    data = request.json
+    device_id = data.get('deviceId')
+    
+    if not device_id:
+        return jsonify({'error': 'Device ID is required'}), 400
+    
+    try:
+        # Stop streamed shell commands, logcat and spawn gating on the device
+        kill_device_exec_streams(device_id)
+        stop_logcat_reader(device_id)
+        disable_spawn_gate(device_id)
+        
+        # Detach every session, in the device's worker process too
+        if device_workers:
+            device_workers.release(device_id)
+        release_device_sessions(device_id)
+        
+        # Remove the device from connected_devices
+        if device_id in connected_devices:
+            del connected_devices[device_id]
+        
+        # Close pooled adb connections for the device
+        if adb_client:
+            adb_client.drop(device_id)
+        
+        # Forget the cached application list and process table
+        with app_indexes_lock:
+            app_indexes.pop(device_id, None)
+        with process_indexes_lock:
+            process_indexes.pop(device_id, None)
+        
+        # Clean up any device status
+        if device_id in device_status:
+            del device_status[device_id]
+        
+        device_monitor.notify(device_id)
+        subscriptions.publish('status', {'message': f'Disconnected from {device_id}'}, device_id)
+        return jsonify({'status': 'disconnected', 'deviceId': device_id})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/devices/restart-adb', methods=['POST'])
+def restart_adb_server():
+    try:
+        # Kill the ADB server
+        socketio.emit('status', {'message': 'Restarting ADB server...'})
+        with metrics.timer('trishul_adb_command_seconds', operation='kill-server', transport='subprocess'):
+            kill_result = subprocess.run([ADB_PATH, 'kill-server'], capture_output=True, text=True)
+        
+        # Wait briefly
+        time.sleep(1)
+        
+        # Start the ADB server
+        with metrics.timer('trishul_adb_command_seconds', operation='start-server', transport='subprocess'):
+            start_result = subprocess.run([ADB_PATH, 'start-server'], capture_output=True, text=True)
+        
+        # Give it a moment to detect devices
+        time.sleep(2)
+        
+        # Pooled connections died with the old server
+        if adb_client:
+            adb_client.drop()
+        
+        # Check for devices
+        devices_result = subprocess.run([ADB_PATH, 'devices'], capture_output=True, text=True)
+        devices = devices_result.stdout.strip().split('\n')[1:]
+        device_count = sum(1 for line in devices if line.strip())
+        
+        socketio.emit('status', {
+            'message': f'ADB server restarted. {device_count} device(s) detected.'
+        })
+        
+        return jsonify({
+            'success': True,
+            'message': f'ADB server restarted. {device_count} device(s) detected.',
+            'details': {
+                'kill_output': kill_result.stdout if kill_result.stdout else kill_result.stderr,
+                'start_output': start_result.stdout if start_result.stdout else start_result.stderr,
+                'devices': devices_result.stdout
+            }
+        })
+    except Exception as e:
+        error_message = f'Error restarting ADB server: {str(e)}'
+        socketio.emit('status', {'message': error_message, 'type': 'error'})
+        return jsonify({'success': False, 'message': error_message}), 500
+
+@app.route('/api/apps', methods=['GET'])
+@device_operation('read')
+def get_apps():
+    device_id = request.args.get('deviceId')
+    
+    if not device_id:
+        return jsonify({'error': 'Device ID is required'}), 400
+    
+    if device_id not in connected_devices:
+        return jsonify({'error': 'Device not connected'}), 400
+    
+    try:
+        index = get_app_index(device_id, refresh=request.args.get('refresh') == 'true')
+        return jsonify(index.list())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/processes', methods=['GET'])
+@device_operation('read')
+def get_processes():
+    """Processes on a device from the cached table; package= also returns its ':service' processes"""
+    device_id = request.args.get('deviceId')
+    
+    if not device_id:
+        return jsonify({'error': 'Device ID is required'}), 400
+    
+    if device_id not in connected_devices:
+        return jsonify({'error': 'Device not connected'}), 400
+    
+    try:
+        index = get_process_index(device_id, refresh=request.args.get('refresh') == 'true')
+        package = request.args.get('package')
+        if package:
+            return jsonify([{'pid': pid, 'name': name} for name, pid in index.package_processes(package)])
+        return jsonify(index.list())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/apps/refresh', methods=['POST'])
+@device_operation('read')
+def refresh_apps():
+    data = request.json or {}
+    device_id = data.get('deviceId')
+    
+    if not device_id:
+        return jsonify({'error': 'Device ID is required'}), 400
+    
+    if device_id not in connected_devices:
+        return jsonify({'error': 'Device not connected'}), 400
+    
+    try:
+        with app_indexes_lock:
+            index = app_indexes.setdefault(device_id, AppIndex(device_id))
+        changes = index.refresh(connected_devices[device_id], force=True)
+        return jsonify({'deviceId': device_id, **changes})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+class ScriptCache:
+    """Content-addressed cache of compiled agent bytecode
+
+    Keys hash the Frida version, the device's frida-server version, the runtime and the
+    full source (console prelude plus user script). Bytecode lives in an LRU bounded by SCRIPT_CACHE_MAX_BYTES and is
+    mirrored to SCRIPT_CACHE_DIR so it survives restarts.
+    """
+
+    def __init__(self, max_bytes=None, directory=None):
+        self.max_bytes = SCRIPT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.directory = directory or SCRIPT_CACHE_DIR
+        self.entries = collections.OrderedDict()  # key -> bytecode, least recently used first
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.compile_errors = 0
+        self.load_errors = 0
+
+    def key(self, source, runtime=None, server_version=None):
+        digest = hashlib.sha256()
+        digest.update(f'{frida.__version__}\0{server_version or ""}\0{runtime or SCRIPT_RUNTIME}\0'.encode())
+        digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.bin')
+
+    def _remember(self, key, bytecode):
+        """Insert into the in-memory LRU, evicting as needed; caller holds the lock"""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return
+        self.entries[key] = bytecode
+        self.size += len(bytecode)
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def get(self, key):
+        with self.lock:
+            bytecode = self.entries.get(key)
+            if bytecode is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return bytecode
+
+        try:
+            with open(self._path(key), 'rb') as f:
+                bytecode = f.read()
+        except OSError:
+            return None
+
+        with self.lock:
+            self._remember(key, bytecode)
+            self.disk_hits += 1
+        return bytecode
+
+    def discard(self, key):
+        """Drop an entry the device refused to load, from memory and disk"""
+        with self.lock:
+            bytecode = self.entries.pop(key, None)
+            if bytecode is not None:
+                self.size -= len(bytecode)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def put(self, key, bytecode):
+        with self.lock:
+            self._remember(key, bytecode)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f'{self._path(key)}.{uuid.uuid4().hex}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(bytecode)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not write compiled script to disk cache: {str(e)}")
+
+    def create_script(self, session, source, runtime=None, server_version=None):
+        """Create a script from cached bytecode, compiling it on a miss
+
+        Returns (script, key). Falls back to creating the script from source if the
+        session can't compile it, e.g. for runtimes without bytecode support, or
+        refuses the cached bytecode, in which case the entry is evicted.
+        """
+        runtime = runtime or SCRIPT_RUNTIME
+        key = self.key(source, runtime, server_version)
+        started = time.perf_counter()
+        bytecode = self.get(key)
+        outcome = 'hit'
+
+        if bytecode is None:
+            with self.lock:
+                self.misses += 1
+            try:
+                bytecode = run_blocking(session.compile_script, source, runtime=runtime)
+            except Exception as e:
+                with self.lock:
+                    self.compile_errors += 1
+                logger.warning(f"Could not compile script to bytecode, loading from source: {str(e)}")
+                script = run_blocking(session.create_script, source, runtime=runtime)
+                metrics.observe('trishul_script_create_seconds', time.perf_counter() - started, cache='source')
+                return script, key
+            self.put(key, bytecode)
+            outcome = 'miss'
+
+        try:
+            script = run_blocking(session.create_script_from_bytes, bytecode, runtime=runtime)
+        except Exception as e:
+            with self.lock:
+                self.load_errors += 1
+            self.discard(key)
+            logger.warning(f"Could not load cached bytecode, loading from source: {str(e)}")
+            script = run_blocking(session.create_script, source, runtime=runtime)
+            outcome = 'source'
+        metrics.observe('trishul_script_create_seconds', time.perf_counter() - started, cache=outcome)
+        return script, key
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+        try:
+            for filename in os.listdir(self.directory):
+                if filename.endswith('.bin'):
+                    os.remove(os.path.join(self.directory, filename))
+        except OSError:
+            pass
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'diskHits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'compileErrors': self.compile_errors,
+                'loadErrors': self.load_errors,
+                'hitRate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'runtime': SCRIPT_RUNTIME
+            }
+
+script_cache = ScriptCache()
+
+def make_message_handler(device_id, app_id):
+    """Build the script message callback for a hooked app
+
+    The callback runs on Frida's thread, so it only queues events for the flusher.
+    """
+    def on_message(message, data):
+        metrics.inc('trishul_frida_messages_total', device=device_id, type=message.get('type'))
+        recorder = trace_recorders.get(device_id, {}).get(app_id)
+        if recorder:
+            recorder.record(message, data)
+        
+        pipeline = message_pipelines.get(device_id, {}).get(app_id)
+        if not pipeline:
+            return
+
+        if message['type'] == 'send':
+            payload = message['payload']
+            
+            # Check if this is a batch of console records from the batching prelude
+            if isinstance(payload, dict) and payload.get('type') == 'console.batch':
+                timestamp = time.time()
+                for record in payload.get('records', []):
+                    log_type = record.get('level', 'log')
+                    message_text = format_console_args(record.get('args', []))
+                    log_index.add(device_id, app_id, 'console', log_type, message_text, timestamp)
+                    pipeline.put({
+                        'type': 'frida_console',
                         'logType': log_type,
-                        'message': message_text
+                        'message': message_text,
+                        'timestamp': timestamp
                     })
+            # Check if this is a console log message
+            elif isinstance(payload, dict) and 'type' in payload and payload['type'].startswith('console.'):
+                # Special handling for console messages
+                log_type = payload['type'].split('.')[1]  # 'log', 'error', etc.
+                if 'message' in payload:
+                    message_text = payload['message']
                 else:
-                    # Regular Frida message
-                    socketio.emit('frida_message', {
-                        'deviceId': device_id,
-                        'appId': app_id,
-                        'payload': payload
-                    })
-            elif message['type'] == 'error':
-                socketio.emit('frida_error', {
-                    'deviceId': device_id,
-                    'appId': app_id,
-                    'error': message['description']
-                })
+                    message_text = format_console_args(payload.get('args', []))
+                event = {
+                    'type': 'frida_console',
+                    'logType': log_type,
+                    'message': message_text,
+                    'timestamp': time.time()
+                }
+                log_index.add(device_id, app_id, 'console', log_type, message_text, event['timestamp'])
+                if data is not None:
+                    # Binary payloads are forwarded as raw Socket.IO attachments
+                    event['data'] = data
+                pipeline.put(event)
+            else:
+                # Regular Frida message
+                event = {
+                    'type': 'frida_message',
+                    'payload': payload,
+                    'timestamp': time.time()
+                }
+                log_index.add(device_id, app_id, 'frida', None, payload, event['timestamp'])
+                if data is not None:
+                    event['data'] = data
+                pipeline.put(event)
+        elif message['type'] == 'error':
+            timestamp = time.time()
+            log_index.add(device_id, app_id, 'error', None, message.get('stack') or message['description'], timestamp)
+            pipeline.put({
+                'type': 'frida_error',
+                'error': message['description'],
+                'timestamp': timestamp
+            })
+    
+    return on_message
+
+class HookError(Exception):
+    """A hook attempt failed; carries the HTTP status and any package suggestions"""
+
+    def __init__(self, message, status=500, suggestions=None):
+        super().__init__(message)
+        self.status = status
+        self.suggestions = suggestions
+
+def load_agent(device_id, app_id, session, script_content, agent_batching=None, pid=None):
+    """Load a script into an attached session and start delivering its messages"""
+    # Combine the console wrapper with the original script
+    agent_batching = parse_flag(agent_batching, AGENT_BATCHING)
+    enhanced_script = build_console_wrapper(agent_batching) + script_content
+    
+    frida_sessions.setdefault(device_id, {})[app_id] = session
+    session.on('detached', from_native_thread(functools.partial(session_supervisor.on_detached, device_id, app_id, session)))
+    open_message_pipeline(device_id, app_id)
+    open_trace_recorder(device_id, app_id)
+    log_index.start()
+    try:
+        script, _ = script_cache.create_script(session, enhanced_script, server_version=frida_server_versions.get(device_id))
+        script.on('message', from_native_thread(make_message_handler(device_id, app_id)))
+        with metrics.timer('trishul_script_load_seconds', device=device_id):
+            run_blocking(script.load)
+    except Exception:
+        # Leave nothing behind for the supervisor to "recover"
+        if frida_sessions.get(device_id, {}).get(app_id) is session:
+            frida_sessions[device_id].pop(app_id)
+        close_message_pipeline(device_id, app_id)
+        close_trace_recorder(device_id, app_id)
+        try:
+            run_blocking(session.detach)
+        except Exception as e:
+            logger.debug(f"[Device: {device_id}] Error detaching {app_id} after a failed load: {str(e)}")
+        raise
+    
+    # Store the script
+    running_scripts.setdefault(device_id, {})[app_id] = script
+    if pid:
+        session_pids.setdefault(device_id, {})[app_id] = pid
+    
+    device_monitor.notify(device_id)
+    return script
+
+def attach_process(device_id, device, target):
+    """Attach to a pid or process name, timing it for /metrics"""
+    with metrics.timer('trishul_frida_attach_seconds', device=device_id):
+        return run_blocking(device.attach, target)
+
+def wait_for_pid(device_id, app_id, timeout=None):
+    """Poll pidof with a short backoff until the app has a process or the timeout passes"""
+    deadline = time.monotonic() + (timeout or APP_START_TIMEOUT)
+    delay = 0.05
+    while True:
+        result = adb_shell(device_id, f'pidof {app_id}', timeout=ADB_PROBE_TIMEOUT)
+        if result.stdout.strip() or time.monotonic() >= deadline:
+            return result
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+def perform_hook(device_id, app_id, script_content, agent_batching=None):
+    """Resolve, spawn or attach to an app and load a script into it
+
+    Returns the package name with its correct case, or raises HookError.
+    """
+    if device_workers:
+        app_id = device_workers.call(device_id, 'hook', app_id=app_id, script_content=script_content, agent_batching=agent_batching)
+        session_supervisor.record(device_id, app_id, script_content, agent_batching)
+        return app_id
+    
+    if device_id not in connected_devices:
+        raise HookError('Device not connected', 400)
+    
+    device = connected_devices[device_id]
+    
+    # Verify the package name and get the correct case if needed
+    correct_app_id, result = verify_package_name(device_id, app_id)
+    
+    if not correct_app_id:
+        if isinstance(result, list):
+            # We found similar package names
+            suggestions = [f"{app['name']} ({app['identifier']})" for app in result[:5]]
+            raise HookError(f"Could not find exact package name '{app_id}'. Did you mean one of these?", 400, suggestions)
+        else:
+            # No package found with that name
+            raise HookError(f"Package verification failed: {result}", 400)
+    
+    # Use the correct case for the app_id
+    app_id = correct_app_id
+    
+    # Check if the application is running
+    is_running = False
+    session_pid = None
+    processes = None
+    try:
+        # Look the process up in the cached process table
+        processes = get_process_index(device_id)
+        pids = processes.pids(app_id)
+        if pids:
+            is_running = True
+            session_pid = pids[0]
+    except Exception as e:
+        subscriptions.publish('status', {'message': f'[Device: {device_id}] Error checking if app is running: {str(e)}'}, device_id)
+    
+    # The cached table misses apps started since it was read, and spawning those would restart them
+    if not is_running:
+        try:
+            running_pids = adb_shell(device_id, f'pidof {app_id}', timeout=ADB_PROBE_TIMEOUT).stdout.split()
+            if running_pids:
+                is_running = True
+                session_pid = int(running_pids[0])
+                if processes:
+                    processes.add(session_pid, app_id)
+        except (subprocess.SubprocessError, OSError, ValueError) as e:
+            logger.debug(f"[Device: {device_id}] pidof {app_id} failed: {str(e)}")
+    
+    # If not running, try to spawn it
+    pid = None
+    if not is_running:
+        try:
+            subscriptions.publish('status', {'message': f'[Device: {device_id}] App {app_id} is not running. Attempting to launch it...'}, device_id)
+            # The spawned process stays suspended until the script is loaded
+            with metrics.timer('trishul_frida_spawn_seconds', device=device_id):
+                pid = run_blocking(device.spawn, [app_id])
+            if processes:
+                processes.add(pid, app_id)
+            subscriptions.publish('status', {'message': f'[Device: {device_id}] App launched with PID: {pid}'}, device_id)
+        except Exception as e:
+            subscriptions.publish('status', {'message': f'[Device: {device_id}] Failed to launch app: {str(e)}'}, device_id)
+            # Even if spawn fails, we'll still try to attach directly
+    
+    # Initialize nested dictionaries if they don't exist (batch hooks may race here)
+    frida_sessions.setdefault(device_id, {})
+    running_scripts.setdefault(device_id, {})
+    
+    # Detach existing session if there's one for this app
+    if app_id in frida_sessions[device_id]:
+        try:
+            run_blocking(frida_sessions[device_id][app_id].detach)
+        except Exception as e:
+            subscriptions.publish('status', {'message': f'[Device: {device_id}] Error detaching previous session: {str(e)}'}, device_id)
+    
+    # Unload existing script if there's one for this app
+    if app_id in running_scripts[device_id]:
+        try:
+            run_blocking(running_scripts[device_id][app_id].unload)
+        except Exception as e:
+            subscriptions.publish('status', {'message': f'[Device: {device_id}] Error unloading previous script: {str(e)}'}, device_id)
+    
+    # Attach to the process
+    try:
+        if pid:
+            # If we spawned it, attach to the PID
+            session = attach_process(device_id, device, pid)
+            session_pid = pid
+        elif session_pid:
+            # Already running: attach by pid so Frida needn't resolve the name again
+            session = attach_process(device_id, device, session_pid)
+        else:
+            # Try to attach by name if we didn't spawn it
+            session = attach_process(device_id, device, app_id)
         
-        # Check if the application is running
-        is_running = False
+        frida_sessions[device_id][app_id] = session
+    except Exception as e:
+        error_msg = str(e)
+        if "unable to find process" in error_msg:
+            # The cached table was out of date; diff in a fresh one and retry by PID
+            found = False
+            processes = get_process_index(device_id, refresh=True)
+            if processes is None:
+                raise HookError('Device not connected', 400)
+            
+            # First try exact match on process name
+            pids = processes.pids(app_id)
+            if pids:
+                subscriptions.publish('status', {'message': f'[Device: {device_id}] Found process: {app_id} (PID: {pids[0]})'}, device_id)
+                session = attach_process(device_id, device, pids[0])
+                frida_sessions[device_id][app_id] = session
+                session_pid = pids[0]
+                found = True
+            
+            # If not found, try partial match
+            if not found:
+                match = processes.find_partial(app_id)
+                if match:
+                    name, match_pid = match
+                    subscriptions.publish('status', {'message': f'[Device: {device_id}] Found similar process: {name} (PID: {match_pid})'}, device_id)
+                    session = attach_process(device_id, device, match_pid)
+                    frida_sessions[device_id][app_id] = session
+                    session_pid = match_pid
+                    found = True
+            
+            # If still not found, run an adb shell command to try to start the app and get its PID
+            if not found:
+                try:
+                    subscriptions.publish('status', {'message': f'[Device: {device_id}] Trying to start app via activity manager...'}, device_id)
+                    # Try to start the app using activity manager
+                    cmd = f'monkey -p {app_id} -c android.intent.category.LAUNCHER 1'
+                    adb_result = adb_shell(device_id, cmd, timeout=ADB_PROBE_TIMEOUT)
+                    
+                    # Get the PID as soon as the app is up
+                    pid_result = wait_for_pid(device_id, app_id)
+                    
+                    if pid_result.stdout.strip():
+                        try:
+                            app_pid = int(pid_result.stdout.split()[0])
+                            processes.add(app_pid, app_id)
+                            subscriptions.publish('status', {'message': f'[Device: {device_id}] App started with PID: {app_pid}'}, device_id)
+                            session = attach_process(device_id, device, app_pid)
+                            frida_sessions[device_id][app_id] = session
+                            session_pid = app_pid
+                            found = True
+                        except ValueError:
+                            subscriptions.publish('status', {'message': f'[Device: {device_id}] Invalid PID: {pid_result.stdout.strip()}'}, device_id)
+                except Exception as start_error:
+                    subscriptions.publish('status', {'message': f'[Device: {device_id}] Error trying to start app: {str(start_error)}'}, device_id)
+            
+            if not found:
+                raise HookError(f"Could not find process with name '{app_id}' on device '{device_id}'. Make sure the app is installed and the package name is correct. Try launching the app manually first.")
+        else:
+            raise HookError(f"[Device: {device_id}] {error_msg}")
+    
+    # Load the script before a spawned app runs its first instruction
+    try:
+        load_agent(device_id, app_id, frida_sessions[device_id][app_id], script_content, agent_batching, session_pid)
+    finally:
+        if pid:
+            run_blocking(device.resume, pid)
+    
+    session_supervisor.record(device_id, app_id, script_content, agent_batching)
+    subscriptions.publish('status', {'message': f'[Device: {device_id}] Successfully hooked into {app_id}'}, device_id)
+    return app_id
+
+def hook_error_json(error):
+    response = {'error': str(error)}
+    if error.suggestions:
+        response['suggestions'] = error.suggestions
+    return response
+
+@app.route('/api/hook', methods=['POST'])
+@device_operation('write')
+def hook_app():
+    data = request.json
+    device_id = data.get('deviceId')
+    app_id = data.get('appId')
+    script_content = data.get('script')
+    
+    if not all([device_id, app_id, script_content]):
+        return jsonify({'error': 'Device ID, App ID, and script are required'}), 400
+    
+    if device_id not in connected_devices:
+        return jsonify({'error': 'Device not connected'}), 400
+    
+    try:
+        perform_hook(device_id, app_id, script_content, data.get('agentBatching'))
+        return jsonify({'status': 'success'})
+    except HookError as e:
+        return jsonify(hook_error_json(e)), e.status
+    except Exception as e:
+        return jsonify({'error': f"[Device: {device_id}] {str(e)}"}), 500
+
+def hook_batch_targets(data):
+    """Expand a batch request into (device_id, app_id, script) targets
+
+    Raises HookError (400) for malformed targets or more than HOOK_BATCH_MAX_TARGETS of them.
+    """
+    default_script = data.get('script')
+    explicit = data.get('targets') or []
+    device_ids = data.get('deviceIds') or []
+    app_ids = data.get('appIds') or []
+    if not all(isinstance(value, list) for value in (explicit, device_ids, app_ids)):
+        raise HookError('targets, deviceIds and appIds must be lists', 400)
+    if len(explicit) + len(device_ids) * len(app_ids) > HOOK_BATCH_MAX_TARGETS:
+        raise HookError(f'At most {HOOK_BATCH_MAX_TARGETS} targets per batch', 400)
+    if not all(isinstance(value, str) for value in device_ids + app_ids):
+        raise HookError('deviceIds and appIds must be lists of strings', 400)
+    targets = []
+    
+    # Explicit list of targets, each may carry its own script
+    for target in explicit:
+        if not (isinstance(target, dict) and isinstance(target.get('deviceId'), str)
+                and isinstance(target.get('appId'), str)):
+            raise HookError('Each target must be an object with string deviceId and appId', 400)
+        targets.append((target['deviceId'], target['appId'], target.get('script') or default_script))
+    
+    # Matrix form: every app on every device
+    for device_id in device_ids:
+        for app_id in app_ids:
+            targets.append((device_id, app_id, default_script))
+    
+    return targets
+
+def run_hook_target(device_id, app_id, script_content, agent_batching, device_slots, device_leases):
+    """Hook one batch target, holding a per-device slot so one phone isn't flooded
+
+    The batch's hooks on a device share one scheduler write slot (device_leases), so up
+    to perDeviceLimit of them run at once however many DEVICE_WRITE_SLOTS there are.
+    """
+    result = {'deviceId': device_id, 'appId': app_id}
+    started = time.monotonic()
+    
+    with device_slots[device_id]:
+        waited = time.monotonic() - started
         try:
-            # Try to get the process by name
-            processes = device.enumerate_processes()
-            for process in processes:
-                if process.name == app_id:
-                    is_running = True
-                    break
+            if not all([device_id, app_id, script_content]):
+                raise HookError('Device ID, App ID, and script are required', 400)
+            with device_leases[device_id].hold():
+                result['resolvedAppId'] = perform_hook(device_id, app_id, script_content, agent_batching)
+            result['status'] = 'success'
+        except HookError as e:
+            result.update(hook_error_json(e), status='error')
+        except DeviceBusyError as e:
+            result.update(status='error', error=str(e))
         except Exception as e:
-            socketio.emit('status', {'message': f'[Device: {device_id}] Error checking if app is running: {str(e)}'})
-        
-        # If not running, try to spawn it
-        pid = None
-        if not is_running:
+            result.update(status='error', error=f"[Device: {device_id}] {str(e)}")
+    
+    result['waitMs'] = int(waited * 1000)
+    result['durationMs'] = int((time.monotonic() - started) * 1000)
+    return result
+
+@app.route('/api/hook/batch', methods=['POST'])
+def hook_batch():
+    data = request.json or {}
+    try:
+        targets = hook_batch_targets(data)
+    except HookError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    if not targets:
+        return jsonify({'error': 'At least one target is required (targets, or deviceIds and appIds)'}), 400
+    
+    try:
+        workers = max(1, min(int(data.get('maxWorkers', HOOK_BATCH_WORKERS)), HOOK_BATCH_WORKERS))
+        per_device = max(1, int(data.get('perDeviceLimit', HOOK_BATCH_PER_DEVICE)))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'maxWorkers and perDeviceLimit must be integers'}), 400
+    
+    batch_id = uuid.uuid4().hex
+    device_slots = collections.defaultdict(lambda: threading.BoundedSemaphore(per_device))
+    device_leases = {}
+    for device_id, _, _ in targets:
+        device_slots[device_id]  # Create every semaphore up front, outside the workers
+        device_leases[device_id] = SharedSlot(device_scheduler, device_id, 'write', f'hook batch {batch_id}')
+    
+    socketio.emit('status', {'message': f'Hooking {len(targets)} target(s) in batch {batch_id}'})
+    started = time.monotonic()
+    results = [None] * len(targets)
+    completed = 0
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hook-batch') as executor:
+        futures = {
+            executor.submit(run_hook_target, device_id, app_id, script_content,
+                            data.get('agentBatching'), device_slots, device_leases): index
+            for index, (device_id, app_id, script_content) in enumerate(targets)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            completed += 1
+            # Per-target progress goes to the target device's watchers; start and finish stay broadcast
+            subscriptions.publish('hook_batch_progress', {
+                'batchId': batch_id,
+                'completed': completed,
+                'total': len(targets),
+                'result': results[index]
+            }, results[index]['deviceId'])
+    
+    succeeded = sum(1 for result in results if result['status'] == 'success')
+    durations = sorted(result['durationMs'] for result in results)
+    report = {
+        'batchId': batch_id,
+        'total': len(targets),
+        'succeeded': succeeded,
+        'failed': len(targets) - succeeded,
+        'durationMs': int((time.monotonic() - started) * 1000),
+        'slowestMs': durations[-1],
+        'medianMs': durations[len(durations) // 2],
+        'results': results
+    }
+    
+    socketio.emit('status', {'message': f'Batch {batch_id} finished: {succeeded}/{len(targets)} hooked in {report["durationMs"]} ms'})
+    return jsonify(report)
+
+class SpawnGate:
+    """Spawn gating on one device: registered apps get their script before their first instruction
+
+    Every new process is held suspended by Frida. Processes of a registered package
+    (including its ':service' processes and, with child gating, processes it forks)
+    are attached and injected before being resumed; everything else is resumed at once.
+    """
+
+    def __init__(self, device_id, device):
+        self.device_id = device_id
+        self.device = device
+        self.rules = {}        # app_id -> {'script', 'agentBatching', 'children', 'createdAt'}
+        self.gated_pids = {}   # pid -> app_id of processes injected through this gate
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.stats = {'spawns': 0, 'hooked': 0, 'failed': 0, 'lastLatencyMs': None}
+        self.on_spawn_added = from_native_thread(self._spawn_added)
+        self.on_child_added = from_native_thread(self._child_added)
+
+    def add_rule(self, app_id, script_content, agent_batching=None, children=False):
+        with self.lock:
+            self.rules[app_id] = {
+                'script': script_content,
+                'agentBatching': agent_batching,
+                'children': bool(children),
+                'createdAt': time.time()
+            }
+            if self.enabled:
+                return
+            self.enabled = True
+
+        self.device.on('spawn-added', self.on_spawn_added)
+        self.device.on('child-added', self.on_child_added)
+        run_blocking(self.device.enable_spawn_gating)
+        # Processes that were already waiting would otherwise stay suspended
+        for spawn in run_blocking(self.device.enumerate_pending_spawn):
+            self._spawn_added(spawn)
+
+    def remove_rule(self, app_id):
+        with self.lock:
+            removed = self.rules.pop(app_id, None) is not None
+            empty = not self.rules
+        if empty:
+            self.disable()
+        return removed
+
+    def disable(self):
+        with self.lock:
+            if not self.enabled:
+                return
+            self.enabled = False
+        try:
+            run_blocking(self.device.disable_spawn_gating)
+        finally:
+            self.device.off('spawn-added', self.on_spawn_added)
+            self.device.off('child-added', self.on_child_added)
+
+    def match(self, identifier):
+        """Registered package for a process name, e.g. com.app for com.app:remote"""
+        with self.lock:
+            if identifier in self.rules:
+                return identifier
+            package = (identifier or '').split(':', 1)[0]
+            return package if package in self.rules else None
+
+    def _spawn_added(self, spawn):
+        # Attaching from inside a Frida signal callback can deadlock, so hand off
+        spawn_executor.submit(self._inject, spawn.pid, spawn.identifier, None, time.monotonic())
+
+    def _child_added(self, child):
+        spawn_executor.submit(self._inject, child.pid, child.identifier, child.parent_pid, time.monotonic())
+
+    def _inject(self, pid, identifier, parent_pid, started):
+        if parent_pid is None:
+            self.stats['spawns'] += 1
+            app_id = self.match(identifier)
+        else:
+            app_id = self.gated_pids.get(parent_pid)
+        rule = self.rules.get(app_id) if app_id else None
+
+        try:
+            if rule:
+                # Main and ':service' processes are keyed by name, forks also by pid
+                key = identifier if parent_pid is None else f'{identifier or app_id}/{pid}'
+                processes = process_indexes.get(self.device_id)
+                if processes and identifier:
+                    processes.add(pid, identifier)
+                session = attach_process(self.device_id, self.device, pid)
+                if rule['children']:
+                    run_blocking(session.enable_child_gating)
+                load_agent(self.device_id, key, session, rule['script'], rule['agentBatching'], pid)
+                self.gated_pids[pid] = app_id
+
+                latency_ms = int((time.monotonic() - started) * 1000)
+                self.stats['hooked'] += 1
+                self.stats['lastLatencyMs'] = latency_ms
+                subscriptions.publish('spawn_hooked', {
+                    'deviceId': self.device_id,
+                    'appId': key,
+                    'pid': pid,
+                    'parentPid': parent_pid,
+                    'latencyMs': latency_ms
+                }, self.device_id, key)
+                subscriptions.publish('status', {'message': f'[Device: {self.device_id}] Hooked {key} (PID: {pid}) at spawn in {latency_ms} ms'}, self.device_id)
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.error(f"[Device: {self.device_id}] Spawn gating failed for {identifier} ({pid}): {str(e)}")
+            subscriptions.publish('status', {'message': f'[Device: {self.device_id}] Error hooking {identifier} at spawn: {str(e)}'}, self.device_id)
+        finally:
             try:
-                socketio.emit('status', {'message': f'[Device: {device_id}] App {app_id} is not running. Attempting to launch it...'})
-                pid = device.spawn([app_id])
-                socketio.emit('status', {'message': f'[Device: {device_id}] App launched with PID: {pid}'})
-                time.sleep(1)  # Give it a moment to start up
+                run_blocking(self.device.resume, pid)
             except Exception as e:
-                socketio.emit('status', {'message': f'[Device: {device_id}] Failed to launch app: {str(e)}'})
-                # Even if spawn fails, we'll still try to attach directly
-        
-        # Initialize nested dictionaries if they don't exist
-        if device_id not in frida_sessions:
-            frida_sessions[device_id] = {}
-            
-        if device_id not in running_scripts:
-            running_scripts[device_id] = {}
-            
-        # Detach existing session if there's one for this app
-        if app_id in frida_sessions[device_id]:
+                logger.warning(f"[Device: {self.device_id}] Could not resume {identifier} ({pid}): {str(e)}")
+
+    def to_json(self):
+        with self.lock:
+            rules = [
+                {'appId': app_id, 'children': rule['children'], 'createdAt': rule['createdAt']}
+                for app_id, rule in self.rules.items()
+            ]
+        return {'deviceId': self.device_id, 'enabled': self.enabled, 'rules': rules, **self.stats}
+
+spawn_gates = {}  # device_id -> SpawnGate
+spawn_gates_lock = threading.Lock()
+spawn_executor = ThreadPoolExecutor(max_workers=SPAWN_GATING_WORKERS, thread_name_prefix='spawn-gate')
+
+def disable_spawn_gate(device_id):
+    with spawn_gates_lock:
+        gate = spawn_gates.pop(device_id, None)
+    if gate:
+        try:
+            gate.disable()
+        except Exception as e:
+            logger.warning(f"[Device: {device_id}] Could not disable spawn gating: {str(e)}")
+
+@app.route('/api/spawn-gating', methods=['GET'])
+def get_spawn_gating():
+    return jsonify([gate.to_json() for gate in list(spawn_gates.values())])
+
+@app.route('/api/spawn-gating', methods=['POST'])
+@device_operation('write')
+def add_spawn_gating_rule():
+    """Inject a script into every future launch of a package"""
+    data = request.json or {}
+    device_id = data.get('deviceId')
+    app_id = data.get('appId')
+    script_content = data.get('script')
+    
+    if not all([device_id, app_id, script_content]):
+        return jsonify({'error': 'Device ID, App ID, and script are required'}), 400
+    
+    if device_id not in connected_devices:
+        return jsonify({'error': 'Device not connected'}), 400
+    
+    try:
+        with spawn_gates_lock:
+            gate = spawn_gates.get(device_id)
+            if gate is None:
+                gate = spawn_gates[device_id] = SpawnGate(device_id, connected_devices[device_id])
+        gate.add_rule(app_id, script_content, data.get('agentBatching'), data.get('children', False))
+        subscriptions.publish('status', {'message': f'[Device: {device_id}] Spawn gating armed for {app_id}'}, device_id)
+        return jsonify(gate.to_json())
+    except Exception as e:
+        return jsonify({'error': f'[Device: {device_id}] {str(e)}'}), 500
+
+@app.route('/api/spawn-gating', methods=['DELETE'])
+@device_operation('write')
+def remove_spawn_gating_rule():
+    data = request.json or {}
+    device_id = data.get('deviceId')
+    app_id = data.get('appId')
+    
+    gate = spawn_gates.get(device_id)
+    if not gate or not gate.remove_rule(app_id):
+        return jsonify({'error': 'No spawn gating rule for this app'}), 404
+    
+    if not gate.rules:
+        with spawn_gates_lock:
+            spawn_gates.pop(device_id, None)
+    return jsonify(gate.to_json())
+
+class RpcError(Exception):
+    """An RPC request could not be made; carries the HTTP status"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+rpc_executor = ThreadPoolExecutor(max_workers=RPC_WORKERS, thread_name_prefix='rpc')
+rpc_slots = {}  # (device_id, app_id) -> BoundedSemaphore held by each call until it really finishes
+rpc_slots_lock = threading.Lock()
+
+def rpc_timeout(value, default):
+    """Seconds to wait for a call; raises RpcError unless value is a positive number"""
+    if value is None or value == '':
+        return default
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        seconds = 0
+    if not 0 < seconds < float('inf'):
+        raise RpcError(f'timeout must be a positive number of seconds, got {value!r}')
+    return seconds
+
+def rpc_script(device_id, app_id):
+    script = running_scripts.get(device_id, {}).get(app_id)
+    if not script:
+        raise RpcError(f'[Device: {device_id}] {app_id} is not hooked', 404)
+    return script
+
+def call_export(script, method, args):
+    # exports_sync maps snake_case names to the agent's camelCase exports
+    return getattr(script.exports_sync, method)(*args)
+
+def run_rpc_calls(device_id, app_id, calls, timeout=None):
+    """Call several exports of one hooked app, all in flight at once
+
+    Each call gets its own timeout (seconds, RPC_TIMEOUT by default). Returns one
+    result per call: {'status': 'ok', 'result': value} or {'status': 'error', 'error': ...};
+    ArrayBuffer returns come back from Frida's data channel as bytes.
+    """
+    if len(calls) > RPC_BATCH_MAX:
+        raise RpcError(f'At most {RPC_BATCH_MAX} calls per batch')
+    timeout = rpc_timeout(timeout, RPC_TIMEOUT)
+    timeouts = [rpc_timeout(call.get('timeout'), timeout) if isinstance(call, dict) else timeout for call in calls]
+    if device_workers and app_id not in running_scripts.get(device_id, {}):
+        # Allow for every call's own timeout before giving up on the worker
+        return device_workers.call(device_id, 'rpc', max(timeouts) + DEVICE_WORKER_TIMEOUT, app_id=app_id, calls=calls, timeout=timeout)
+    script = rpc_script(device_id, app_id)
+    with rpc_slots_lock:
+        slots = rpc_slots.setdefault((device_id, app_id), threading.BoundedSemaphore(RPC_INFLIGHT_PER_APP))
+
+    def timed_call(method, args):
+        return run_blocking(call_export, script, method, args), time.monotonic()
+
+    # Submit everything before waiting so the requests are pipelined over the session
+    started = time.monotonic()
+    pending = []
+    for call, call_timeout in zip(calls, timeouts):
+        if not isinstance(call, dict):
+            pending.append((None, None, 'Each call must be an object'))
+            continue
+        method = call.get('method')
+        args = call.get('args') or []
+        if not method or not isinstance(args, list):
+            pending.append((None, None, 'Each call needs a method and a list of args'))
+            continue
+        # Timed-out calls keep their slot until the agent answers, so a stuck app can't take every worker
+        if not slots.acquire(blocking=False):
+            pending.append((None, None, f'Too many calls in flight for {app_id} ({RPC_INFLIGHT_PER_APP})'))
+            continue
+        future = rpc_executor.submit(timed_call, method, args)
+        future.add_done_callback(lambda _: slots.release())
+        pending.append((future, started + call_timeout, None))
+
+    results = []
+    for (future, deadline, error), call in zip(pending, calls):
+        result = {'method': call.get('method') if isinstance(call, dict) else None}
+        finished = time.monotonic()
+        if error:
+            result.update(status='error', error=error)
+        else:
             try:
-                frida_sessions[device_id][app_id].detach()
+                value, finished = future.result(timeout=max(deadline - time.monotonic(), 0))
+                result.update(status='ok', result=value)
+            except FuturesTimeoutError:
+                still_running = not future.cancel()
+                result.update(status='error', error=f'Timed out after {deadline - started:g}s' + (' (still running)' if still_running else ''))
             except Exception as e:
-                socketio.emit('status', {'message': f'[Device: {device_id}] Error detaching previous session: {str(e)}'})
-        
-        # Unload existing script if there's one for this app
-        if app_id in running_scripts[device_id]:
+                result.update(status='error', error=str(e))
+            if result['status'] == 'error':
+                finished = time.monotonic()
+        result['durationMs'] = int((finished - started) * 1000)
+        results.append(result)
+    return results
+
+def list_rpc_exports_sync(device_id, app_id):
+    if device_workers and app_id not in running_scripts.get(device_id, {}):
+        return device_workers.call(device_id, 'exports', app_id=app_id)
+    return run_blocking(rpc_script(device_id, app_id).list_exports_sync)
+
+def rpc_result_json(result):
+    """Make a call result JSON-safe; binary returns become base64"""
+    if isinstance(result.get('result'), (bytes, bytearray)):
+        data = bytes(result.pop('result'))
+        result.update(data=base64.b64encode(data).decode('ascii'), encoding='base64', size=len(data))
+    return result
+
+@app.route('/api/rpc/<device_id>/<app_id>', methods=['GET'])
+def list_rpc_exports(device_id, app_id):
+    try:
+        return jsonify({'deviceId': device_id, 'appId': app_id, 'exports': list_rpc_exports_sync(device_id, app_id)})
+    except RpcError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return jsonify({'error': f'[Device: {device_id}] {str(e)}'}), 500
+
+@app.route('/api/rpc/<device_id>/<app_id>', methods=['POST'])
+def call_rpc_batch(device_id, app_id):
+    """Run {calls: [{method, args, timeout}]} against one hooked app in a single request"""
+    data = request.json or {}
+    calls = data.get('calls')
+    
+    if not isinstance(calls, list) or not calls:
+        return jsonify({'error': 'calls must be a non-empty list'}), 400
+    
+    try:
+        results = run_rpc_calls(device_id, app_id, calls, data.get('timeout'))
+        return jsonify({'deviceId': device_id, 'appId': app_id, 'results': [rpc_result_json(r) for r in results]})
+    except RpcError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@app.route('/api/rpc/<device_id>/<app_id>/<method>', methods=['POST'])
+def call_rpc(device_id, app_id, method):
+    """Call one export; binary returns are sent as application/octet-stream"""
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        result = run_rpc_calls(device_id, app_id, [{'method': method, 'args': data.get('args')}], data.get('timeout'))[0]
+    except RpcError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    if result['status'] != 'ok':
+        if result['error'].startswith('Timed out'):
+            status = 504
+        elif result['error'].startswith('Too many calls'):
+            status = 429
+        else:
+            status = 500
+        return jsonify(result), status
+    if isinstance(result['result'], (bytes, bytearray)):
+        return Response(bytes(result['result']), mimetype='application/octet-stream')
+    return jsonify(result)
+
+class SessionSupervisor:
+    """Re-attaches hooked apps whose Frida sessions die and restores their scripts
+
+    Every /api/hook records a recipe. When a session detaches for any reason other
+    than the server asking for it, the app is hooked again with backoff, reconnecting
+    the device first if frida-server went away. The script reloads from the compiled cache.
+    With device workers, recipes and restores stay in the coordinator, where connect jobs
+    and the device scheduler live; workers only report detached sessions.
+    """
+
+    def __init__(self):
+        self.recipes = {}  # (device_id, app_id) -> recipe
+        self.lock = threading.Lock()
+
+    def record(self, device_id, app_id, script_content, agent_batching):
+        if worker_channel:
+            return  # The coordinator records hooks it forwarded to this worker
+        with self.lock:
+            recipe = self.recipes.get((device_id, app_id))
+            if recipe is None:
+                recipe = self.recipes[(device_id, app_id)] = {
+                    'deviceId': device_id,
+                    'appId': app_id,
+                    'reattaches': 0,
+                    'downtime': 0.0,
+                    'lastDetachReason': None,
+                    'lastCrash': None,
+                    'lastError': None
+                }
+            recipe.update({
+                'script': script_content,
+                'scriptHash': hashlib.sha256(script_content.encode('utf-8')).hexdigest()[:16],
+                'agentBatching': agent_batching,
+                'state': 'attached',
+                'hookedAt': time.time(),
+                'detachedAt': None,
+                'attempts': 0
+            })
+
+    def forget(self, device_id, app_id=None):
+        """Stop supervising an app, or every app on a device, e.g. on unhook or disconnect"""
+        with self.lock:
+            for key in [key for key in self.recipes if key[0] == device_id and (app_id is None or key[1] == app_id)]:
+                self.recipes[key]['state'] = 'forgotten'
+                del self.recipes[key]
+
+    def apps(self, device_id):
+        """Supervised apps on a device that are currently attached"""
+        with self.lock:
+            return [key[1] for key, recipe in self.recipes.items() if key[0] == device_id and recipe['state'] == 'attached']
+
+    def on_detached(self, device_id, app_id, session, reason, crash):
+        """Frida detached handler for a session loaded through load_agent"""
+        if reason == 'application-requested':
+            return  # Unhook, disconnect or a rehook replacing this session
+        if frida_sessions.get(device_id, {}).get(app_id) is not session:
+            return  # An older session of an app that was hooked again
+
+        crash_summary = crash.summary if crash is not None else None
+        recorder = trace_recorders.get(device_id, {}).get(app_id)
+        if recorder:
+            recorder.record({'type': 'detached', 'reason': reason, 'crash': crash_summary}, None)
+
+        # Drop the dead handles so nothing tries to use them
+        frida_sessions.get(device_id, {}).pop(app_id, None)
+        running_scripts.get(device_id, {}).pop(app_id, None)
+        session_pids.get(device_id, {}).pop(app_id, None)
+        close_message_pipeline(device_id, app_id)
+        close_trace_recorder(device_id, app_id)  # A re-attach starts a new recording
+        device_monitor.notify(device_id)
+        subscriptions.publish('session_detached', {'deviceId': device_id, 'appId': app_id, 'reason': reason, 'crash': crash_summary},
+                              device_id, app_id)
+        if worker_channel:
+            worker_channel.detached(device_id, app_id, reason, crash_summary)
+        else:
+            self.detached(device_id, app_id, reason, crash_summary)
+
+    def detached(self, device_id, app_id, reason, crash_summary):
+        """Start restoring a supervised app whose session died"""
+        with self.lock:
+            recipe = self.recipes.get((device_id, app_id))
+            if not SESSION_REATTACH or recipe is None or recipe['state'] == 'reattaching':
+                subscriptions.publish('status', {'message': f'[Device: {device_id}] Session for {app_id} detached: {reason}'}, device_id)
+                return
+            recipe.update(state='reattaching', detachedAt=time.time(), attempts=0,
+                          lastDetachReason=reason, lastCrash=crash_summary)
+
+        subscriptions.publish('status', {'message': f'[Device: {device_id}] Session for {app_id} detached ({reason}), re-attaching...'}, device_id)
+        socketio.start_background_task(self._restore, recipe)
+
+    def _restore(self, recipe):
+        device_id = recipe['deviceId']
+        app_id = recipe['appId']
+        detached_at = recipe['detachedAt']
+        delay = SESSION_REATTACH_BACKOFF
+
+        while recipe['state'] == 'reattaching':
+            recipe['attempts'] += 1
             try:
-                running_scripts[device_id][app_id].unload()
+                # A lost connection usually means frida-server or the device restarted
+                if recipe['lastDetachReason'] in ('connection-terminated', 'device-lost') or device_id not in connected_devices:
+                    job = start_connect_job(device_id)
+                    job['done'].wait(FRIDA_START_TIMEOUT + ADB_PROBE_TIMEOUT * 2)
+                    if job['state'] != 'connected':
+                        raise RuntimeError(job['error'] or 'device is not back yet')
+
+                with device_scheduler.slot(device_id, 'write', f'restore {app_id}'):
+                    if recipe['state'] != 'reattaching':
+                        return
+                    attempts = recipe['attempts']
+                    perform_hook(device_id, app_id, recipe['script'], recipe['agentBatching'])
+                # perform_hook re-recorded the recipe as attached; add to its counters
+                with self.lock:
+                    downtime = time.time() - detached_at
+                    recipe['reattaches'] += 1
+                    recipe['downtime'] += downtime
+                    recipe['lastReattachAt'] = time.time()
+                    recipe['lastError'] = None
+                subscriptions.publish('session_restored', {
+                    'deviceId': device_id,
+                    'appId': app_id,
+                    'attempts': attempts,
+                    'downtimeMs': int(downtime * 1000)
+                }, device_id, app_id)
+                return
             except Exception as e:
-                socketio.emit('status', {'message': f'[Device: {device_id}] Error unloading previous script: {str(e)}'})
+                recipe['lastError'] = str(e)
+                logger.warning(f"[Device: {device_id}] Re-attach {recipe['attempts']} to {app_id} failed: {str(e)}")
+                if SESSION_REATTACH_ATTEMPTS and recipe['attempts'] >= SESSION_REATTACH_ATTEMPTS:
+                    recipe['state'] = 'failed'
+                    subscriptions.publish('status', {'message': f'[Device: {device_id}] Gave up re-attaching to {app_id} after {recipe["attempts"]} attempts: {str(e)}'}, device_id)
+                    return
+            socketio.sleep(delay)
+            delay = min(delay * 2, SESSION_REATTACH_BACKOFF_MAX)
+
+    def stats(self, device_id=None):
+        now = time.time()
+        with self.lock:
+            sessions = []
+            for recipe in self.recipes.values():
+                if device_id and recipe['deviceId'] != device_id:
+                    continue
+                downtime = recipe['downtime']
+                if recipe['state'] != 'attached' and recipe['detachedAt']:
+                    downtime += now - recipe['detachedAt']
+                session = {key: value for key, value in recipe.items() if key not in ('script', 'downtime', 'detachedAt')}
+                session.update(downtimeMs=int(downtime * 1000), detachedAt=recipe['detachedAt'])
+                sessions.append(session)
+        return sessions
+
+session_supervisor = SessionSupervisor()
+
+@app.route('/api/sessions', methods=['GET'])
+def get_sessions():
+    """Supervised hooks with their state, re-attach count and accumulated downtime"""
+    device_id = request.args.get('deviceId')
+    return jsonify(session_supervisor.stats(device_id))
+
+def unhook_session(device_id, app_id):
+    """Unload an app's script and detach its session"""
+    if device_workers and app_id not in frida_sessions.get(device_id, {}):
+        session_supervisor.forget(device_id, app_id)
+        return device_workers.call(device_id, 'unhook', app_id=app_id)
+    
+    # Initialize dictionaries if they don't exist
+    if device_id not in running_scripts:
+        running_scripts[device_id] = {}
         
-        # Attach to the process
+    if device_id not in frida_sessions:
+        frida_sessions[device_id] = {}
+    
+    # An unhooked app must not be brought back by the supervisor
+    session_supervisor.forget(device_id, app_id)
+        
+    # Unload script if it exists
+    if app_id in running_scripts[device_id]:
         try:
-            if pid:
-                # If we spawned it, attach to the PID
-                session = device.attach(pid)
-                device.resume(pid)  # Resume the process after attaching
-            else:
-                # Try to attach by name if we didn't spawn it
-                session = device.attach(app_id)
-            
-            frida_sessions[device_id][app_id] = session
+            run_blocking(running_scripts[device_id][app_id].unload)
+            del running_scripts[device_id][app_id]
+            subscriptions.publish('status', {'message': f'[Device: {device_id}] Script unloaded from {app_id}'}, device_id)
         except Exception as e:
-            error_msg = str(e)
-            if "unable to find process with name" in error_msg:
-                # Try attaching by searching for a partial package name match or by PID
-                found = False
-                processes = device.enumerate_processes()
-                
-                # First try exact match on process name
-                for process in processes:
-                    if process.name == app_id:
-                        socketio.emit('status', {'message': f'[Device: {device_id}] Found process: {process.name} (PID: {process.pid})'})
-                        session = device.attach(process.pid)
-                        frida_sessions[device_id][app_id] = session
-                        found = True
-                        break
-                
-                # If not found, try partial match
-                if not found:
-                    for process in processes:
-                        if app_id in process.name:
-                            socketio.emit('status', {'message': f'[Device: {device_id}] Found similar process: {process.name} (PID: {process.pid})'})
-                            session = device.attach(process.pid)
-                            frida_sessions[device_id][app_id] = session
-                            found = True
-                            break
-                
-                # If still not found, run an adb shell command to try to start the app and get its PID
-                if not found:
-                    try:
-                        socketio.emit('status', {'message': f'[Device: {device_id}] Trying to start app via activity manager...'})
-                        # Try to start the app using activity manager
-                        cmd = f'monkey -p {app_id} -c android.intent.category.LAUNCHER 1'
-                        adb_result = subprocess.run(
-                            [ADB_PATH, '-s', device_id, 'shell', cmd],
-                            capture_output=True, text=True
-                        )
-                        time.sleep(2)  # Wait for app to start
-                        
-                        # Get the PID after trying to start the app
-                        pid_cmd = f'pidof {app_id}'
-                        pid_result = subprocess.run(
-                            [ADB_PATH, '-s', device_id, 'shell', pid_cmd],
-                            capture_output=True, text=True
-                        )
-                        
-                        if pid_result.stdout.strip():
-                            try:
-                                app_pid = int(pid_result.stdout.strip())
-                                socketio.emit('status', {'message': f'[Device: {device_id}] App started with PID: {app_pid}'})
-                                session = device.attach(app_pid)
-                                frida_sessions[device_id][app_id] = session
-                                found = True
-                            except ValueError:
-                                socketio.emit('status', {'message': f'[Device: {device_id}] Invalid PID: {pid_result.stdout.strip()}'})
-                    except Exception as start_error:
-                        socketio.emit('status', {'message': f'[Device: {device_id}] Error trying to start app: {str(start_error)}'})
-                
-                if not found:
-                    return jsonify({
-                        'error': f"Could not find process with name '{app_id}' on device '{device_id}'. Make sure the app is installed and the package name is correct. Try launching the app manually first."
-                    }), 500
-            else:
-                return jsonify({'error': f"[Device: {device_id}] {error_msg}"}), 500
-        
-        # Create and load the script
-        script = frida_sessions[device_id][app_id].create_script(enhanced_script)
-        script.on('message', on_message)
-        script.load()
-        
-        # Store the script
-        running_scripts[device_id][app_id] = script
-        
-        socketio.emit('status', {'message': f'[Device: {device_id}] Successfully hooked into {app_id}'})
-        return jsonify({'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': f"[Device: {device_id}] {str(e)}"}), 500
+            subscriptions.publish('status', {'message': f'[Device: {device_id}] Error unloading script: {str(e)}'}, device_id)
+    
+    session_pids.get(device_id, {}).pop(app_id, None)
+    
+    # Deliver any output still queued for this app
+    close_message_pipeline(device_id, app_id)
+    close_trace_recorder(device_id, app_id)
+    
+    # Detach session if it exists
+    if app_id in frida_sessions[device_id]:
+        try:
+            run_blocking(frida_sessions[device_id][app_id].detach)
+            del frida_sessions[device_id][app_id]
+            subscriptions.publish('status', {'message': f'[Device: {device_id}] Detached from {app_id}'}, device_id)
+        except Exception as e:
+            subscriptions.publish('status', {'message': f'[Device: {device_id}] Error detaching session: {str(e)}'}, device_id)
+    
+    device_monitor.notify(device_id)
 
 @app.route('/api/unhook', methods=['POST'])
+@device_operation('write')
 def unhook_app():
     data = request.json
     device_id = data.get('deviceId')
@@ -776,36 +4142,486 @@ def unhook_app():
         return jsonify({'error': 'Device ID and App ID are required'}), 400
     
     try:
-        # Initialize dictionaries if they don't exist
-        if device_id not in running_scripts:
-            running_scripts[device_id] = {}
-            
-        if device_id not in frida_sessions:
-            frida_sessions[device_id] = {}
-            
-        # Unload script if it exists
-        if app_id in running_scripts[device_id]:
-            try:
-                running_scripts[device_id][app_id].unload()
-                del running_scripts[device_id][app_id]
-                socketio.emit('status', {'message': f'[Device: {device_id}] Script unloaded from {app_id}'})
-            except Exception as e:
-                socketio.emit('status', {'message': f'[Device: {device_id}] Error unloading script: {str(e)}'})
-        
-        # Detach session if it exists
-        if app_id in frida_sessions[device_id]:
-            try:
-                frida_sessions[device_id][app_id].detach()
-                del frida_sessions[device_id][app_id]
-                socketio.emit('status', {'message': f'[Device: {device_id}] Detached from {app_id}'})
-            except Exception as e:
-                socketio.emit('status', {'message': f'[Device: {device_id}] Error detaching session: {str(e)}'})
-        
+        unhook_session(device_id, app_id)
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'error': f'[Device: {device_id}] {str(e)}'}), 500
 
+exec_streams = collections.OrderedDict()  # stream_id -> ExecStream, running and recently finished
+exec_streams_lock = threading.Lock()
+
+class ExecStream:
+    """A shell command on a device whose output is pushed to clients as it arrives
+
+    Output goes out as execute_output events chunk by chunk; only the last
+    EXEC_TAIL_BYTES are kept on the server for late readers.
+    """
+
+    def __init__(self, device_id, command, timeout=None):
+        self.stream_id = uuid.uuid4().hex
+        self.device_id = device_id
+        self.command = command
+        self.timeout = EXEC_STREAM_TIMEOUT if timeout is None else float(timeout)
+        self.state = 'running'
+        self.exit_code = None
+        self.reason = None
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.bytes = {'stdout': 0, 'stderr': 0}
+        self.tail = collections.deque()
+        self.tail_size = 0
+        self.decoders = {name: codecs.getincrementaldecoder('utf-8')(errors='replace') for name in self.bytes}
+        self.sock = None
+        self.process = None
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.timeout > 0:
+            self.timer = threading.Timer(self.timeout, self.kill, args=('timeout',))
+            self.timer.daemon = True
+            self.timer.start()
+        socketio.start_background_task(self._run)
+
+    def kill(self, reason='killed'):
+        """Stop the command; returns False if it already finished"""
+        with self.lock:
+            if self.state != 'running' or self.reason:
+                return False
+            self.reason = reason
+            sock, process = self.sock, self.process
+        # Closing the shell socket makes adbd hang up the remote process
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if process:
+            process.kill()
+        return True
+
+    def _run(self):
+        try:
+            exit_code = None
+            if adb_client:
+                try:
+                    exit_code = self._run_socket()
+                except AdbError as e:
+                    if 'Cannot reach adb server' not in str(e):
+                        raise
+                    logger.debug(f"adb socket transport unavailable, falling back to {ADB_PATH}: {str(e)}")
+                    exit_code = self._run_process()
+            else:
+                exit_code = self._run_process()
+            self._finish(exit_code)
+        except Exception as e:
+            self._finish(None, None if self.reason else str(e))
+
+    def _run_socket(self):
+        sock, v2 = adb_client.open_shell(self.device_id, self.command)
+        with self.lock:
+            self.sock = sock
+            killed = self.reason is not None
+        try:
+            if killed:
+                return None
+            for name, payload in adb_client.read_shell(sock, v2):
+                if name == 'exit':
+                    return payload
+                self._output(name, payload)
+        finally:
+            sock.close()
+
+    def _run_process(self):
+        process = subprocess.Popen(
+            [ADB_PATH, '-s', self.device_id, 'shell', self.command],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        with self.lock:
+            self.process = process
+            killed = self.reason is not None
+        if killed:
+            process.kill()
+
+        stderr_reader = threading.Thread(target=self._pump, args=('stderr', process.stderr), daemon=True)
+        stderr_reader.start()
+        self._pump('stdout', process.stdout)
+        stderr_reader.join()
+        return process.wait()
+
+    def _pump(self, name, pipe):
+        # read1 returns whatever the pipe holds, so bursts go out as one chunk
+        for chunk in iter(lambda: pipe.read1(65536), b''):
+            self._output(name, chunk)
+        pipe.close()
+
+    def _output(self, name, chunk, final=False):
+        self.bytes[name] += len(chunk)
+        text = self.decoders[name].decode(chunk, final)
+        if not text:
+            return
+
+        with self.lock:
+            self.tail.append((name, text))
+            self.tail_size += len(text)
+            while self.tail_size > EXEC_TAIL_BYTES and len(self.tail) > 1:
+                self.tail_size -= len(self.tail.popleft()[1])
+
+        subscriptions.publish('execute_output', {
+            'streamId': self.stream_id,
+            'deviceId': self.device_id,
+            'stream': name,
+            'data': text
+        }, self.device_id)
+
+    def _finish(self, exit_code, error=None):
+        if self.timer:
+            self.timer.cancel()
+        for name in self.decoders:
+            self._output(name, b'', final=True)
+
+        with self.lock:
+            self.state = 'finished'
+            self.exit_code = exit_code
+            self.error = error
+            self.reason = self.reason or ('error' if error else 'exit')
+            self.finished_at = time.time()
+            self.sock = self.process = None
+
+        # Package installs and removals make the cached app list stale
+        if PACKAGE_CHANGE_PATTERN.search(self.command):
+            invalidate_app_index(self.device_id)
+
+        subscriptions.publish('execute_exit', {
+            'streamId': self.stream_id,
+            'deviceId': self.device_id,
+            'exitCode': exit_code,
+            'reason': self.reason,
+            'error': error
+        }, self.device_id)
+
+    def to_json(self, output=False):
+        with self.lock:
+            result = {
+                'streamId': self.stream_id,
+                'deviceId': self.device_id,
+                'command': self.command,
+                'state': self.state,
+                'exitCode': self.exit_code,
+                'reason': self.reason,
+                'error': self.error,
+                'startedAt': self.started_at,
+                'finishedAt': self.finished_at,
+                'bytes': dict(self.bytes)
+            }
+            if output:
+                result['output'] = [{'stream': name, 'data': text} for name, text in self.tail]
+        return result
+
+def start_exec_stream(device_id, command, timeout=None):
+    """Register and start a streamed command, or return None if the device has too many running"""
+    with exec_streams_lock:
+        running = sum(1 for s in exec_streams.values() if s.device_id == device_id and s.state == 'running')
+        if running >= EXEC_STREAMS_PER_DEVICE:
+            return None
+
+        # Keep a bounded history of finished streams
+        finished = [s.stream_id for s in exec_streams.values() if s.state == 'finished']
+        for stream_id in finished[:max(len(exec_streams) - EXEC_STREAM_HISTORY, 0)]:
+            del exec_streams[stream_id]
+
+        stream = ExecStream(device_id, command, timeout)
+        exec_streams[stream.stream_id] = stream
+
+    stream.start()
+    return stream
+
+def kill_device_exec_streams(device_id):
+    for stream in list(exec_streams.values()):
+        if stream.device_id == device_id:
+            stream.kill()
+
+# logcat -B entries: a logger_entry header followed by priority byte, tag\0 and message\0
+LOGCAT_ENTRY_PREFIX = struct.Struct('<HH')        # payload length, header size (0 on v1)
+LOGCAT_ENTRY_HEADER = struct.Struct('<HHiIII')    # ... pid, tid, sec, nsec
+LOGCAT_LEVELS = {2: 'V', 3: 'D', 4: 'I', 5: 'W', 6: 'E', 7: 'F', 8: 'S'}
+LOGCAT_LEVEL_RANKS = {level: rank for rank, level in LOGCAT_LEVELS.items()}
+
+def decode_logcat_entries(buffer, offset=0):
+    """Decode complete binary logcat entries from a bytearray
+
+    Returns (entries, offset of the first unconsumed byte); a partial entry at
+    the end is left for the next read.
+    """
+    entries = []
+    end = len(buffer)
+    while offset + LOGCAT_ENTRY_PREFIX.size <= end:
+        length, header_size = LOGCAT_ENTRY_PREFIX.unpack_from(buffer, offset)
+        header_size = header_size or 20  # v1 entries have no header size field
+        if offset + header_size + length > end:
+            break
+        _, _, pid, tid, sec, nsec = LOGCAT_ENTRY_HEADER.unpack_from(buffer, offset)
+        payload_start = offset + header_size
+        offset = payload_start + length
+        if length < 2:
+            continue
+
+        tag_end = buffer.find(b'\0', payload_start + 1, offset)
+        if tag_end < 0:
+            tag_end = offset
+        message = bytes(buffer[tag_end + 1:offset]).rstrip(b'\0\n')
+        entries.append({
+            'timestamp': sec + nsec / 1e9,
+            'pid': pid,
+            'tid': tid,
+            'level': LOGCAT_LEVELS.get(buffer[payload_start], '?'),
+            'tag': bytes(buffer[payload_start + 1:tag_end]).decode('utf-8', errors='replace'),
+            'message': message.decode('utf-8', errors='replace')
+        })
+    return entries, offset
+
+class LogcatFilter:
+    """Server-side subscriber filter on tag, pid, hooked app, minimum level and text"""
+
+    def __init__(self, options=None):
+        options = options or {}
+        self.tags = set(options.get('tags') or [])
+        self.pids = set(int(pid) for pid in options.get('pids') or [])
+        self.app_ids = set(options.get('appIds') or [])
+        self.min_rank = LOGCAT_LEVEL_RANKS.get(str(options.get('level') or 'V').upper()[:1], 2)
+        self.text = (options.get('text') or '').casefold()
+
+    def matches(self, entry):
+        if LOGCAT_LEVEL_RANKS.get(entry['level'], 8) < self.min_rank:
+            return False
+        if self.tags and entry['tag'] not in self.tags:
+            return False
+        if (self.pids or self.app_ids) and entry['pid'] not in self.pids and entry.get('appId') not in self.app_ids:
+            return False
+        if self.text and self.text not in entry['message'].casefold() and self.text not in entry['tag'].casefold():
+            return False
+        return True
+
+class LogcatSubscription:
+    def __init__(self, sid, options):
+        self.sid = sid
+        self.filter = LogcatFilter(options)
+        self.queue = collections.deque(maxlen=LOGCAT_QUEUE_SIZE)
+        self.dropped = 0
+
+class LogcatReader:
+    """One persistent `logcat -B` stream per device, fanned out to filtered subscribers
+
+    The reader thread decodes and filters entries; a flusher task delivers
+    them to each subscriber as logcat_batch events. Entry timestamps come from the
+    device clock; clockSkew (host minus device, in seconds) lines them up with the
+    host-clock timestamps of Frida messages.
+    """
+
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.subscriptions = {}  # sid -> LogcatSubscription
+        self.recent = collections.deque(maxlen=LOGCAT_HISTORY)
+        self.lock = threading.Lock()
+        self.running = False
+        self.sock = None
+        self.process = None
+        self.generation = 0  # Bumped per run so a stopped run can't touch its successor's state
+        self.entries = 0
+        self.error = None
+        self.clock_skew = None
+
+    def subscribe(self, sid, options):
+        with self.lock:
+            self.subscriptions[sid] = LogcatSubscription(sid, options)
+            start = not self.running
+            self.running = True
+            if start:
+                self.generation += 1
+            generation = self.generation
+        if start:
+            self.error = None
+            socketio.start_background_task(self._read, generation)
+            socketio.start_background_task(self._flush, generation)
+
+    def unsubscribe(self, sid):
+        """Drop a subscriber; the stream stops with the last one"""
+        with self.lock:
+            self.subscriptions.pop(sid, None)
+            if self.subscriptions:
+                return
+        self.stop()
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            sock, process = self.sock, self.process
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if process:
+            process.kill()
+
+    def _current(self, generation):
+        return self.running and self.generation == generation
+
+    def _measure_clock_skew(self):
+        """Host minus device clock in seconds, or None if the device's date can't be read"""
+        try:
+            before = time.time()
+            result = adb_shell(self.device_id, 'date +%s.%N', timeout=ADB_PROBE_TIMEOUT)
+            host = (before + time.time()) / 2
+            return round(host - float(result.stdout.strip()), 3)
+        except (subprocess.SubprocessError, OSError, ValueError):
+            return None
+
+    def _chunks(self, generation):
+        """Yield raw bytes from logcat over the adb socket, or exec-out when it is unavailable"""
+        command = f'logcat -B -b {LOGCAT_BUFFERS} -T 1'
+        if adb_client:
+            try:
+                sock = adb_client.open_exec(self.device_id, command)
+            except AdbError as e:
+                if 'Cannot reach adb server' not in str(e):
+                    raise
+                sock = None
+            if sock:
+                with self.lock:
+                    stopped = not self._current(generation)
+                    if not stopped:
+                        self.sock = sock
+                try:
+                    if not stopped:
+                        for chunk in iter(lambda: sock.recv(65536), b''):
+                            yield chunk
+                finally:
+                    sock.close()
+                    with self.lock:
+                        if self.sock is sock:
+                            self.sock = None
+                return
+
+        process = subprocess.Popen([ADB_PATH, '-s', self.device_id, 'exec-out', command],
+                                   stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        with self.lock:
+            stopped = not self._current(generation)
+            if not stopped:
+                self.process = process
+        try:
+            if not stopped:
+                for chunk in iter(lambda: process.stdout.read1(65536), b''):
+                    yield chunk
+        finally:
+            process.kill()
+            process.wait()
+            with self.lock:
+                if self.process is process:
+                    self.process = None
+
+    def _read(self, generation):
+        buffer = bytearray()
+        self.clock_skew = self._measure_clock_skew()
+        try:
+            for chunk in self._chunks(generation):
+                if not self._current(generation):
+                    break
+                buffer += chunk
+                entries, consumed = decode_logcat_entries(buffer)
+                del buffer[:consumed]
+                if entries:
+                    self._dispatch(entries)
+        except Exception as e:
+            if self._current(generation):
+                self.error = str(e)
+                logger.error(f"[Device: {self.device_id}] logcat stream failed: {str(e)}")
+                subscriptions.publish('status', {'message': f'[Device: {self.device_id}] logcat stream stopped: {str(e)}'}, self.device_id)
+        finally:
+            with self.lock:
+                if self.generation == generation:
+                    self.running = False
+
+    def _dispatch(self, entries):
+        # Tag entries from hooked processes so they line up with Frida output
+        hooked = {pid: app_id for app_id, pid in session_pids.get(self.device_id, {}).items()}
+        with self.lock:
+            subscriptions = list(self.subscriptions.values())
+            for entry in entries:
+                entry['appId'] = hooked.get(entry['pid'])
+                entry['deviceId'] = self.device_id
+                self.recent.append(entry)
+                for subscription in subscriptions:
+                    if subscription.filter.matches(entry):
+                        if len(subscription.queue) == subscription.queue.maxlen:
+                            subscription.dropped += 1
+                        subscription.queue.append(entry)
+            self.entries += len(entries)
+
+    def _flush(self, generation):
+        # A newer run's flusher takes over the queues as soon as it starts
+        while self.generation == generation and (self.running or any(s.queue for s in list(self.subscriptions.values()))):
+            socketio.sleep(LOGCAT_BATCH_INTERVAL)
+            with self.lock:
+                batches = []
+                for subscription in self.subscriptions.values():
+                    if subscription.queue or subscription.dropped:
+                        batches.append((subscription.sid, list(subscription.queue), subscription.dropped))
+                        subscription.queue.clear()
+                        subscription.dropped = 0
+            for sid, entries, dropped in batches:
+                if sid is None:
+                    continue  # Server-held subscription, read through /api/logcat
+                for start in range(0, max(len(entries), 1), LOGCAT_BATCH_SIZE):
+                    socketio.emit('logcat_batch', {
+                        'deviceId': self.device_id,
+                        'entries': entries[start:start + LOGCAT_BATCH_SIZE],
+                        'dropped': dropped if start == 0 else 0,
+                        'clockSkew': self.clock_skew
+                    }, to=sid)
+
+    def query(self, options, limit):
+        """Recent entries matching a filter, oldest first"""
+        entry_filter = LogcatFilter(options)
+        with self.lock:
+            matches = [entry for entry in self.recent if entry_filter.matches(entry)]
+        return matches[-limit:]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'deviceId': self.device_id,
+                'running': self.running,
+                'subscribers': len(self.subscriptions),
+                'entries': self.entries,
+                'buffered': len(self.recent),
+                'clockSkew': self.clock_skew,
+                'error': self.error
+            }
+
+logcat_readers = {}  # device_id -> LogcatReader
+logcat_readers_lock = threading.Lock()
+
+def get_logcat_reader(device_id):
+    with logcat_readers_lock:
+        reader = logcat_readers.get(device_id)
+        if reader is None:
+            reader = logcat_readers[device_id] = LogcatReader(device_id)
+        return reader
+
+def stop_logcat_reader(device_id):
+    with logcat_readers_lock:
+        reader = logcat_readers.pop(device_id, None)
+    if reader:
+        reader.stop()
+
+def execute_kind(data):
+    """Shell commands are reads unless they install or remove packages"""
+    return 'write' if PACKAGE_CHANGE_PATTERN.search(data.get('command') or '') else 'read'
+
 @app.route('/api/execute', methods=['POST'])
+@device_operation(execute_kind)
 def execute_command():
     data = request.json
     device_id = data.get('deviceId')
@@ -815,10 +4631,20 @@ def execute_command():
         return jsonify({'error': 'Device ID and command are required'}), 400
     
     try:
-        result = subprocess.run(
-            [ADB_PATH, '-s', device_id, 'shell', command],
-            capture_output=True, text=True
-        )
+        # Long-running commands stream their output over Socket.IO instead
+        if data.get('stream'):
+            stream = start_exec_stream(device_id, command, data.get('timeout'))
+            if not stream:
+                return jsonify({'error': f'[Device: {device_id}] Too many running commands ({EXEC_STREAMS_PER_DEVICE})'}), 429
+            return jsonify(stream.to_json()), 202
+        
+        # User commands share one label so /metrics doesn't grow a series per program
+        result = adb_shell(device_id, command, operation='execute')
+        
+        # Package installs and removals make the cached app list stale
+        if PACKAGE_CHANGE_PATTERN.search(command):
+            invalidate_app_index(device_id)
+        
         return jsonify({
             'stdout': result.stdout,
             'stderr': result.stderr,
@@ -827,7 +4653,112 @@ def execute_command():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/execute/streams', methods=['GET'])
+def list_exec_streams():
+    device_id = request.args.get('deviceId')
+    return jsonify([s.to_json() for s in list(exec_streams.values()) if not device_id or s.device_id == device_id])
+
+@app.route('/api/execute/streams/<stream_id>', methods=['GET'])
+def get_exec_stream(stream_id):
+    stream = exec_streams.get(stream_id)
+    if not stream:
+        return jsonify({'error': 'Stream not found'}), 404
+    return jsonify(stream.to_json(output=True))
+
+@app.route('/api/execute/streams/<stream_id>', methods=['DELETE'])
+def kill_exec_stream(stream_id):
+    stream = exec_streams.get(stream_id)
+    if not stream:
+        return jsonify({'error': 'Stream not found'}), 404
+    if not stream.kill():
+        return jsonify({'error': 'Stream already finished'}), 409
+    return jsonify({'status': 'killing', 'streamId': stream_id})
+
+def logcat_options(args):
+    """Filter options from query parameters; list filters are comma-separated"""
+    split = lambda name: [value for value in args.get(name, '').split(',') if value]
+    return {
+        'tags': split('tags'),
+        'pids': split('pids'),
+        'appIds': split('appIds'),
+        'level': args.get('level'),
+        'text': args.get('text')
+    }
+
+@app.route('/api/logcat', methods=['GET'])
+def query_logcat():
+    """Recent logcat entries from a device's running stream, filtered server-side"""
+    device_id = request.args.get('deviceId')
+    reader = logcat_readers.get(device_id)
+    if not reader:
+        return jsonify({'error': 'logcat is not running for this device'}), 404
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 1000)), 1), LOGCAT_HISTORY)
+        entries = reader.query(logcat_options(request.args), limit)
+    except ValueError:
+        return jsonify({'error': 'limit and pids must be integers'}), 400
+    return jsonify({'deviceId': device_id, 'entries': entries, 'clockSkew': reader.clock_skew})
+
+@app.route('/api/logcat/start', methods=['POST'])
+def start_logcat():
+    """Keep logcat running for a device without a socket subscriber, for /api/logcat queries"""
+    data = request.json or {}
+    device_id = data.get('deviceId')
+    
+    if device_id not in connected_devices:
+        return jsonify({'error': 'Device not connected'}), 400
+    
+    reader = get_logcat_reader(device_id)
+    reader.subscribe(None, {})
+    return jsonify(reader.stats())
+
+@app.route('/api/logcat/stop', methods=['POST'])
+def stop_logcat():
+    data = request.json or {}
+    device_id = data.get('deviceId')
+    
+    if device_id not in logcat_readers:
+        return jsonify({'error': 'logcat is not running for this device'}), 404
+    
+    stop_logcat_reader(device_id)
+    return jsonify({'status': 'stopped', 'deviceId': device_id})
+
+@app.route('/api/logcat/status', methods=['GET'])
+def get_logcat_status():
+    return jsonify([reader.stats() for reader in list(logcat_readers.values())])
+
+frida_upload_locks = {}  # upload_id -> [Lock held while a chunk is checked and appended, requests using it]
+frida_upload_locks_lock = threading.Lock()
+
+def store_frida_upload(part_path):
+    """Move a complete upload into the hash-named store and return its sha256"""
+    sha256 = hash_file(part_path)
+    final_path = os.path.join(FRIDA_UPLOADS_DIR, sha256)
+    os.replace(part_path, final_path)
+    binary_catalog.hash(final_path)
+    return sha256
+
+def provision_device(device_id, sha256=None):
+    """Probe one device and push frida-server if needed, e.g. for /api/provision"""
+    check_frida, arch, marker = adb_shell_many(device_id, [f'ls {FRIDA_SERVER_PATH}', 'getprop ro.product.cpu.abi', f'cat {FRIDA_SERVER_MARKER}'], timeout=ADB_PROBE_TIMEOUT)
+    exists = 'No such file' not in check_frida.stderr and 'not found' not in check_frida.stderr
+    if device_id not in device_root_methods:
+        device_root_methods[device_id] = detect_root_method(device_id)
+    
+    def report(message):
+        subscriptions.publish('status', {'message': f'[Device: {device_id}] {message}'}, device_id)
+
+    running = is_frida_server_running(device_id)
+    pushed = provision_frida_server(
+        device_id, arch.stdout.strip(), exists, parse_server_marker(marker), report, running=running, sha256=sha256
+    )
+    if pushed and running:
+        restart_frida_server(device_id, report)
+    return pushed
+
 @app.route('/api/upload-frida', methods=['POST'])
+@device_operation('write')
 def upload_frida_server():
     device_id = request.form.get('deviceId')
     
@@ -842,35 +4773,1318 @@ def upload_frida_server():
         return jsonify({'error': 'No selected file'}), 400
     
     try:
-        temp_path = os.path.join(UPLOADS_DIR, file.filename)
-        file.save(temp_path)
+        # Werkzeug has already spooled the file; copy it into the store a chunk at a time
+        part_path = os.path.join(FRIDA_UPLOADS_DIR, f'{uuid.uuid4().hex}.part')
+        with open(part_path, 'wb') as f:
+            for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b''):
+                f.write(chunk)
+        sha256 = store_frida_upload(part_path)
         
-        # Push to device
-        subprocess.run(
-            [ADB_PATH, '-s', device_id, 'push', temp_path, FRIDA_SERVER_PATH],
-            check=True
-        )
+        # An explicit upload replaces whatever is on the device unless it is the same binary
+        marker = read_server_marker(device_id)
+        pushed = marker[0] != sha256
+        if pushed:
+            running = is_frida_server_running(device_id)
+            if running:
+                # The old server keeps running from the replaced file otherwise
+                adb_root_shell(device_id, 'pkill frida-server', timeout=ADB_PROBE_TIMEOUT)
+            push_server_binary(device_id, os.path.join(FRIDA_UPLOADS_DIR, sha256), sha256, 'upload')
+            if running:
+                restart_frida_server(device_id, lambda message: subscriptions.publish('status', {'message': f'[Device: {device_id}] {message}'}, device_id))
+        return jsonify({'status': 'success', 'sha256': sha256, 'pushed': pushed})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/frida-uploads/<upload_id>', methods=['GET'])
+def get_frida_upload(upload_id):
+    """How many bytes of a resumable upload have arrived"""
+    if not re.fullmatch(r'[A-Za-z0-9_-]{1,64}', upload_id):
+        return jsonify({'error': 'Invalid upload ID'}), 400
+    part_path = os.path.join(FRIDA_UPLOADS_DIR, f'{upload_id}.part')
+    if not os.path.exists(part_path):
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify({'uploadId': upload_id, 'received': os.path.getsize(part_path)})
+
+@app.route('/api/frida-uploads/<upload_id>', methods=['PUT'])
+def put_frida_upload(upload_id):
+    """Append one chunk of a resumable frida-server upload
+
+    The body is raw bytes, placed by a Content-Range: bytes start-end/total header. A chunk
+    that doesn't start where the upload left off gets 409 with the received byte count, so
+    an interrupted client resumes from there. The final chunk returns the binary's sha256.
+    """
+    if not re.fullmatch(r'[A-Za-z0-9_-]{1,64}', upload_id):
+        return jsonify({'error': 'Invalid upload ID'}), 400
+    
+    start, total = 0, None
+    content_range = request.headers.get('Content-Range')
+    if content_range:
+        match = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+|\*)', content_range.strip())
+        if not match:
+            return jsonify({'error': 'Invalid Content-Range'}), 400
+        start = int(match.group(1))
+        total = int(match.group(3)) if match.group(3) != '*' else None
+    
+    # Concurrent PUTs of one upload would both pass the offset check and interleave their appends
+    with frida_upload_locks_lock:
+        entry = frida_upload_locks.setdefault(upload_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            return append_frida_upload(upload_id, start, total, content_range)
+    finally:
+        with frida_upload_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del frida_upload_locks[upload_id]
+
+def append_frida_upload(upload_id, start, total, content_range):
+    """Check that a chunk continues the upload and append it; put_frida_upload holds the upload's lock"""
+    part_path = os.path.join(FRIDA_UPLOADS_DIR, f'{upload_id}.part')
+    received = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    
+    if start != received:
+        return jsonify({'error': 'Chunk does not continue the upload', 'received': received}), 409
+    
+    try:
+        with open(part_path, 'ab') as f:
+            for chunk in iter(lambda: request.stream.read(UPLOAD_CHUNK_SIZE), b''):
+                f.write(chunk)
+        received = os.path.getsize(part_path)
         
-        # Set executable permissions
-        subprocess.run(
-            [ADB_PATH, '-s', device_id, 'shell', f'su -c "chmod 755 {FRIDA_SERVER_PATH}"'],
-            check=True
-        )
+        if total is not None and received > total:
+            # Drop the overflowing chunk so the client can resume from the last good byte
+            with open(part_path, 'r+b') as f:
+                f.truncate(start)
+            return jsonify({'error': f'Upload exceeds its declared size of {total} bytes', 'received': start}), 400
         
-        os.remove(temp_path)
-        return jsonify({'status': 'success'})
+        # Without a Content-Range the body is the whole file
+        if total is None and content_range:
+            return jsonify({'uploadId': upload_id, 'received': received})
+        if total is not None and received < total:
+            return jsonify({'uploadId': upload_id, 'received': received})
+        
+        sha256 = store_frida_upload(part_path)
+        return jsonify({'status': 'complete', 'uploadId': upload_id, 'size': received, 'sha256': sha256})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/frida-binaries', methods=['GET'])
+def get_frida_binaries():
+    """Bundled and uploaded frida-server binaries with their hashes"""
+    return jsonify(binary_catalog.stats())
+
+@app.route('/api/provision', methods=['POST'])
+def provision_devices():
+    """Provision frida-server on many devices in parallel
+
+    Takes deviceIds (default: every attached device) and optionally the sha256 of an
+    uploaded binary. Devices that already have the binary are skipped.
+    """
+    data = request.json or {}
+    device_ids = data.get('deviceIds') or [serial for serial, state in list(device_monitor.states.items()) if state == 'device']
+    sha256 = data.get('sha256')
+    
+    if sha256 and not binary_catalog.find(sha256):
+        return jsonify({'error': f'No uploaded Frida server with hash {sha256}'}), 404
+    
+    def provision_one(device_id):
+        result = {'deviceId': device_id}
+        started = time.monotonic()
+        try:
+            with device_scheduler.slot(device_id, 'write', 'provision', data.get('queueTimeout')):
+                result['pushed'] = provision_device(device_id, sha256)
+            result['status'] = 'success'
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = str(e)
+        result['durationMs'] = int((time.monotonic() - started) * 1000)
+        return result
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(PROVISION_WORKERS, len(device_ids)))) as executor:
+        results = list(executor.map(provision_one, device_ids))
+    
+    return jsonify({
+        'results': results,
+        'pushed': sum(1 for r in results if r.get('pushed')),
+        'failed': sum(1 for r in results if r['status'] == 'error')
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint, including the device workers' own metrics"""
+    snapshots = device_workers.call_all('metrics') if device_workers else ()
+    return Response(metrics.render(snapshots), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/message-stats', methods=['GET'])
+def get_message_stats():
+    """Queue depth and drop counters for every hooked app's message pipeline"""
+    with message_pipelines_lock:
+        pipelines = [p for apps in message_pipelines.values() for p in apps.values()]
+    sessions = [p.stats() for p in pipelines]
+    outboxes = []
+    if device_workers:
+        for worker in device_workers.call_all('stats'):
+            sessions += worker['pipelines']
+            outboxes.append(worker['outbox'])
+    return jsonify({
+        'batchSize': MESSAGE_BATCH_SIZE,
+        'batchIntervalMs': int(MESSAGE_BATCH_INTERVAL * 1000),
+        'queueSize': MESSAGE_QUEUE_SIZE,
+        'dropPolicy': MESSAGE_DROP_POLICY,
+        'sessions': sessions,
+        'workerOutboxes': outboxes
+    })
+
+@app.route('/api/subscriptions', methods=['GET'])
+def get_subscriptions():
+    """Socket.IO subscription rooms and how many clients are in each"""
+    return jsonify(subscriptions.stats())
+
+@app.route('/api/script-cache', methods=['GET'])
+def get_script_cache_stats():
+    stats = script_cache.stats()
+    if device_workers:
+        stats['workers'] = device_workers.call_all('script_cache_stats')
+    return jsonify(stats)
+
+@app.route('/api/script-cache', methods=['DELETE'])
+def clear_script_cache():
+    script_cache.clear()
+    if device_workers:
+        device_workers.call_all('script_cache_clear')
+    return jsonify({'status': 'cleared'})
+
+@app.route('/api/scheduler', methods=['GET'])
+def get_scheduler_stats():
+    """Slot usage, queue depth and wait times per device, plus every queued or running job"""
+    stats = device_scheduler.stats(request.args.get('deviceId'))
+    stats.update({
+        'writeSlots': DEVICE_WRITE_SLOTS,
+        'readSlots': DEVICE_READ_SLOTS,
+        'queueTimeout': DEVICE_QUEUE_TIMEOUT
+    })
+    return jsonify(stats)
+
+@app.route('/api/scheduler/jobs/<job_id>', methods=['DELETE'])
+def cancel_scheduler_job(job_id):
+    cancelled = device_scheduler.cancel(job_id)
+    if cancelled is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not cancelled:
+        return jsonify({'error': 'Job is already running'}), 409
+    return jsonify({'status': 'cancelled', 'jobId': job_id})
+
+@app.route('/api/traces', methods=['GET'])
+def list_traces():
+    device_id = request.args.get('deviceId')
+    app_id = request.args.get('appId')
+    traces = []
+    
+    try:
+        for trace_id in sorted(os.listdir(TRACES_DIR), reverse=True):
+            meta = read_trace_meta(trace_id)
+            if not meta:
+                continue
+            if (device_id and meta['deviceId'] != device_id) or (app_id and meta['appId'] != app_id):
+                continue
+            meta['segments'] = len(meta['segments'])
+            traces.append(meta)
+    except FileNotFoundError:
+        pass
+    
+    return jsonify(traces)
+
+@app.route('/api/traces/<trace_id>', methods=['GET'])
+def replay_trace(trace_id):
+    meta = read_trace_meta(trace_id)
+    if not meta:
+        return jsonify({'error': 'Trace not found'}), 404
+    
+    try:
+        start = float(request.args['start']) if 'start' in request.args else None
+        end = float(request.args['end']) if 'end' in request.args else None
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'start and end must be epoch seconds and limit an integer'}), 400
+    
+    def generate():
+        # One JSON record per line, streamed straight out of the mapped segments
+        for count, (timestamp, body, data) in enumerate(iter_trace_records(trace_id, meta, start, end)):
+            if limit is not None and count >= limit:
+                break
+            record = json.loads(body)
+            record['timestamp'] = timestamp
+            if data:
+                record['data'] = base64.b64encode(data).decode('ascii')
+            yield json.dumps(record) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/logs/search', methods=['GET'])
+def search_logs():
+    if not log_index.start():
+        return jsonify({'error': 'Log index is disabled'}), 503
+    
+    try:
+        since = float(request.args['since']) if 'since' in request.args else None
+        until = float(request.args['until']) if 'until' in request.args else None
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'since and until must be epoch seconds, limit and offset integers'}), 400
+    
+    try:
+        records, has_more = log_index.search(
+            query=request.args.get('q', '').strip() or None,
+            device_id=request.args.get('deviceId'),
+            app_id=request.args.get('appId'),
+            type=request.args.get('type'),
+            subtype=request.args.get('subtype'),
+            since=since,
+            until=until,
+            limit=limit,
+            offset=offset
+        )
+    except sqlite3.Error as e:
+        return jsonify({'error': f'Invalid search: {str(e)}'}), 400
+    
+    return jsonify({
+        'records': records,
+        'hasMore': has_more,
+        'offset': offset,
+        'limit': limit,
+        'dropped': log_index.dropped
+    })
+
 # WebSocket events
 @socketio.on('connect')
 def handle_connect():
     logger.info(f"Client connected: {request.sid}")
-    socketio.emit('status', {'message': 'Connected to server'})
+    encoding = wire_encoding(request.args)
+    subscriptions.connect(request.sid, encoding)
+    socketio.emit('status', {'message': 'Connected to server'}, to=request.sid)
+    if encoding != 'json':
+        # Tells the client packed frames are coming; servers without the option never send this
+        socketio.emit('wire_encoding', {'encoding': encoding, 'packedEvents': sorted(WIRE_PACKED_EVENTS)}, to=request.sid)
 
 @socketio.on('disconnect')
 def handle_disconnect():
     logger.info(f"Client disconnected: {request.sid}")
+    subscriptions.disconnect(request.sid)
+    for reader in list(logcat_readers.values()):
+        reader.unsubscribe(request.sid)
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Receive a device's events, optionally only some apps and events: {deviceId, appId or appIds, events}
+
+    {all: true} asks for every device. The acknowledgement lists the client's rooms.
+    """
+    try:
+        return {'status': 'subscribed', 'rooms': subscriptions.subscribe(request.sid, data or {})}
+    except ValueError as e:
+        return {'error': str(e)}
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    """Stop receiving what a subscribe with the same fields asked for; without deviceId, stop everything"""
+    try:
+        return {'status': 'unsubscribed', 'rooms': subscriptions.unsubscribe(request.sid, data or {})}
+    except ValueError as e:
+        return {'error': str(e)}
+
+@socketio.on('logcat_subscribe')
+def handle_logcat_subscribe(data):
+    """Stream a device's logcat to this client, filtered by tags, pids, appIds, level and text"""
+    device_id = (data or {}).get('deviceId')
+    if device_id not in connected_devices:
+        return {'error': 'Device not connected'}
+    try:
+        get_logcat_reader(device_id).subscribe(request.sid, data)
+    except ValueError:
+        return {'error': 'pids must be integers'}
+    return {'status': 'subscribed', 'deviceId': device_id}
+
+@socketio.on('rpc_call')
+def handle_rpc_call(data):
+    """Call exports of a hooked app: {deviceId, appId, method, args} or {deviceId, appId, calls}
+
+    The acknowledgement carries the results; binary returns travel as Socket.IO attachments.
+    """
+    data = data or {}
+    link = node_hub.owner(data.get('deviceId')) if node_hub else None
+    if link:
+        try:
+            return link.call('rpc_call', data=data)
+        except Exception as e:
+            return {'error': f"[Node: {link.name}] {str(e)}"}
+    calls = data.get('calls') or [{'method': data.get('method'), 'args': data.get('args')}]
+    try:
+        results = run_rpc_calls(data.get('deviceId'), data.get('appId'), calls, data.get('timeout'))
+    except RpcError as e:
+        return {'error': str(e)}
+    return {'deviceId': data.get('deviceId'), 'appId': data.get('appId'), 'results': results}
+
+@socketio.on('logcat_unsubscribe')
+def handle_logcat_unsubscribe(data):
+    reader = logcat_readers.get((data or {}).get('deviceId'))
+    if reader:
+        reader.unsubscribe(request.sid)
+    return {'status': 'unsubscribed'}
+
+# Device worker processes (DEVICE_WORKERS > 0)
+#
+# Each device is pinned to a worker process that owns its Frida device, sessions and
+# scripts, so message callbacks for different devices run on different cores. The
+# coordinator keeps the REST and Socket.IO front end; perform_hook, unhook_session,
+# run_rpc_calls and list_rpc_exports hand the call to the owning worker. Inside a worker,
+# socketio, subscriptions, log_index and device_monitor are replaced by a WorkerChannel
+# that sends emits, log records and hooked-app changes back over the pipe in batches.
+# Detached sessions are reported to the coordinator, whose supervisor restores them.
+# /metrics, /api/message-stats and /api/script-cache ask every worker for its share.
+
+def drain_batch(outbox, size, interval, wait=None):
+    """Wait up to `wait` seconds for an item, then take more for up to `interval` or `size` items"""
+    try:
+        batch = [outbox.get(timeout=wait)]
+    except queue.Empty:
+        return []
+    deadline = time.monotonic() + interval
+    while len(batch) < size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(outbox.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+def run_operation(operations, operation, kwargs):
+    """Run a forwarded operation and return (ok, result), errors as dicts worker_error rebuilds"""
+    try:
+        return True, operations[operation](**kwargs)
+    except HookError as e:
+        return False, {'type': 'HookError', 'error': str(e), 'status': e.status, 'suggestions': e.suggestions}
+    except RpcError as e:
+        return False, {'type': 'RpcError', 'error': str(e), 'status': e.status}
+    except Exception as e:
+        return False, {'type': type(e).__name__, 'error': str(e)}
+
+WORKER_DROPPABLE_EVENTS = ('emit', 'publish', 'log')
+
+class WorkerChannel:
+    """A device worker's link to the coordinator
+
+    Stands in for socketio, subscriptions, log_index and device_monitor inside the worker process.
+    Emits, publishes and log records wait in an outbox bounded by MESSAGE_QUEUE_SIZE under
+    MESSAGE_DROP_POLICY; session changes are never dropped.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.outbox = collections.deque()
+        self.ready = threading.Condition()
+        self.queued = 0   # Droppable events in the outbox
+        self.dropped = 0
+        self.send_lock = threading.Lock()
+        self.started = False
+
+    def _queue(self, event):
+        with self.ready:
+            if event[0] in WORKER_DROPPABLE_EVENTS:
+                if MESSAGE_DROP_POLICY == 'block' and self.queued >= MESSAGE_QUEUE_SIZE:
+                    # Backpressure: stall the producer briefly to let the sender catch up
+                    self.ready.wait_for(lambda: self.queued < MESSAGE_QUEUE_SIZE, MESSAGE_BLOCK_TIMEOUT)
+                if self.queued >= MESSAGE_QUEUE_SIZE:
+                    self.dropped += 1
+                    if MESSAGE_DROP_POLICY != 'drop-oldest':
+                        return  # drop-newest, or block after its timeout expired
+                    oldest = next(i for i, queued in enumerate(self.outbox) if queued[0] in WORKER_DROPPABLE_EVENTS)
+                    del self.outbox[oldest]
+                    self.queued -= 1
+                self.queued += 1
+            self.outbox.append(event)
+            self.ready.notify_all()
+
+    def _take_batch(self):
+        """Wait for events, then up to DEVICE_WORKER_BATCH_INTERVAL for a full batch"""
+        with self.ready:
+            self.ready.wait_for(lambda: self.outbox)
+            self.ready.wait_for(lambda: len(self.outbox) >= DEVICE_WORKER_BATCH_SIZE, DEVICE_WORKER_BATCH_INTERVAL)
+            batch = [self.outbox.popleft() for _ in range(min(len(self.outbox), DEVICE_WORKER_BATCH_SIZE))]
+            self.queued -= sum(1 for event in batch if event[0] in WORKER_DROPPABLE_EVENTS)
+            self.ready.notify_all()
+        return batch
+
+    # socketio
+    def emit(self, event, data=None, **kwargs):
+        self._queue(('emit', event, data, kwargs))
+
+    # subscriptions
+    def publish(self, event, data, device_id, app_id=None):
+        self._queue(('publish', event, data, device_id, app_id))
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def start_background_task(self, target, *args, **kwargs):
+        thread = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
+        thread.start()
+        return thread
+
+    # log_index
+    def start(self):
+        if not self.started:
+            self.started = True
+            self.start_background_task(self.send_loop)
+
+    def add(self, *record):
+        self._queue(('log', record))
+
+    # device_monitor
+    def notify(self, device_id=None):
+        if device_id:
+            self._queue(('sessions', device_id, list(frida_sessions.get(device_id, {}).keys())))
+
+    # session_supervisor
+    def detached(self, device_id, app_id, reason, crash_summary):
+        self._queue(('detached', device_id, app_id, reason, crash_summary))
+
+    def stats(self):
+        with self.ready:
+            return {'queued': self.queued, 'dropped': self.dropped}
+
+    def send(self, message):
+        with self.send_lock:
+            self.conn.send(message)
+
+    def send_loop(self):
+        """Ship queued events to the coordinator, many per pipe write"""
+        while True:
+            batch = self._take_batch()
+            try:
+                self.send(('events', batch))
+            except (OSError, ValueError):
+                return  # The coordinator is gone
+
+    def handle(self, request_id, operation, kwargs):
+        """Run one coordinator request and send back its result or error"""
+        result = run_operation(WORKER_OPERATIONS, operation, kwargs)
+        try:
+            self.send(('result', request_id) + result)
+        except (OSError, ValueError):
+            pass
+
+def attach_worker_device(device_id, server_version=None):
+    connected_devices[device_id] = run_blocking(frida.get_device, device_id)
+    frida_server_versions[device_id] = server_version
+    frida_sessions.setdefault(device_id, {})
+    running_scripts.setdefault(device_id, {})
+    return True
+
+def release_worker_device(device_id):
+    release_device_sessions(device_id)
+    connected_devices.pop(device_id, None)
+    frida_server_versions.pop(device_id, None)
+    with app_indexes_lock:
+        app_indexes.pop(device_id, None)
+    with process_indexes_lock:
+        process_indexes.pop(device_id, None)
+    return True
+
+def worker_stats():
+    with message_pipelines_lock:
+        pipelines = [p for apps in message_pipelines.values() for p in apps.values()]
+    return {'pipelines': [p.stats() for p in pipelines], 'outbox': worker_channel.stats()}
+
+WORKER_OPERATIONS = {
+    'attach_device': attach_worker_device,
+    'release_device': release_worker_device,
+    'hook': perform_hook,
+    'unhook': unhook_session,
+    'rpc': run_rpc_calls,
+    'exports': list_rpc_exports_sync,
+    'stats': worker_stats,
+    'metrics': metrics.snapshot,
+    'script_cache_stats': script_cache.stats,
+    'script_cache_clear': script_cache.clear,
+}
+
+def device_worker_main(index, conn):
+    """Entry point of a device worker process"""
+    global socketio, log_index, device_monitor, subscriptions, worker_channel
+    channel = WorkerChannel(conn)
+    socketio = log_index = device_monitor = subscriptions = worker_channel = channel
+    channel.start()
+    logger.info(f"Device worker {index} started (pid {os.getpid()})")
+
+    executor = ThreadPoolExecutor(max_workers=DEVICE_WORKER_THREADS, thread_name_prefix=f'device-worker-{index}')
+    while True:
+        try:
+            request_id, operation, kwargs = conn.recv()
+        except (EOFError, OSError):
+            break
+        executor.submit(channel.handle, request_id, operation, kwargs)
+
+    logger.info(f"Device worker {index} lost its coordinator, exiting")
+    os._exit(0)
+
+def worker_error(error):
+    """Rebuild the exception a worker reported"""
+    if error['type'] == 'HookError':
+        return HookError(error['error'], error['status'], error.get('suggestions'))
+    if error['type'] == 'RpcError':
+        return RpcError(error['error'], error['status'])
+    return RuntimeError(error['error'])
+
+class DeviceWorkerPool:
+    """Worker processes that each own the Frida sessions of the devices pinned to them"""
+
+    def __init__(self, size):
+        self.size = size
+        self.workers = []
+        self.owners = {}   # device_id -> worker index
+        self.pending = {}  # request_id -> waiter
+        self.hooked = {}   # device_id -> apps hooked in its worker, mirrored for device infos
+        self.lock = threading.Lock()
+        self.context = multiprocessing.get_context('spawn')
+        self.stopping = False
+
+    def start(self):
+        for index in range(self.size):
+            self.workers.append(self._start_worker(index))
+        # Workers die with the coordinator; don't restart them on the way out
+        atexit.register(self.stop)
+
+    def _start_worker(self, index):
+        parent_conn, child_conn = self.context.Pipe()
+        # Workers import this module again; the flag keeps them off the event loop
+        os.environ['TRISHUL_DEVICE_WORKER'] = str(index)
+        try:
+            process = self.context.Process(target=device_worker_main, args=(index, child_conn),
+                                           name=f'device-worker-{index}', daemon=True)
+            process.start()
+        finally:
+            os.environ.pop('TRISHUL_DEVICE_WORKER', None)
+        child_conn.close()
+
+        worker = {'index': index, 'process': process, 'conn': parent_conn, 'send_lock': threading.Lock(), 'startedAt': time.time()}
+        # The pipe blocks, so it is read from a real OS thread
+        deliver = from_native_thread(self._deliver)
+        if ASYNC_MODE == 'gevent':
+            gevent.get_hub().threadpool.spawn(self._read_loop, worker, deliver)
+        else:
+            threading.Thread(target=self._read_loop, args=(worker, deliver), daemon=True).start()
+        return worker
+
+    def _read_loop(self, worker, deliver):
+        while True:
+            try:
+                message = worker['conn'].recv()
+            except (EOFError, OSError):
+                deliver(('exit', worker))
+                return
+            deliver(message)
+
+    def _deliver(self, message):
+        kind = message[0]
+        if kind == 'result':
+            _, request_id, ok, value = message
+            waiter = self.pending.pop(request_id, None)
+            if waiter:
+                waiter['result'] = (ok, value)
+                waiter['done'].set()
+        elif kind == 'events':
+            for event in message[1]:
+                if event[0] == 'emit':
+                    socketio.emit(event[1], event[2], **event[3])
+                elif event[0] == 'publish':
+                    subscriptions.publish(*event[1:])
+                elif event[0] == 'log':
+                    log_index.add(*event[1])
+                elif event[0] == 'sessions':
+                    self.hooked[event[1]] = event[2]
+                    device_monitor.notify(event[1])
+                elif event[0] == 'detached':
+                    session_supervisor.detached(*event[1:])
+        elif kind == 'exit':
+            self._worker_exited(message[1])
+
+    def _worker_exited(self, worker):
+        index = worker['index']
+        if self.stopping or self.workers[index] is not worker:
+            return
+        worker['process'].join(timeout=1)
+        logger.error(f"Device worker {index} exited with code {worker['process'].exitcode}, restarting it")
+        for waiter in [w for w in self.pending.values() if w['worker'] is worker]:
+            waiter['result'] = (False, {'type': 'RuntimeError', 'error': f'Device worker {index} exited'})
+            waiter['done'].set()
+
+        # Hooks died with the process; bring the devices back up in a fresh one
+        self.workers[index] = self._start_worker(index)
+        devices = [device_id for device_id, owner in self.owners.items() if owner == index]
+        for device_id in devices:
+            self.hooked.pop(device_id, None)
+            device_monitor.notify(device_id)
+            subscriptions.publish('status', {'message': f'[Device: {device_id}] Device worker {index} restarted'}, device_id)
+            if device_id in connected_devices:
+                socketio.start_background_task(self._recover, device_id)
+
+    def _recover(self, device_id):
+        """Attach a device to its restarted worker, then let the supervisor restore its hooks"""
+        try:
+            self.call(device_id, 'attach_device', server_version=frida_server_versions.get(device_id))
+        except Exception as e:
+            logger.error(f"[Device: {device_id}] Could not attach to restarted device worker: {str(e)}")
+        for app_id in session_supervisor.apps(device_id):
+            subscriptions.publish('session_detached', {'deviceId': device_id, 'appId': app_id, 'reason': 'worker-exited', 'crash': None},
+                                  device_id, app_id)
+            session_supervisor.detached(device_id, app_id, 'worker-exited', None)
+
+    def worker_for(self, device_id):
+        """The worker owning a device, pinning it to the least loaded one on first use"""
+        with self.lock:
+            if device_id not in self.owners:
+                load = collections.Counter(self.owners.values())
+                self.owners[device_id] = min(range(self.size), key=lambda index: load[index])
+            return self.workers[self.owners[device_id]]
+
+    def call(self, device_id, operation, timeout=None, **kwargs):
+        return self.call_worker(self.worker_for(device_id), operation, timeout, device_id=device_id, **kwargs)
+
+    def call_worker(self, worker, operation, timeout=None, **kwargs):
+        """Run an operation in a worker and wait for its result, re-raising its errors"""
+        request_id = uuid.uuid4().hex
+        waiter = {'done': threading.Event(), 'result': None, 'worker': worker}
+        self.pending[request_id] = waiter
+        try:
+            with worker['send_lock']:
+                run_blocking(worker['conn'].send, (request_id, operation, kwargs))
+            if not waiter['done'].wait(timeout or DEVICE_WORKER_TIMEOUT):
+                raise RuntimeError(f"Device worker {worker['index']} did not answer {operation} in time")
+        finally:
+            self.pending.pop(request_id, None)
+
+        ok, value = waiter['result']
+        if ok:
+            return value
+        raise worker_error(value)
+
+    def call_all(self, operation, **kwargs):
+        results = []
+        for worker in list(self.workers):
+            try:
+                results.append(self.call_worker(worker, operation, **kwargs))
+            except Exception as e:
+                logger.warning(f"Device worker {worker['index']} could not run {operation}: {str(e)}")
+        return results
+
+    def release(self, device_id):
+        """Drop a disconnected device from its worker"""
+        try:
+            if device_id in self.owners:
+                self.call(device_id, 'release_device')
+        finally:
+            with self.lock:
+                self.owners.pop(device_id, None)
+            self.hooked.pop(device_id, None)
+
+    def stop(self):
+        self.stopping = True
+        for worker in self.workers:
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+
+    def stats(self):
+        return [{
+            'index': worker['index'],
+            'pid': worker['process'].pid,
+            'alive': worker['process'].is_alive(),
+            'startedAt': worker['startedAt'],
+            'devices': sorted(device_id for device_id, owner in self.owners.items() if owner == worker['index']),
+            'pending': sum(1 for waiter in list(self.pending.values()) if waiter['worker'] is worker)
+        } for worker in self.workers]
+
+@app.route('/api/workers', methods=['GET'])
+def get_device_workers():
+    """Device worker processes and the devices pinned to each"""
+    return jsonify(device_workers.stats() if device_workers else [])
+
+# Node agents (NODE_CENTRAL) and the central instance they register with (NODE_LISTEN)
+#
+# Labs with phones on several USB hosts run one Trishul per host as a node agent. Each
+# agent keeps one TCP link to the central instance; frames are length-prefixed JSON,
+# zlib-compressed from NODE_COMPRESS_MIN bytes, and carry any number of concurrent
+# requests by id. Agents relay their Socket.IO broadcasts, scoped events and log records
+# in batches.
+# The central merges node devices into /api/devices and answers any /api request about
+# a node's device (deviceId in the body or query, device_id in the URL, or a jobId or
+# streamId the node handed out) by replaying it against the node's own routes.
+# Streamed responses (trace replay NDJSON) come back as chunk frames, and the agent only
+# runs NODE_STREAM_WINDOW chunks ahead of the client reading them on the central.
+
+def node_json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {'$bytes': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def node_json_object(value):
+    if len(value) == 1 and '$bytes' in value:
+        return base64.b64decode(value['$bytes'])
+    return value
+
+class NodeLink:
+    """One agent <-> central connection with multiplexed requests"""
+
+    HEADER = struct.Struct('>IB')  # Payload length, compressed flag
+    HELLO_FRAME = 64 * 1024  # Limit before the peer has proven it knows NODE_TOKEN
+    MAX_FRAME = 512 * 1024 * 1024
+
+    def __init__(self, sock, address, name=None):
+        self.sock = sock
+        self.address = address
+        self.name = name
+        self.max_frame = self.HELLO_FRAME  # Raised to MAX_FRAME once registration succeeds
+        self.send_lock = threading.Lock()
+        self.pending = {}  # request_id -> waiter
+        self.streams = {}  # request_id -> queue of a streamed response's chunks, None at the end
+        self.connected_at = time.time()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.bytes_uncompressed = 0  # Both directions before compression, to report the ratio
+        self.closed = False
+
+    def send(self, message):
+        data = json.dumps(message, default=node_json_default, separators=(',', ':')).encode('utf-8')
+        compressed = len(data) >= NODE_COMPRESS_MIN
+        payload = zlib.compress(data, NODE_COMPRESS_LEVEL) if compressed else data
+        with self.send_lock:
+            self.sock.sendall(self.HEADER.pack(len(payload), compressed) + payload)
+            self.bytes_sent += self.HEADER.size + len(payload)
+            self.bytes_uncompressed += self.HEADER.size + len(data)
+
+    def recv_exact(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(min(size - len(data), 1024 * 1024))
+            if not chunk:
+                raise ConnectionError('Connection closed')
+            data += chunk
+        return bytes(data)
+
+    def recv(self):
+        size, compressed = self.HEADER.unpack(self.recv_exact(self.HEADER.size))
+        if size > self.max_frame:
+            raise ConnectionError(f'Frame of {size} bytes is too large')
+        payload = self.recv_exact(size)
+        data = payload
+        if compressed:
+            # Cap the output too, so a small compressed frame can't expand without bound
+            decompressor = zlib.decompressobj()
+            try:
+                data = decompressor.decompress(payload, self.max_frame)
+            except zlib.error as e:
+                raise ConnectionError(f'Corrupt frame: {str(e)}')
+            if decompressor.unconsumed_tail:
+                raise ConnectionError(f'Frame decompresses to more than {self.max_frame} bytes')
+        self.bytes_received += self.HEADER.size + size
+        self.bytes_uncompressed += self.HEADER.size + len(data)
+        return json.loads(data, object_hook=node_json_object)
+
+    def call(self, operation, timeout=None, **kwargs):
+        """Run an operation on the other side and wait for its result, re-raising its errors"""
+        request_id = uuid.uuid4().hex
+        waiter = {'done': threading.Event(), 'result': None}
+        self.pending[request_id] = waiter
+        try:
+            with metrics.timer('trishul_node_request_seconds', node=self.name, operation=operation):
+                self.send(['call', request_id, operation, kwargs])
+                if not waiter['done'].wait(timeout or NODE_TIMEOUT):
+                    raise RuntimeError(f"Node {self.name} did not answer {operation} in time")
+        finally:
+            self.pending.pop(request_id, None)
+
+        ok, value = waiter['result']
+        if ok:
+            return value
+        raise worker_error(value)
+
+    def resolve(self, request_id, ok, value):
+        waiter = self.pending.pop(request_id, None)
+        if waiter:
+            if ok and isinstance(value, dict) and value.get('stream') == request_id:
+                # Chunks follow the result on this link, so queue them before anyone can miss one
+                self.streams[request_id] = queue.Queue()
+            waiter['result'] = (ok, value)
+            waiter['done'].set()
+
+    def push_chunk(self, stream_id, chunk):
+        chunks = self.streams.get(stream_id)
+        if chunks is not None:
+            chunks.put(chunk)  # Dropped once the reader has gone away
+
+    def read_stream(self, stream_id):
+        """Yield a streamed response's chunks, granting the agent one more for each one read"""
+        chunks = self.streams.get(stream_id)
+        finished = False
+        try:
+            while chunks is not None:
+                chunk = chunks.get()
+                if chunk is None:
+                    finished = True
+                    return
+                yield chunk
+                self.send(['credit', stream_id])
+        except OSError:
+            pass
+        finally:
+            self.streams.pop(stream_id, None)
+            if not finished and not self.closed:
+                try:
+                    self.send(['cancel', stream_id])
+                except OSError:
+                    pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        for request_id in list(self.pending):
+            self.resolve(request_id, False, {'type': 'RuntimeError', 'error': f'Node {self.name} disconnected'})
+        for chunks in list(self.streams.values()):
+            chunks.put(None)
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'address': self.address,
+            'connectedAt': self.connected_at,
+            'pending': len(self.pending),
+            'bytesSent': self.bytes_sent,
+            'bytesReceived': self.bytes_received,
+            'compressionRatio': round(self.bytes_uncompressed / (self.bytes_sent + self.bytes_received), 2)
+                                if self.bytes_sent + self.bytes_received else None
+        }
+
+def parse_node_address(address, default_host):
+    host, _, port = address.rpartition(':')
+    return host or default_host, int(port)
+
+def open_node_request(method, path, body, content_type):
+    """Run a request through this instance's own routes, leaving a streamed body unread"""
+    return app.test_client().open(path, method=method, data=body, content_type=content_type)
+
+def run_node_request(method, path, body, content_type):
+    """Serve a request proxied by the central instance, buffering the whole body"""
+    response = open_node_request(method, path, body, content_type)
+    return {'status': response.status_code, 'contentType': response.content_type, 'body': response.get_data()}
+
+def node_devices():
+    return device_monitor.snapshot() or []
+
+class NodeAgent:
+    """Keeps this instance registered with the central instance at NODE_CENTRAL"""
+
+    def __init__(self, address):
+        self.address = parse_node_address(address, '127.0.0.1')
+        self.outbox = queue.Queue(maxsize=NODE_QUEUE_SIZE)
+        self.link = None
+        self.streams = {}  # request_id -> {'credit': Semaphore, 'cancelled': bool} per relayed streaming response
+        self.dropped = 0
+        self.started = False
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        self._relay()
+        socketio.start_background_task(self._run)
+        socketio.start_background_task(self._send_loop)
+
+    def _relay(self):
+        """Copy broadcasts, scoped events and indexed log records to the central while linked"""
+        local_emit, local_publish, local_add = socketio.emit, subscriptions.publish, log_index.add
+
+        def emit(event, *args, **kwargs):
+            local_emit(event, *args, **kwargs)
+            if not kwargs.get('to') and not kwargs.get('room'):
+                self.queue_event(['emit', event, args[0] if args else None])
+
+        def publish(event, data, device_id, app_id=None):
+            self.queue_event(['publish', event, data, device_id, app_id])
+            return local_publish(event, data, device_id, app_id)
+
+        def add(*record):
+            local_add(*record)
+            self.queue_event(['log', record])
+
+        socketio.emit = emit
+        subscriptions.publish = publish
+        log_index.add = add
+
+    def queue_event(self, event):
+        if self.link is None:
+            return
+        try:
+            self.outbox.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        backoff = 1
+        host, port = self.address
+        while True:
+            link = None
+            try:
+                sock = socket.create_connection(self.address, timeout=NODE_TIMEOUT)
+                sock.settimeout(NODE_HEARTBEAT * 3)  # Pongs answer our pings, so silence means a dead link
+                link = NodeLink(sock, f'{host}:{port}', NODE_NAME)
+                link.send(['hello', {'name': NODE_NAME, 'token': NODE_TOKEN, 'devices': node_devices()}])
+                reply = link.recv()
+                if reply[0] != 'welcome':
+                    raise ConnectionError(reply[1] if len(reply) > 1 else 'Registration rejected')
+                link.max_frame = NodeLink.MAX_FRAME
+                self.link = link
+                backoff = 1
+                logger.info(f"Registered as node {NODE_NAME} with central {host}:{port}")
+                self._serve(link)
+            except (OSError, ConnectionError, ValueError) as e:
+                logger.warning(f"Node link to {host}:{port} failed: {str(e)}, retrying in {backoff}s")
+            finally:
+                self.link = None
+                if link:
+                    link.close()
+            socketio.sleep(backoff)
+            backoff = min(backoff * 2, NODE_RECONNECT_MAX)
+
+    def _serve(self, link):
+        while True:
+            message = link.recv()
+            if message[0] == 'call':
+                socketio.start_background_task(self._handle, link, *message[1:])
+            elif message[0] in ('credit', 'cancel'):
+                stream = self.streams.get(message[1])
+                if stream:
+                    stream['cancelled'] = message[0] == 'cancel'
+                    stream['credit'].release()
+
+    def _handle(self, link, request_id, operation, kwargs):
+        if operation == 'http':
+            return self._handle_http(link, request_id, kwargs)
+        result = run_operation(NODE_OPERATIONS, operation, kwargs)
+        try:
+            link.send(['result', request_id, *result])
+        except OSError:
+            link.close()
+
+    def _handle_http(self, link, request_id, kwargs):
+        """Serve a proxied request; a streamed body follows the result as chunk frames"""
+        ok, response = run_operation({'http': open_node_request}, 'http', kwargs)
+        try:
+            if not ok:
+                link.send(['result', request_id, False, response])
+                return
+            # The test client wraps every body in an iterator, but only generated ones lack a length
+            if 'Content-Length' in response.headers:
+                link.send(['result', request_id, True, {'status': response.status_code, 'contentType': response.content_type,
+                                                        'body': response.get_data()}])
+                return
+
+            stream = self.streams[request_id] = {'credit': threading.Semaphore(NODE_STREAM_WINDOW), 'cancelled': False}
+            link.send(['result', request_id, True, {'status': response.status_code, 'contentType': response.content_type,
+                                                    'stream': request_id}])
+            chunk = bytearray()
+            for data in response.iter_encoded():
+                chunk += data
+                if len(chunk) >= NODE_STREAM_CHUNK:
+                    if not self._send_chunk(link, request_id, stream, chunk):
+                        break
+                    chunk = bytearray()
+            else:
+                if chunk:
+                    self._send_chunk(link, request_id, stream, chunk)
+            link.send(['chunk', request_id, None])
+        except OSError:
+            link.close()
+        finally:
+            self.streams.pop(request_id, None)
+            if ok:
+                response.close()
+
+    def _send_chunk(self, link, request_id, stream, chunk):
+        """Wait for the central to have room for another chunk, False once it stops reading"""
+        if not stream['credit'].acquire(timeout=NODE_TIMEOUT) or stream['cancelled']:
+            return False
+        link.send(['chunk', request_id, bytes(chunk)])
+        return True
+
+    def _send_loop(self):
+        """Ship relayed events in batches, and ping every NODE_HEARTBEAT even while busy
+
+        Only pongs come back on an agent's link, so a link streaming events nonstop
+        still needs its pings or it would time out after three heartbeats.
+        """
+        last_ping = time.monotonic()
+        while True:
+            wait = max(0, last_ping + NODE_HEARTBEAT - time.monotonic())
+            batch = drain_batch(self.outbox, NODE_BATCH_SIZE, NODE_BATCH_INTERVAL, wait)
+            link = self.link
+            if link is None:
+                last_ping = time.monotonic()
+                continue
+            try:
+                if batch:
+                    link.send(['events', batch])
+                if time.monotonic() - last_ping >= NODE_HEARTBEAT:
+                    link.send(['ping'])
+                    last_ping = time.monotonic()
+            except OSError:
+                link.close()
+
+    def stats(self):
+        link = self.link
+        return dict(link.stats() if link else {'address': '%s:%d' % self.address}, connected=link is not None,
+                    queued=self.outbox.qsize(), dropped=self.dropped)
+
+NODE_OPERATIONS = {
+    'rpc_call': handle_rpc_call,  # 'http' is served by NodeAgent._handle_http so it can stream
+}
+
+class NodeHub:
+    """Accepts node agents on NODE_LISTEN and tracks the devices each one owns"""
+
+    ROUTE_HISTORY = 10000  # jobId/streamId -> node entries kept for follow-up requests
+
+    def __init__(self, address):
+        self.address = parse_node_address(address, '0.0.0.0')
+        self.nodes = {}    # name -> NodeLink
+        self.devices = {}  # name -> {serial: device info}
+        self.routes = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def start(self):
+        listener = socket.create_server(self.address)
+        socketio.start_background_task(self._accept_loop, listener)
+
+    def _accept_loop(self, listener):
+        while True:
+            sock, address = listener.accept()
+            socketio.start_background_task(self._serve, sock, f'{address[0]}:{address[1]}')
+
+    def _serve(self, sock, address):
+        sock.settimeout(NODE_HEARTBEAT * 3)
+        link = NodeLink(sock, address)
+        try:
+            message = link.recv()
+            hello = message[1] if message[0] == 'hello' and isinstance(message[1], dict) else {}
+            if not hmac.compare_digest(str(hello.get('token', '')), NODE_TOKEN) or not hello:
+                logger.warning(f"Rejected node agent from {address}: invalid token")
+                link.send(['rejected', 'Invalid node token'])
+                return
+            link.max_frame = NodeLink.MAX_FRAME
+            link.name = str(hello.get('name') or address)
+            with self.lock:
+                previous = self.nodes.get(link.name)
+                self.nodes[link.name] = link
+            if previous:
+                previous.close()
+            link.send(['welcome', {'name': NODE_NAME}])
+            self._apply_update(link, {'added': hello.get('devices') or [], 'changed': [], 'removed': []}, replace=True)
+            logger.info(f"Node {link.name} registered from {address}")
+            socketio.emit('status', {'message': f'Node {link.name} connected from {address}'})
+
+            while True:
+                message = link.recv()
+                if message[0] == 'result':
+                    link.resolve(*message[1:])
+                elif message[0] == 'chunk':
+                    link.push_chunk(*message[1:])
+                elif message[0] == 'events':
+                    for event in message[1]:
+                        self._deliver(link, event)
+                elif message[0] == 'ping':
+                    link.send(['pong'])
+        except Exception as e:
+            logger.warning(f"Node {link.name or address} disconnected: {str(e)}")
+        finally:
+            link.close()
+            self._forget(link)
+
+    def _forget(self, link):
+        with self.lock:
+            if self.nodes.get(link.name) is not link:
+                return  # Replaced by a newer link from the same node
+            del self.nodes[link.name]
+            removed = sorted(self.devices.pop(link.name, {}))
+        if removed:
+            socketio.emit('device_update', {'added': [], 'changed': [], 'removed': removed})
+        socketio.emit('status', {'message': f'Node {link.name} disconnected'})
+
+    def _deliver(self, link, event):
+        if event[0] == 'log':
+            log_index.add(*event[1])
+        elif event[0] == 'publish':
+            subscriptions.publish(*event[1:])
+        elif event[1] == 'device_update':
+            self._apply_update(link, event[2])
+        else:
+            socketio.emit(event[1], event[2])
+
+    def _apply_update(self, link, update, replace=False):
+        """Fold a node's device_update into its inventory and pass it on, tagged with the node"""
+        tag = lambda info: dict(info, node=link.name)
+        added = [tag(info) for info in update.get('added', [])]
+        changed = [tag(info) for info in update.get('changed', [])]
+        removed = list(update.get('removed', []))
+        with self.lock:
+            if self.nodes.get(link.name) is not link:
+                return
+            devices = self.devices.setdefault(link.name, {})
+            if replace:
+                removed = sorted(set(devices) - {info['id'] for info in added})
+                devices.clear()
+            for info in added + changed:
+                devices[info['id']] = info
+            for serial in removed:
+                devices.pop(serial, None)
+        if added or changed or removed:
+            socketio.emit('device_update', {'added': added, 'changed': changed, 'removed': removed})
+
+    def device_list(self):
+        """Infos of node devices not also attached to this instance"""
+        with self.lock:
+            infos = [info for devices in self.devices.values() for info in devices.values()]
+        return sorted((info for info in infos if info['id'] not in device_monitor.states), key=lambda info: info['id'])
+
+    def owner(self, device_id):
+        """The link of the node owning a device this instance doesn't have, if any"""
+        if not device_id or device_id in device_monitor.states or device_id in connected_devices:
+            return None
+        with self.lock:
+            for name, devices in self.devices.items():
+                if device_id in devices:
+                    return self.nodes.get(name)
+        return None
+
+    def route(self):
+        """The node that should serve the current request, if any"""
+        view_args = request.view_args or {}
+        for key in ('job_id', 'stream_id'):
+            if key in view_args:
+                name = self.routes.get(view_args[key])
+                return self.nodes.get(name) if name else None
+        data = request.get_json(silent=True)
+        device_id = view_args.get('device_id') or request.args.get('deviceId')
+        if not device_id and isinstance(data, dict):
+            device_id = data.get('deviceId')
+        if not device_id and request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+            request.get_data()  # Cache the body first so it can still be proxied once the form is parsed
+            device_id = request.form.get('deviceId')
+        return self.owner(device_id)
+
+    def split(self, data):
+        """Group the devices a batch request names (deviceIds, targets) by owning node, None for ours"""
+        device_ids = list(data.get('deviceIds') or [])
+        device_ids += [target.get('deviceId') for target in data.get('targets') or [] if isinstance(target, dict)]
+        groups = collections.OrderedDict()
+        for device_id in device_ids:
+            groups.setdefault(self.owner(device_id), []).append(device_id)
+        return groups
+
+    def remember(self, link, response):
+        """Note job and stream ids a node handed out so polling them reaches the same node"""
+        if response['contentType'] != 'application/json' or 'body' not in response:
+            return
+        try:
+            body = json.loads(response['body'])
+        except ValueError:
+            return
+        if not isinstance(body, dict):
+            return
+        with self.lock:
+            for key in ('jobId', 'streamId'):
+                if body.get(key):
+                    self.routes[body[key]] = link.name
+            while len(self.routes) > self.ROUTE_HISTORY:
+                self.routes.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            nodes = list(self.nodes.values())
+            counts = {name: len(devices) for name, devices in self.devices.items()}
+        return [dict(link.stats(), devices=counts.get(link.name, 0)) for link in nodes]
+
+@app.before_request
+def proxy_node_request():
+    """Hand /api requests about a node's device to that node"""
+    if not node_hub or not request.path.startswith('/api/'):
+        return None
+    link = node_hub.route()
+    if link is None:
+        data = request.get_json(silent=True)
+        groups = node_hub.split(data) if isinstance(data, dict) else {}
+        if len(groups) > 1 and request.path == '/api/provision':
+            return provision_across_nodes(data, groups)
+        if len(groups) > 1:
+            nodes = sorted(link.name if link else NODE_NAME for link in groups)
+            return jsonify({'error': f"Devices span {', '.join(nodes)}, send one request per node"}), 400
+        link = next(iter(groups), None)
+        if link is None:
+            return None
+    try:
+        response = link.call('http', method=request.method, path=request.full_path,
+                             body=request.get_data(), content_type=request.content_type)
+    except Exception as e:
+        return jsonify({'error': f"[Node: {link.name}] {str(e)}"}), 502
+    if response.get('stream'):
+        return Response(link.read_stream(response['stream']), status=response['status'], content_type=response['contentType'])
+    node_hub.remember(link, response)
+    return Response(response['body'], status=response['status'], content_type=response['contentType'])
+
+def provision_across_nodes(data, groups):
+    """Provision each node's share of deviceIds on that node and merge the results"""
+    path = request.full_path
+    
+    def provision_group(group):
+        link, device_ids = group
+        body = json.dumps(dict(data, deviceIds=device_ids))
+        try:
+            if link is None:
+                response = run_node_request('POST', path, body, 'application/json')
+            else:
+                response = link.call('http', method='POST', path=path, body=body, content_type='application/json')
+            reply = json.loads(response['body'])
+        except Exception as e:
+            reply = {'error': str(e)}
+        if isinstance(reply.get('results'), list):
+            return reply['results']
+        error = reply.get('error') or 'Provisioning failed'
+        if link is not None:
+            error = f"[Node: {link.name}] {error}"
+        return [{'deviceId': device_id, 'status': 'error', 'error': error} for device_id in device_ids]
+    
+    with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+        results = [result for group in executor.map(provision_group, groups.items()) for result in group]
+    
+    return jsonify({
+        'results': results,
+        'pushed': sum(1 for r in results if r.get('pushed')),
+        'failed': sum(1 for r in results if r['status'] == 'error')
+    })
+
+@app.route('/api/nodes', methods=['GET'])
+def get_nodes():
+    """Node agents registered here, and this instance's own link when it is an agent"""
+    return jsonify({
+        'nodes': node_hub.stats() if node_hub else [],
+        'central': node_agent.stats() if node_agent else None
+    })
 
 # Check for ADB
 def check_prerequisites():
@@ -891,6 +6105,7 @@ def check_prerequisites():
 
 def main():
     """Main entry point with proper error handling"""
+    global device_workers, node_hub, node_agent
     try:
         logger.info(f"Starting server on {HOST}:{PORT} (Debug: {DEBUG})")
         
@@ -899,8 +6114,37 @@ def main():
             logger.error("Prerequisites check failed. Please install Android Debug Bridge (ADB) tools")
             sys.exit(1)
             
+        # Track devices in the background so /api/devices never blocks on adb
+        device_monitor.start()
+        log_index.start()
+        
+        # Hash the frida-server binaries once so provisioning can compare them with devices
+        probe_executor.submit(binary_catalog.scan)
+        
+        if ASYNC_MODE == 'gevent':
+            # Each device worker's pipe reader holds one of the pool's threads
+            gevent.get_hub().threadpool.maxsize = BLOCKING_WORKERS + DEVICE_WORKERS
+        
+        # Move Frida sessions into worker processes, one pinned owner per device
+        if DEVICE_WORKERS > 0:
+            device_workers = DeviceWorkerPool(DEVICE_WORKERS)
+            device_workers.start()
+            logger.info(f"Started {DEVICE_WORKERS} device worker processes")
+        
+        # Accept node agents from other USB hosts, and/or register with a central instance
+        if NODE_LISTEN:
+            if not NODE_TOKEN:
+                logger.error("NODE_LISTEN requires NODE_TOKEN, otherwise any host that can reach it could register as a node")
+                sys.exit(1)
+            node_hub = NodeHub(NODE_LISTEN)
+            node_hub.start()
+            logger.info(f"Accepting node agents on {NODE_LISTEN}")
+        if NODE_CENTRAL:
+            node_agent = NodeAgent(NODE_CENTRAL)
+            node_agent.start()
+        
         # Start the server
-        logger.info(f"Server starting with Flask-SocketIO on {HOST}:{PORT}")
+        logger.info(f"Server starting with Flask-SocketIO ({ASYNC_MODE}) on {HOST}:{PORT}")
         socketio.run(app, host=HOST, port=PORT, debug=DEBUG)
         
     except Exception as e:
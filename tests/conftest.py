@@ -0,0 +1,30 @@
+"""
+Import server.py against the stand-in frida package from benchmarks/fakes
+
+The server creates its log, upload and trace directories on import, so they are pointed
+at a temporary directory before the module is loaded.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKES_DIR = os.path.join(ROOT, 'benchmarks', 'fakes')
+
+WORK_DIR = tempfile.mkdtemp(prefix='trishul-tests-')
+os.environ.update({
+    'ASYNC_MODE': 'threading',
+    'ADB_TRANSPORT': 'subprocess',
+    'DEVICE_WORKERS': '0',
+    'LOGS_DIR': os.path.join(WORK_DIR, 'logs'),
+    'UPLOADS_DIR': os.path.join(WORK_DIR, 'uploads'),
+})
+sys.path[:0] = [FAKES_DIR, ROOT]
+
+@pytest.fixture(scope='session')
+def server():
+    import server as module
+    return module
@@ -0,0 +1,42 @@
+import zlib
+
+import msgpack
+
+def test_parse_flag_matches_env_flags(server):
+    assert server.parse_flag(None) is False
+    assert server.parse_flag(None, True) is True
+    assert server.parse_flag(True) is True
+    assert server.parse_flag('TRUE') is True
+    assert server.parse_flag('1') is False
+    assert server.parse_flag('false', True) is False
+
+def test_fts_query_requires_every_term(server):
+    assert server.fts_query('open file') == '"open" AND "file"'
+    assert server.fts_query('libc*') == '"libc"*'
+    assert server.fts_query('say "hi"') == '"say" AND """hi"""'
+
+def test_fts_query_drops_terms_without_text(server):
+    assert server.fts_query('*') == ''
+    assert server.fts_query('** -- ...') == ''
+    assert server.fts_query('-- ssl') == '"ssl"'
+
+def test_wire_encoding_defaults_to_json(server):
+    assert server.wire_encoding({}) == 'json'
+    assert server.wire_encoding({'encoding': 'cbor'}) == 'json'
+    assert server.wire_encoding({'encoding': 'msgpack'}) == 'msgpack'
+    assert server.wire_encoding({'encoding': 'msgpack', 'compression': 'gzip,deflate'}) == 'msgpack+deflate'
+
+def test_pack_event_keeps_bytes_as_bin_fields(server):
+    data = {'messages': [{'payload': 'hello'}], 'data': b'\x00\xff'}
+    frame = server.pack_event(data)
+    assert frame[:1] == b'\x00'
+    assert msgpack.unpackb(frame[1:], raw=False) == data
+
+def test_pack_event_deflates_large_frames_only(server):
+    small = server.pack_event({'payload': 'x'}, deflate=True)
+    assert small[:1] == b'\x00'
+
+    data = {'payload': 'x' * (server.WIRE_COMPRESS_MIN * 4)}
+    frame = server.pack_event(data, deflate=True)
+    assert frame[:1] == b'\x01'
+    assert msgpack.unpackb(zlib.decompress(frame[1:]), raw=False) == data
@@ -0,0 +1,48 @@
+import socket
+import zlib
+
+import pytest
+
+@pytest.fixture
+def links(server):
+    left, right = socket.socketpair()
+    left.settimeout(5)
+    right.settimeout(5)
+    sender, receiver = server.NodeLink(left, 'left'), server.NodeLink(right, 'right')
+    yield sender, receiver
+    sender.close()
+    receiver.close()
+
+def test_frames_round_trip_with_bytes(links):
+    sender, receiver = links
+    message = ['call', 'abc', 'http', {'body': b'\x00\x01binary', 'path': '/api/devices'}]
+    sender.send(message)
+    assert receiver.recv() == message
+
+def test_large_frames_are_compressed(server, links):
+    sender, receiver = links
+    message = ['events', [['log', ['x' * 100]] for _ in range(100)]]
+    sender.send(message)
+    assert receiver.recv() == message
+    assert sender.bytes_sent < sender.bytes_uncompressed
+
+def test_frames_are_capped_before_registration(server, links):
+    sender, receiver = links
+    sender.sock.sendall(server.NodeLink.HEADER.pack(server.NodeLink.HELLO_FRAME + 1, 0))
+    with pytest.raises(ConnectionError, match='too large'):
+        receiver.recv()
+
+def test_decompression_output_is_capped(server, links):
+    sender, receiver = links
+    bomb = zlib.compress(b'[' + b' ' * (server.NodeLink.HELLO_FRAME * 16) + b']')
+    assert len(bomb) < server.NodeLink.HELLO_FRAME
+    sender.sock.sendall(server.NodeLink.HEADER.pack(len(bomb), 1) + bomb)
+    with pytest.raises(ConnectionError, match='decompresses'):
+        receiver.recv()
+
+def test_registered_links_accept_large_frames(server, links):
+    sender, receiver = links
+    receiver.max_frame = server.NodeLink.MAX_FRAME
+    message = ['result', 'abc', True, {'body': 'x' * (server.NodeLink.HELLO_FRAME * 2)}]
+    sender.send(message)
+    assert receiver.recv() == message
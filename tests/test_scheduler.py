@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+def test_write_slots_queue_in_arrival_order(server, monkeypatch):
+    monkeypatch.setattr(server, 'DEVICE_WRITE_SLOTS', 1)
+    scheduler = server.DeviceScheduler()
+    order = []
+
+    def operation(label, delay):
+        time.sleep(delay)
+        with scheduler.slot('device', 'write', label, timeout=5):
+            order.append(label)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=operation, args=(label, i * 0.01)) for i, label in enumerate('abc')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert order == ['a', 'b', 'c']
+
+def test_queue_timeout_raises_busy(server, monkeypatch):
+    monkeypatch.setattr(server, 'DEVICE_WRITE_SLOTS', 1)
+    scheduler = server.DeviceScheduler()
+    with scheduler.slot('device', 'write', 'hook'):
+        with pytest.raises(server.DeviceBusyError, match='timed out'):
+            scheduler.acquire('device', 'write', 'connect', timeout=0.05)
+        # Reads have their own slots
+        with scheduler.slot('device', 'read', 'apps', timeout=0.05):
+            pass
+
+def test_shared_slot_runs_members_inside_one_write_slot(server, monkeypatch):
+    monkeypatch.setattr(server, 'DEVICE_WRITE_SLOTS', 1)
+    scheduler = server.DeviceScheduler()
+    shared = server.SharedSlot(scheduler, 'device', 'write', 'batch')
+    limit = threading.BoundedSemaphore(2)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def member():
+        with limit, shared.hold(timeout=5):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=member) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    assert shared.job is None
+    assert scheduler.stats()['devices'][0]['write']['running'] == 0
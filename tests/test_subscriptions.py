@@ -0,0 +1,40 @@
+import pytest
+
+@pytest.fixture
+def rooms(server, monkeypatch):
+    emitted = []
+    monkeypatch.setattr(server, 'join_room', lambda room, sid: None)
+    monkeypatch.setattr(server, 'leave_room', lambda room, sid: None)
+    monkeypatch.setattr(server.socketio, 'emit', lambda event, data, to: emitted.append((event, to)))
+    subscriptions = server.SubscriptionRooms()
+    subscriptions.emitted = emitted
+    return subscriptions
+
+def test_new_clients_get_the_firehose(rooms):
+    rooms.connect('a')
+    assert rooms.publish('status', {}, 'device-1') is True
+    assert rooms.emitted == [('status', '*|*|*')]
+
+def test_subscribing_narrows_to_the_device(rooms):
+    rooms.connect('a')
+    assert rooms.subscribe('a', {'deviceId': 'device-1'}) == ['device-1|*|*']
+    assert rooms.publish('status', {}, 'device-2') is False
+    assert rooms.publish('status', {}, 'device-1') is True
+    assert rooms.emitted == [('status', 'device-1|*|*')]
+
+def test_overlapping_rooms_address_each_client_once(rooms):
+    rooms.connect('a')
+    rooms.subscribe('a', {'deviceId': 'device-1'})
+    rooms.subscribe('a', {'deviceId': 'device-1', 'appId': 'com.app', 'events': ['frida_batch']})
+    rooms.publish('frida_batch', {}, 'device-1', 'com.app')
+    assert rooms.emitted == [('frida_batch', 'a')]
+
+def test_packed_clients_get_frames(server, rooms):
+    rooms.connect('a', 'msgpack')
+    rooms.publish('frida_batch', {'messages': []}, 'device-1')
+    assert rooms.emitted == [('frida_batch', '*|*|*#msgpack')]
+
+def test_subscribe_requires_a_device(rooms):
+    rooms.connect('a')
+    with pytest.raises(ValueError):
+        rooms.subscribe('a', {'appId': 'com.app'})
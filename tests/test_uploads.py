@@ -0,0 +1,53 @@
+import hashlib
+import os
+import uuid
+
+import pytest
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+@pytest.fixture
+def upload_id():
+    return uuid.uuid4().hex
+
+def put_chunk(client, upload_id, data, start, total):
+    end = start + len(data) - 1
+    return client.put(f'/api/frida-uploads/{upload_id}', data=data,
+                      headers={'Content-Range': f'bytes {start}-{end}/{total}'})
+
+def test_chunks_resume_and_finish_with_the_hash(server, client, upload_id):
+    binary = os.urandom(3000)
+    response = put_chunk(client, upload_id, binary[:1000], 0, len(binary))
+    assert response.get_json() == {'uploadId': upload_id, 'received': 1000}
+    assert client.get(f'/api/frida-uploads/{upload_id}').get_json()['received'] == 1000
+
+    response = put_chunk(client, upload_id, binary[1000:], 1000, len(binary))
+    body = response.get_json()
+    assert body['status'] == 'complete'
+    assert body['sha256'] == hashlib.sha256(binary).hexdigest()
+    assert os.path.exists(os.path.join(server.FRIDA_UPLOADS_DIR, body['sha256']))
+    assert not os.path.exists(os.path.join(server.FRIDA_UPLOADS_DIR, f'{upload_id}.part'))
+
+def test_chunk_at_the_wrong_offset_is_a_conflict(client, upload_id):
+    put_chunk(client, upload_id, b'a' * 100, 0, 300)
+    response = put_chunk(client, upload_id, b'b' * 100, 200, 300)
+    assert response.status_code == 409
+    assert response.get_json()['received'] == 100
+
+def test_chunk_past_the_declared_size_is_dropped(server, client, upload_id):
+    put_chunk(client, upload_id, b'a' * 100, 0, 150)
+    response = put_chunk(client, upload_id, b'b' * 100, 100, 150)
+    assert response.status_code == 400
+    assert response.get_json()['received'] == 100
+    assert os.path.getsize(os.path.join(server.FRIDA_UPLOADS_DIR, f'{upload_id}.part')) == 100
+
+@pytest.mark.parametrize('content_range', ['bytes 0-9', 'items 0-9/10', 'bytes -1-9/10'])
+def test_malformed_content_range_is_rejected(client, upload_id, content_range):
+    response = client.put(f'/api/frida-uploads/{upload_id}', data=b'x' * 10, headers={'Content-Range': content_range})
+    assert response.status_code == 400
+
+def test_invalid_upload_id_is_rejected(client):
+    assert client.put('/api/frida-uploads/bad.id', data=b'x').status_code == 400
+    assert client.put('/api/frida-uploads/' + 'a' * 65, data=b'x').status_code == 400